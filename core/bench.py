@@ -0,0 +1,228 @@
+import datetime
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from contextlib import ExitStack
+from io import StringIO
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+
+from tasks.management.commands.populate_db import USERNAME_PREFIX
+from tasks.models import Project, Task, TaskDetail
+
+PASSWORD = 'password'
+# Generated employees are handed out with a power-law bias, so load_0 holds
+# the most tasks and is the worst case for the employee views.
+EMPLOYEE = f"{USERNAME_PREFIX}0"
+MANAGER_PERMISSIONS = ('view_task', 'add_task', 'change_task', 'delete_task', 'view_project')
+# Latency and allocations may move by the tolerance; query counts may not move at all.
+CHECKED_METRICS = ('p50_ms', 'p95_ms', 'alloc_kib')
+
+
+class Scenario:
+    def __init__(self, name, role, method, url, data=None, prepare=None):
+        self.name = name
+        self.role = role
+        self.method = method
+        self.url = url
+        self.data = data
+        self.prepare = prepare
+
+    def request(self, suite):
+        """Build (path, data) for one request. `prepare` runs untimed, e.g. to
+        create the row a delete is going to remove."""
+        target = self.prepare(suite) if self.prepare else None
+        path = self.url(suite, target)
+        data = self.data(suite) if self.data else None
+        return path, data
+
+
+def task_form_data(suite):
+    return {
+        'title': 'Benchmark task',
+        'description': 'Created by the view benchmark',
+        'due_date': (datetime.date.today() + datetime.timedelta(days=7)).isoformat(),
+        'assigned_to': [suite.employee.id],
+        'project': suite.project.id,
+        'priority': TaskDetail.MEDIUM,
+        'notes': 'Benchmark notes',
+    }
+
+
+def throwaway_task(suite):
+    task = Task.objects.create(
+        project=suite.project, title='Benchmark delete', description='To be deleted',
+        due_date=datetime.date.today())
+    TaskDetail.objects.create(task=task)
+    return task
+
+
+SCENARIOS = [
+    Scenario('manager_dashboard', 'manager', 'get', lambda s, t: reverse('manager_dashboard')),
+    Scenario('employee_dashboard', 'employee', 'get', lambda s, t: reverse('employee_dashboard')),
+    Scenario('admin_dashboard', 'admin', 'get', lambda s, t: reverse('admin-dashboard')),
+    Scenario('task_details', 'manager', 'get', lambda s, t: reverse('task_details', args=[s.task.id])),
+    Scenario('create_task_form', 'manager', 'get', lambda s, t: reverse('create_task')),
+    Scenario('create_task', 'manager', 'post', lambda s, t: reverse('create_task'), data=task_form_data),
+    Scenario('update_task', 'manager', 'post', lambda s, t: reverse('update_task', args=[s.task.id]),
+             data=task_form_data),
+    Scenario('delete_task', 'manager', 'post', lambda s, t: reverse('delete_task', args=[t.id]),
+             prepare=throwaway_task),
+    Scenario('view_projects', 'manager', 'get', lambda s, t: reverse('view_projects')),
+    Scenario('sign_in', None, 'post', lambda s, t: reverse('sign-in'),
+             data=lambda s: {'username': EMPLOYEE, 'password': PASSWORD}),
+]
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, round(fraction * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+class Suite:
+    """Seeds one scale of data and drives every scenario through the test
+    client, recording latency, queries and allocations per view."""
+
+    def __init__(self, scale, iterations, workers=1, stdout=None):
+        self.scale = scale
+        self.iterations = iterations
+        self.workers = workers
+        self.stdout = stdout
+
+    def seed(self):
+        call_command('populate_db', scale=self.scale, clear=True, workers=self.workers, stdout=StringIO())
+        User = get_user_model()
+        groups = {name: Group.objects.get_or_create(name=name)[0] for name in ('Admin', 'Manager', 'Employee')}
+        groups['Manager'].permissions.add(
+            *Permission.objects.filter(content_type__app_label='tasks', codename__in=MANAGER_PERMISSIONS))
+
+        self.users = {}
+        for role, group in (('admin', 'Admin'), ('manager', 'Manager')):
+            user, created = User.objects.get_or_create(
+                username=f'bench_{role}', defaults={'email': f'bench_{role}@example.com'})
+            user.groups.set([groups[group]])
+            self.users[role] = user
+        self.employee = self.users['employee'] = User.objects.get(username=EMPLOYEE)
+        self.project = Project.objects.order_by('id').first()
+        self.task = Task.objects.filter(assigned_to=self.employee).order_by('id').first()
+
+    def clients(self):
+        clients = {None: Client()}
+        for role, user in self.users.items():
+            clients[role] = Client()
+            clients[role].force_login(user)
+        return clients
+
+    def send(self, client, scenario):
+        path, data = scenario.request(self)
+        sql = {'queries': 0}
+
+        def count_query(execute, sql_text, params, many, context):
+            sql['queries'] += 1
+            return execute(sql_text, params, many, context)
+
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(count_query))
+            started = time.perf_counter()
+            response = getattr(client, scenario.method)(path, data)
+            elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise RuntimeError(f"{scenario.name}: {scenario.method.upper()} {path} returned {response.status_code}")
+        return elapsed, sql['queries']
+
+    def measure(self, client, scenario):
+        self.send(client, scenario)  # warm caches, compiled templates and lazy imports
+        timings, queries = [], []
+        for _ in range(self.iterations):
+            elapsed, count = self.send(client, scenario)
+            timings.append(elapsed * 1000)
+            queries.append(count)
+
+        # tracemalloc slows everything down, so allocations get their own pass.
+        tracemalloc.start()
+        try:
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            self.send(client, scenario)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        timings.sort()
+        return {
+            'p50_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'p99_ms': round(percentile(timings, 0.99), 3),
+            'queries': max(queries),
+            'alloc_kib': round((peak - before) / 1024, 1),
+        }
+
+    def run(self, only=None):
+        self.seed()
+        clients = self.clients()
+        results = {}
+        for scenario in SCENARIOS:
+            if only and scenario.name not in only:
+                continue
+            results[scenario.name] = self.measure(clients[scenario.role], scenario)
+            if self.stdout:
+                self.stdout.write(format_row(self.scale, scenario.name, results[scenario.name]))
+        return results
+
+
+def format_row(scale, name, result):
+    return (
+        f"scale={scale:<5} {name:<20} p50={result['p50_ms']:>9.2f}ms p95={result['p95_ms']:>9.2f}ms "
+        f"p99={result['p99_ms']:>9.2f}ms queries={result['queries']:>4} alloc={result['alloc_kib']:>9.1f}KiB"
+    )
+
+
+def environment():
+    return {
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'machine': platform.node(),
+    }
+
+
+def save_baseline(path, results, iterations):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as baseline:
+        json.dump({
+            'environment': environment(),
+            'iterations': iterations,
+            'results': {str(scale): views for scale, views in results.items()},
+        }, baseline, indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    with open(path) as baseline:
+        data = json.load(baseline)
+    data['results'] = {int(scale): views for scale, views in data['results'].items()}
+    return data
+
+
+def compare(baseline, current, tolerance):
+    """Yield (scale, view, metric, old, new) for every measurement that is
+    worse than the baseline by more than `tolerance` (a fraction)."""
+    for scale, views in baseline.items():
+        for view, old in views.items():
+            new = current.get(scale, {}).get(view)
+            if new is None:
+                continue
+            if new['queries'] > old['queries']:
+                yield scale, view, 'queries', old['queries'], new['queries']
+            for metric in CHECKED_METRICS:
+                if new[metric] > old[metric] * (1 + tolerance):
+                    yield scale, view, metric, old[metric], new[metric]
@@ -0,0 +1,85 @@
+import random
+import statistics
+import time
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from core.test_runner import LOCAL_CACHES
+from tasks.autoassign import LoadBalancer
+from tasks.models import Project
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed the test database with populate_db --scale and time the auto-assign "
+        "decision (tasks.autoassign.LoadBalancer.choose) for random projects, the way "
+        "CreateTask makes it: inside the transaction that saves the task."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=2000, help="populate_db scale (2000 = 10k employees)")
+        parser.add_argument('--count', type=int, default=3, help="Employees chosen per task")
+        parser.add_argument('--iterations', type=int, default=10_000, help="Timed decisions")
+        parser.add_argument('--workers', type=int, default=4, help="populate_db workers")
+        parser.add_argument('--keepdb', action='store_true', help="Keep the test database between runs")
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 2:
+            raise CommandError("--iterations must be at least 2")
+        setup_test_environment(debug=False)
+        local_cache = override_settings(CACHES=LOCAL_CACHES)
+        local_cache.enable()
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        try:
+            started = time.perf_counter()
+            call_command('populate_db', scale=options['scale'], clear=True, workers=options['workers'],
+                         stdout=StringIO())
+            employees = get_user_model().objects.filter(groups__name='Employee').count()
+            self.stdout.write(f"Seeded {employees} employees in {time.perf_counter() - started:.1f}s")
+            self.benchmark(options['count'], options['iterations'])
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+            local_cache.disable()
+            teardown_test_environment()
+
+    def benchmark(self, count, iterations):
+        balancer = LoadBalancer()
+        started = time.perf_counter()
+        balancer.reload()
+        self.stdout.write(f"{'reload':24} {(time.perf_counter() - started) * 1000:10.1f}ms")
+
+        projects = list(Project.objects.values_list('id', flat=True))
+        rng = random.Random(0)
+        timings = []
+        queries = []
+
+        def count_query(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        # Only this thread's connection: the background re-reads are off the request path.
+        with connection.execute_wrapper(count_query):
+            for _ in range(iterations):
+                project_id = rng.choice(projects)
+                with transaction.atomic():
+                    started = time.perf_counter()
+                    chosen = balancer.choose(project_id, count)
+                    timings.append((time.perf_counter() - started) * 1000)
+                if len(chosen) != count:
+                    raise CommandError(f"Chose {len(chosen)} employees for project {project_id}")
+                # Let the re-read of the chosen land, as it would between requests.
+                if balancer.worker is not None:
+                    balancer.worker.join()
+        timings.sort()
+        self.stdout.write(
+            f"{'choose':24} p50={statistics.median(timings):8.4f}ms "
+            f"p99={timings[int(len(timings) * 0.99) - 1]:8.4f}ms max={timings[-1]:8.4f}ms "
+            f"queries={len(queries)}"
+        )
@@ -0,0 +1,42 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import CommandError
+
+from core import bench
+from core.management.commands.bench_views import Command as BenchViewsCommand
+
+
+class Command(BenchViewsCommand):
+    help = (
+        "Re-run the view benchmarks at the scales stored in the baseline and fail "
+        "when a view needs more queries, or is slower or allocates more by more "
+        "than --tolerance."
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--baseline', default=str(settings.BENCHMARK_BASELINE))
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help="Allowed fractional slowdown/allocation growth (0.25 = 25%%)")
+
+    def handle(self, *args, **options):
+        path = Path(options['baseline'])
+        if not path.exists():
+            raise CommandError(f"No baseline at {path}; run bench_views --save first")
+        baseline = bench.load_baseline(path)
+        if options['scales']:
+            scales = self.parse_scales(options['scales'])
+        else:
+            scales = sorted(baseline['results'])
+
+        current = self.benchmark(scales, options)
+        if options['save']:
+            bench.save_baseline(Path(options['save']), current, options['iterations'])
+
+        regressions = list(bench.compare(baseline['results'], current, options['tolerance']))
+        if regressions:
+            for scale, view, metric, old, new in regressions:
+                self.stderr.write(f"scale={scale} {view}: {metric} {old} -> {new}")
+            raise CommandError(f"{len(regressions)} benchmark regression(s) beyond the baseline")
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
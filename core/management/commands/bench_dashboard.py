@@ -0,0 +1,217 @@
+import asyncio
+import statistics
+import threading
+import time
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure requests/sec on the manager dashboard through the WSGI handler. "
+        "Run it once with DB_POOL=True and once without to compare pooling, or "
+        "pass --compare-middleware to measure what one middleware costs, or "
+        "--compare-asgi to race the sync view under WSGI against the async view under ASGI."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help="A user in the Manager group")
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument(
+            '--compare-middleware', metavar='DOTTED_PATH',
+            help="Also run without this middleware and report its overhead",
+        )
+        parser.add_argument('--rounds', type=int, default=5, help="Alternating rounds for --compare-middleware")
+        parser.add_argument(
+            '--compare-asgi', action='store_true',
+            help="Compare manager_dashboard on WSGI (--threads threads) with "
+                 "async_manager_dashboard on ASGI (--threads concurrent requests)",
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']} does not exist")
+
+        # The test client keeps connections open between requests, so only use
+        # it to get a session cookie and drive the real WSGI handler, which
+        # closes/returns connections on request_finished like a server does.
+        client = Client()
+        client.force_login(user)
+        self.cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+        self.path = reverse('manager_dashboard')
+        connections.close_all()
+
+        if options['compare_asgi']:
+            return self.compare_asgi(options['requests'], options['threads'])
+
+        middleware = options['compare_middleware']
+        if not middleware:
+            total, elapsed, errors = self.run(WSGIHandler(), options['requests'], options['threads'])
+            pooled = 'pool' in settings.DATABASES['default'].get('OPTIONS', {})
+            self.stdout.write(
+                f"pool={'on' if pooled else 'off'} requests={total} threads={options['threads']} "
+                f"elapsed={elapsed:.2f}s req/s={total / elapsed:.1f} errors={errors}"
+            )
+            if pooled:
+                self.stdout.write(f"pool stats: {connections['default'].pool.get_stats()}")
+            return
+
+        if middleware not in settings.MIDDLEWARE:
+            raise CommandError(f"{middleware} is not in MIDDLEWARE")
+        with_middleware = WSGIHandler()
+        with override_settings(MIDDLEWARE=[m for m in settings.MIDDLEWARE if m != middleware]):
+            without_middleware = WSGIHandler()
+
+        # Alternate the two handlers so drift on the machine hits both equally,
+        # and compare medians so a few slow outliers don't decide the result.
+        latencies = {'with': [], 'without': []}
+        for _ in range(options['rounds']):
+            for label, application in (('with', with_middleware), ('without', without_middleware)):
+                for _ in range(options['requests']):
+                    started = time.perf_counter()
+                    if not self.send(application):
+                        raise CommandError("Request failed")
+                    latencies[label].append(time.perf_counter() - started)
+
+        with_median = statistics.median(latencies['with']) * 1000
+        without_median = statistics.median(latencies['without']) * 1000
+        overhead = (with_median - without_median) / without_median * 100
+        self.stdout.write(
+            f"median with={with_median:.2f}ms without={without_median:.2f}ms overhead={overhead:.2f}%"
+        )
+
+    def compare_asgi(self, requests, concurrency):
+        wsgi = WSGIHandler()
+        self.send(wsgi)
+        latencies = []
+
+        def timed():
+            started = time.perf_counter()
+            if not self.send(wsgi):
+                raise CommandError("Request failed")
+            latencies.append(time.perf_counter() - started)
+
+        def worker():
+            for _ in range(requests // concurrency):
+                timed()
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.report('wsgi sync ', latencies, time.perf_counter() - started)
+
+        elapsed, latencies = asyncio.run(self.run_asgi(requests, concurrency))
+        self.report('asgi async', latencies, elapsed)
+
+    async def run_asgi(self, requests, concurrency):
+        application = ASGIHandler()
+        path = reverse('async_manager_dashboard')
+        await self.send_asgi(application, path)
+        latencies = []
+
+        async def worker():
+            for _ in range(requests // concurrency):
+                started = time.perf_counter()
+                if not await self.send_asgi(application, path):
+                    raise CommandError("Request failed")
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - started, latencies
+
+    async def send_asgi(self, application, path):
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'headers': [(b'host', b'localhost'), (b'cookie', self.cookie.encode())],
+            # Not in INTERNAL_IPS, same as the WSGI requests, so no debug toolbar.
+            'client': ('192.0.2.1', 0),
+            'server': ('localhost', 80),
+        }
+        body = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+        disconnect = asyncio.Event()
+
+        async def receive():
+            if body:
+                return body.pop()
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        status = []
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        await application(scope, receive, send)
+        disconnect.set()
+        return status[0] == 200
+
+    def report(self, label, latencies, elapsed):
+        latencies = sorted(latency * 1000 for latency in latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        self.stdout.write(
+            f"{label} requests={len(latencies)} p50={statistics.median(latencies):.2f}ms "
+            f"p95={p95:.2f}ms req/s={len(latencies) / elapsed:.1f}"
+        )
+
+    def send(self, application):
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': self.path,
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'HTTP_HOST': 'localhost',
+            'HTTP_COOKIE': self.cookie,
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': BytesIO(),
+            'wsgi.errors': BytesIO(),
+        }
+        status = []
+        body = application(environ, lambda s, headers: status.append(s))
+        for _ in body:
+            pass
+        body.close()
+        return status[0].startswith('200')
+
+    def run(self, application, requests, thread_count):
+        per_thread = max(requests // thread_count, 1)
+        failures = []
+
+        def worker():
+            for _ in range(per_thread):
+                if not self.send(application):
+                    failures.append(1)
+
+        self.send(application)
+        threads = [threading.Thread(target=worker) for _ in range(thread_count)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return per_thread * thread_count, time.perf_counter() - start, len(failures)
@@ -0,0 +1,173 @@
+import io
+import statistics
+import time
+from contextlib import redirect_stdout
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import HttpRequest, HttpResponse
+from django.template import engines
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from django.urls import resolve
+
+from core import bench
+from core.metrics import registry
+from core.middleware import RequestMetricsMiddleware, count_queries, render_timer
+from core.test_runner import LOCAL_CACHES, uncollected_static_storages
+
+METRICS_MIDDLEWARE = 'core.middleware.RequestMetricsMiddleware'
+WARMUP = 10
+
+
+def per_call(run, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        run()
+    return (time.perf_counter() - started) / calls
+
+
+def added_cost(bare, measured, calls, rounds=5):
+    """Seconds `measured` takes over `bare` per call: the best of `rounds`
+    alternating runs of each, so a hiccup in either one doesn't count."""
+    timings = {bare: [], measured: []}
+    for _ in range(rounds):
+        for run in timings:
+            timings[run].append(per_call(run, calls))
+    return min(timings[measured]) - min(timings[bare])
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure what RequestMetricsMiddleware adds to each page. Its fixed cost per request "
+        "and its cost per query and per template render are timed on their own, which "
+        "resolves well under 1%; each page's share follows from its own queries, renders and "
+        "time. Every page is also requested with and without the middleware, alternating, "
+        "as a cross-check with a 95% interval."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=10, help="populate_db scale of the seeded data")
+        parser.add_argument('--requests', type=int, default=1000, help="Requests per page and stack")
+        parser.add_argument('--calls', type=int, default=20_000, help="Calls per timing of the parts")
+        parser.add_argument('--keepdb', action='store_true', help="Keep the test database between runs")
+
+    def handle(self, *args, **options):
+        if METRICS_MIDDLEWARE not in settings.MIDDLEWARE:
+            raise CommandError(f"{METRICS_MIDDLEWARE} isn't in MIDDLEWARE")
+        if options['requests'] < 10:
+            raise CommandError("--requests must be at least 10")
+
+        setup_test_environment(debug=False)
+        isolated = override_settings(STORAGES=uncollected_static_storages(), CACHES=LOCAL_CACHES)
+        isolated.enable()
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        try:
+            suite = bench.Suite(options['scale'], options['requests'])
+            suite.seed()
+            costs = self.part_costs(options['calls'])
+            # Some views print; keep that out of the timings and the report.
+            with redirect_stdout(io.StringIO()):
+                rows = self.compare(suite, options['requests'], costs)
+            for row in rows:
+                self.stdout.write(row)
+        finally:
+            registry.histograms.clear()
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+            isolated.disable()
+            teardown_test_environment()
+
+    def part_costs(self, calls):
+        request = HttpRequest()
+        request.path = request.path_info = '/'
+        request.resolver_match = resolve('/')
+
+        def view(request):
+            return HttpResponse(b'x' * 1024)
+
+        middleware = RequestMetricsMiddleware(view)
+        template = engines['django'].from_string('{{ value }}')
+        cursor = connection.cursor()
+
+        def query():
+            cursor.execute('SELECT 1')
+
+        def counted_query():
+            with count_queries():
+                query()
+
+        def counted_nothing():
+            with count_queries():
+                pass
+
+        def timed_render():
+            token = render_timer.set({'time': 0.0, 'renders': 0, 'depth': 0})
+            template.render({'value': 1})
+            render_timer.reset(token)
+
+        def context_only():
+            render_timer.reset(render_timer.set({'time': 0.0, 'renders': 0, 'depth': 0}))
+            template.render({'value': 1})
+
+        costs = {
+            'request': added_cost(lambda: view(request), lambda: middleware(request), calls),
+            # count_queries() around one query, less count_queries() itself
+            # (already part of the request cost).
+            'query': added_cost(query, counted_query, calls) - added_cost(lambda: None, counted_nothing, calls),
+            'render': added_cost(context_only, timed_render, calls),
+        }
+        cursor.close()
+        for part, cost in costs.items():
+            self.stdout.write(f"{'per ' + part:20} {cost * 1e6:8.2f}us")
+        return costs
+
+    def compare(self, suite, count, costs):
+        stacks = {}
+        for name, middleware in (
+            ('metrics', settings.MIDDLEWARE),
+            ('bare', [path for path in settings.MIDDLEWARE if path != METRICS_MIDDLEWARE]),
+        ):
+            # A client builds its middleware chain on its first request.
+            with override_settings(MIDDLEWARE=middleware):
+                stacks[name] = suite.clients()
+                for client in stacks[name].values():
+                    client.get('/')
+
+        rows = []
+        for scenario in bench.SCENARIOS:
+            if scenario.method != 'get':
+                continue
+            path, _ = scenario.request(suite)
+            timings = {'metrics': [], 'bare': []}
+            for i in range(count + WARMUP):
+                order = ('metrics', 'bare') if i % 2 else ('bare', 'metrics')
+                for name in order:
+                    started = time.perf_counter()
+                    response = stacks[name][scenario.role].get(path)
+                    elapsed = time.perf_counter() - started
+                    if response.status_code >= 400:
+                        raise CommandError(f"{scenario.name}: GET {path} returned {response.status_code}")
+                    if i >= WARMUP:
+                        timings[name].append(elapsed)
+
+            timer = {'time': 0.0, 'renders': 0, 'depth': 0}
+            token = render_timer.set(timer)
+            try:
+                with count_queries() as sql:
+                    stacks['bare'][scenario.role].get(path)
+            finally:
+                render_timer.reset(token)
+            bare = statistics.median(timings['bare'])
+            cost = costs['request'] + sql['queries'] * costs['query'] + timer['renders'] * costs['render']
+
+            differences = [a - b for a, b in zip(timings['metrics'], timings['bare'])]
+            # Standard error of a median: 1.2533 times that of the mean.
+            error = 1.96 * 1.2533 * statistics.stdev(differences) / len(differences) ** 0.5
+            rows.append(
+                f"{scenario.name:20} p50={bare * 1000:8.3f}ms queries={sql['queries']:>3} "
+                f"renders={timer['renders']:>2} overhead={cost * 1e6:6.1f}us ({cost / bare:.3%}) "
+                f"A/B={statistics.median(differences) / bare:+.2%} ±{error / bare:.2%}"
+            )
+        return rows
@@ -0,0 +1,126 @@
+import datetime
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    CaptureQueriesContext, override_settings, setup_databases, setup_test_environment, teardown_databases,
+    teardown_test_environment,
+)
+
+from core.test_runner import LOCAL_CACHES
+from tasks import hierarchy
+from tasks.models import Project, Task
+
+
+def level_sizes(nodes, depth):
+    """Tasks per level of a tree with `nodes` tasks over `depth` levels,
+    growing by the same factor from one top-level task down."""
+    factor = 1.0
+    while sum(round(factor ** level) for level in range(depth)) < nodes:
+        factor += 0.001
+    sizes = [round(factor ** level) for level in range(depth)]
+    sizes[-1] -= sum(sizes) - nodes
+    return sizes
+
+
+class Command(BaseCommand):
+    help = (
+        "Build a subtask tree of --nodes tasks over --depth levels in the test database "
+        "and time the recursive queries of tasks.hierarchy on it: the whole tree's roll-up, "
+        "the roll-ups a task page shows, the ancestor walk and the cycle check."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nodes', type=int, default=100_000)
+        parser.add_argument('--depth', type=int, default=10)
+        parser.add_argument('--iterations', type=int, default=20, help="Timed runs per query")
+        parser.add_argument('--keepdb', action='store_true', help="Keep the test database between runs")
+
+    def handle(self, *args, **options):
+        if not 1 < options['depth'] <= hierarchy.MAX_DEPTH:
+            raise CommandError(f"--depth must be between 2 and {hierarchy.MAX_DEPTH}")
+        if options['nodes'] < options['depth']:
+            raise CommandError("--nodes must be at least --depth")
+        setup_test_environment(debug=False)
+        local_cache = override_settings(CACHES=LOCAL_CACHES)
+        local_cache.enable()
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        try:
+            levels = self.build_tree(options['nodes'], options['depth'])
+            self.benchmark(levels, options['iterations'])
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+            local_cache.disable()
+            teardown_test_environment()
+
+    def build_tree(self, nodes, depth):
+        """Insert the tree level by level, parents handed out round-robin;
+        every third task is completed. Returns each level's ids."""
+        project = Project.objects.create(name='Subtask benchmark', start_date=datetime.date.today())
+        today = datetime.date.today()
+        started = time.perf_counter()
+        levels = []
+        count = 0
+        for level, size in enumerate(level_sizes(nodes, depth)):
+            parents = levels[-1] if levels else [None]
+            tasks = []
+            for i in range(size):
+                tasks.append(Task(
+                    project=project, parent_id=parents[i % len(parents)], title=f'Level {level} task {i}',
+                    description='Subtask benchmark', due_date=today + datetime.timedelta(days=count % 90),
+                    status='COMPLETED' if count % 3 == 0 else 'PENDING',
+                ))
+                count += 1
+            levels.append([task.id for task in Task.objects.bulk_create(tasks, batch_size=5000)])
+        if connection.vendor == 'postgresql':
+            # What autovacuum would have done by now: statistics, and the
+            # visibility map that lets the walk read task_parent_idx alone.
+            with connection.cursor() as cursor:
+                cursor.execute(f"VACUUM ANALYZE {connection.ops.quote_name(Task._meta.db_table)}")
+        self.stdout.write(
+            f"{count} tasks over {len(levels)} levels ({', '.join(str(len(ids)) for ids in levels)}) "
+            f"built in {time.perf_counter() - started:.1f}s"
+        )
+        return levels
+
+    def benchmark(self, levels, iterations):
+        root = levels[0][0]
+        middle = levels[len(levels) // 2][0]
+        leaf = levels[-1][-1]
+        children = levels[1][:hierarchy.SUBTASK_PREVIEW]
+        root_task, leaf_task = Task.objects.get(pk=root), Task.objects.get(pk=leaf)
+
+        def check_cycle():
+            try:
+                hierarchy.check_parent(root_task, leaf_task)
+            except hierarchy.ValidationError:
+                return
+            raise CommandError("Making the top-level task a subtask of a leaf was not refused")
+
+        cases = [
+            ('roll-up of the whole tree', lambda: hierarchy.compute_rollups(root)),
+            ('task page roll-ups (top + subtasks)', lambda: hierarchy.compute_rollups(root, children)),
+            (f'roll-up from level {len(levels) // 2}', lambda: hierarchy.compute_rollups(middle)),
+            ('ancestors of a leaf', lambda: hierarchy.ancestor_ids(leaf)),
+            ('cycle check (rejected)', check_cycle),
+        ]
+        for name, run in cases:
+            with CaptureQueriesContext(connection) as queries:
+                run()
+            timings = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                run()
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f"{name:40} p50={statistics.median(timings):8.1f}ms "
+                f"p95={timings[int(len(timings) * 0.95) - 1]:8.1f}ms queries={len(queries)}"
+            )
+        progress = hierarchy.compute_rollups(root, children)
+        if progress[root]['total'] != sum(len(ids) for ids in levels):
+            raise CommandError(f"The roll-up counted {progress[root]['total']} tasks")
+        if sum(progress[child]['total'] for child in children) != progress[root]['total'] - 1:
+            raise CommandError("The subtasks' roll-ups don't add up to the whole tree")
@@ -0,0 +1,68 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment, teardown_databases,
+    teardown_test_environment,
+)
+
+from core import bench
+from core.test_runner import LOCAL_CACHES, uncollected_static_storages
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed the test database at each --scale and drive every dashboard, task and "
+        "sign-in view through the test client. Reports p50/p95/p99 latency, queries "
+        "and allocated memory per view; --save writes them as the JSON baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', help="Comma separated populate_db scales (default 1,10,50)")
+        parser.add_argument('--iterations', type=int, default=30, help="Timed requests per view")
+        parser.add_argument('--views', help="Comma separated subset of: " + ", ".join(
+            scenario.name for scenario in bench.SCENARIOS))
+        parser.add_argument('--workers', type=int, default=2, help="populate_db workers")
+        parser.add_argument('--keepdb', action='store_true', help="Keep the test database between runs")
+        parser.add_argument('--save', nargs='?', const=str(settings.BENCHMARK_BASELINE), metavar='PATH',
+                            help=f"Write a baseline (default {settings.BENCHMARK_BASELINE})")
+
+    def handle(self, *args, **options):
+        scales = self.parse_scales(options['scales'] or '1,10,50')
+        results = self.benchmark(scales, options)
+        if options['save']:
+            bench.save_baseline(Path(options['save']), results, options['iterations'])
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['save']}"))
+
+    def parse_scales(self, value):
+        try:
+            return [int(scale) for scale in value.split(',') if scale.strip()]
+        except ValueError:
+            raise CommandError(f"Invalid --scales {value!r}")
+
+    def benchmark(self, scales, options):
+        only = set(options['views'].split(',')) if options['views'] else None
+        if options['iterations'] < 2:
+            raise CommandError("--iterations must be at least 2")
+
+        # Same isolation as the test runner: a throwaway database, locmem
+        # e-mail and cache, DEBUG off and no collectstatic needed, so neither
+        # the dev data nor the shared cache's generation is touched.
+        setup_test_environment(debug=False)
+        isolated = override_settings(STORAGES=uncollected_static_storages(), CACHES=LOCAL_CACHES)
+        isolated.enable()
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        try:
+            results = {}
+            for scale in scales:
+                suite = bench.Suite(scale, options['iterations'], options['workers'], stdout=self.stdout)
+                try:
+                    results[scale] = suite.run(only)
+                except RuntimeError as e:
+                    raise CommandError(str(e))
+            return results
+        finally:
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+            isolated.disable()
+            teardown_test_environment()
@@ -0,0 +1,78 @@
+import threading
+from bisect import bisect_left
+
+
+def exponential_buckets(start, factor, count):
+    return [start * factor ** i for i in range(count)]
+
+
+class Histogram:
+    """Fixed log-spaced buckets, HDR style: recording is a bisect plus two
+    additions, memory is constant however many values are recorded."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+# name -> (help text, bucket bounds)
+METRICS = {
+    'django_request_duration_seconds': (
+        "Wall time of the request, until its body was sent", exponential_buckets(0.001, 1.5, 28)),
+    'django_db_queries': (
+        "Database queries run by the request", exponential_buckets(1, 2, 12)),
+    'django_db_duration_seconds': (
+        "Time spent executing SQL", exponential_buckets(0.0001, 1.5, 32)),
+    'django_template_render_seconds': (
+        "Time spent rendering templates in the view", exponential_buckets(0.0005, 1.5, 28)),
+    'django_response_size_bytes': (
+        "Size of the response body", exponential_buckets(256, 2, 17)),
+}
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+
+    def observe(self, view, values):
+        with self.lock:
+            for name, value in values.items():
+                key = (name, view)
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = Histogram(METRICS[name][1])
+                histogram.observe(value)
+
+    def export(self):
+        """Render everything in the Prometheus text exposition format."""
+        with self.lock:
+            snapshot = {
+                key: (list(h.counts), h.sum, h.count) for key, h in self.histograms.items()
+            }
+
+        lines = []
+        for name, (help_text, bounds) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for (metric, view), (counts, total, count) in sorted(snapshot.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket in zip(bounds, counts):
+                    cumulative += bucket
+                    lines.append(f'{name}_bucket{{view="{view}",le="{bound:g}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{view="{view}",le="+Inf"}} {count}')
+                lines.append(f'{name}_sum{{view="{view}"}} {total:g}')
+                lines.append(f'{name}_count{{view="{view}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
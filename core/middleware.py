@@ -0,0 +1,352 @@
+import functools
+import mimetypes
+import os
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import connections
+from django.http import FileResponse, HttpResponseNotModified
+from django.template.backends.django import Template as DjangoTemplate
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from core.metrics import registry
+from core.nplusone import detect_queries, report
+from core import profiler
+from core.staticfiles import ENCODINGS
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def accepted_encodings(header):
+    accepted = {}
+    for part in header.split(','):
+        token, _, params = part.partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[token.strip().lower()] = quality
+    return accepted
+
+
+@contextmanager
+def count_queries():
+    sql = {'queries': 0, 'time': 0.0}
+
+    def count_query(execute, sql_text, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql_text, params, many, context)
+        finally:
+            sql['queries'] += 1
+            sql['time'] += time.perf_counter() - started
+
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(count_query))
+        yield sql
+
+
+# Template render time of the request being measured by
+# RequestMetricsMiddleware: {'time': seconds, 'renders': count, 'depth': nesting}.
+render_timer = ContextVar('render_timer', default=None)
+
+
+def timed_render(render):
+    """Wrap a template backend's render() to add its time to render_timer.
+    A template rendered while another one renders (render_to_string in a
+    tag) is part of the outer one's time."""
+    @functools.wraps(render)
+    def wrapper(self, *args, **kwargs):
+        timer = render_timer.get()
+        if timer is None or timer['depth']:
+            return render(self, *args, **kwargs)
+        timer['depth'] += 1
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            timer['depth'] -= 1
+            timer['time'] += time.perf_counter() - started
+            timer['renders'] += 1
+    wrapper.timed = True
+    return wrapper
+
+
+class StaticFilesMiddleware:
+    """Serve files collected into STATIC_ROOT before the rest of the stack
+    runs, choosing the precompressed .br/.gz sibling the client accepts.
+
+    Names with a content hash (from the manifest, read on the first static
+    request) are cached for a year as immutable; anything else revalidates
+    against Last-Modified.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = '/' + settings.STATIC_URL.strip('/') + '/'
+        self.immutable = None
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self.serve(request)
+        return response if response is not None else self.get_response(request)
+
+    async def __acall__(self, request):
+        response = self.serve(request)
+        return response if response is not None else await self.get_response(request)
+
+    def serve(self, request):
+        if request.method not in ('GET', 'HEAD') or not request.path.startswith(self.prefix):
+            return None
+        name = request.path[len(self.prefix):]
+        try:
+            path = safe_join(settings.STATIC_ROOT, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        stat = os.stat(path)
+        if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime):
+            response = HttpResponseNotModified()
+        else:
+            response = self.file_response(request, path)
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        if self.immutable is None:
+            self.immutable = getattr(staticfiles_storage, 'immutable_names', set)()
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if name in self.immutable else 'no-cache'
+        return response
+
+    def file_response(self, request, path):
+        content_type, _ = mimetypes.guess_type(path)
+        content_type = content_type or 'application/octet-stream'
+        accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        variants = [(encoding, path + suffix) for encoding, suffix in ENCODINGS if os.path.isfile(path + suffix)]
+        for encoding, variant in variants:
+            if accepted.get(encoding, accepted.get('*', 0)) > 0:
+                response = FileResponse(open(variant, 'rb'), content_type=content_type)
+                response['Content-Encoding'] = encoding
+                break
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+        if variants:
+            patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+
+
+class RequestMetricsMiddleware:
+    """Record latency, query count, SQL time, template render time and
+    response size per URL name into the in-process histograms.
+
+    A response is timed until its body is complete: a streaming body is
+    recorded once it has been sent, with the queries it ran meanwhile.
+    Render time is that of the Django templates rendered while the view
+    runs (render(), a TemplateResponse), whichever way they are reached;
+    the backend's Template.render is wrapped once this middleware is
+    installed. `manage.py bench_metrics` measures the overhead.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        if not getattr(DjangoTemplate.render, 'timed', False):
+            DjangoTemplate.render = timed_render(DjangoTemplate.render)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        token = render_timer.set({'time': 0.0, 'renders': 0, 'depth': 0})
+        try:
+            with count_queries() as sql:
+                response = self.get_response(request)
+            return self.finish(request, response, sql, started)
+        finally:
+            render_timer.reset(token)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        # Views run through sync_to_async get a copy of the context, with
+        # this same dict in it.
+        token = render_timer.set({'time': 0.0, 'renders': 0, 'depth': 0})
+        try:
+            with count_queries() as sql:
+                response = await self.get_response(request)
+            return self.finish(request, response, sql, started)
+        finally:
+            render_timer.reset(token)
+
+    def finish(self, request, response, sql, started):
+        render = render_timer.get()
+        if not response.streaming:
+            self.record(request, sql, render, time.perf_counter() - started, len(response.content))
+        elif isinstance(response, FileResponse):
+            # The server may send the file itself, never reading streaming_content.
+            self.record(request, sql, render, time.perf_counter() - started, None)
+        elif response.is_async:
+            response.streaming_content = self.atimed(
+                request, response, response.streaming_content, sql, render, started)
+        else:
+            response.streaming_content = self.timed(
+                request, response, response.streaming_content, sql, render, started)
+        return response
+
+    def timed(self, request, response, content, sql, render, started):
+        size = 0
+        try:
+            with count_queries() as streamed:
+                for chunk in content:
+                    chunk = response.make_bytes(chunk)
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            sql = {key: sql[key] + streamed[key] for key in sql}
+            self.record(request, sql, render, time.perf_counter() - started, size)
+
+    async def atimed(self, request, response, content, sql, render, started):
+        size = 0
+        try:
+            async for chunk in content:
+                chunk = response.make_bytes(chunk)
+                size += len(chunk)
+                yield chunk
+        finally:
+            self.record(request, sql, render, time.perf_counter() - started, size)
+
+    def record(self, request, sql, render, duration, size):
+        match = request.resolver_match
+        view = match.view_name if match and match.view_name else 'unresolved'
+        values = {
+            'django_request_duration_seconds': duration,
+            'django_db_queries': sql['queries'],
+            'django_db_duration_seconds': sql['time'],
+        }
+        if render['renders']:
+            values['django_template_render_seconds'] = render['time']
+        if size is not None:
+            values['django_response_size_bytes'] = size
+        registry.observe(view, values)
+
+
+class NPlusOneMiddleware:
+    """Flag query shapes that run more than NPLUSONE_THRESHOLD times from
+    the same call site in one request. Logs a warning, or raises under the
+    test runner."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not settings.NPLUSONE_ENABLED:
+            return self.get_response(request)
+
+        with detect_queries() as fingerprints:
+            response = self.get_response(request)
+        self.check(request, fingerprints)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.NPLUSONE_ENABLED:
+            return await self.get_response(request)
+
+        with detect_queries() as fingerprints:
+            response = await self.get_response(request)
+        self.check(request, fingerprints)
+        return response
+
+    def check(self, request, fingerprints):
+        repeated = fingerprints.repeated(settings.NPLUSONE_THRESHOLD)
+        if repeated:
+            report(request.path, repeated)
+
+
+class SamplingProfilerMiddleware:
+    """Staff-only sampling profiler.
+
+    `X-Profile: request` (or `?__profile=request`) profiles that request and
+    names the written file in the X-Profile-File response header.
+    `X-Profile: window:30` (or `?__profile=window:30`) samples every request
+    in this process for the next 30 seconds into one profile. Requests
+    served over ASGI are never sampled (see __acall__).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        mode = self.requested_mode(request)
+        profile, own = self.start(mode if mode and request.user.is_staff else None)
+        if profile is None:
+            return self.get_response(request)
+
+        profiler.sampler.attach(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.sampler.detach()
+        return self.finish(request, response, profile, own)
+
+    async def __acall__(self, request):
+        # Under ASGI a request runs partly on the event loop, interleaved with
+        # every other request's coroutines, and partly in sync_to_async
+        # threads, so no one thread's stack is this request's. Sampling the
+        # loop would attribute other requests' work to it; don't profile.
+        return await self.get_response(request)
+
+    def requested_mode(self, request):
+        return request.headers.get('X-Profile') or request.GET.get('__profile')
+
+    def start(self, mode):
+        """Return the profile to sample this request into, and whether it
+        belongs to this request alone (as opposed to an open window)."""
+        profiler.close_expired_window()
+        if mode:
+            if not mode.startswith('window'):
+                return profiler.Profile('request'), True
+            _, _, seconds = mode.partition(':')
+            seconds = int(seconds) if seconds.isdigit() else settings.PROFILER_WINDOW_SECONDS
+            profiler.open_window(min(seconds, settings.PROFILER_MAX_WINDOW_SECONDS))
+        return profiler.current_window(), False
+
+    def finish(self, request, response, profile, own):
+        if own:
+            match = request.resolver_match
+            profile.label = f"request-{match.url_name if match and match.url_name else 'unresolved'}"
+            response['X-Profile-File'] = profile.write().name
+        return response
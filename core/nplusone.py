@@ -0,0 +1,77 @@
+import logging
+import os
+import re
+import sys
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.template.base import Node
+
+logger = logging.getLogger(__name__)
+
+IN_LIST = re.compile(r'\((?:%s, )+%s\)')
+NUMBER = re.compile(r'\b\d+\b')
+TEMPLATE_CODE = os.path.join('django', 'template', '')
+# Our own execute wrappers sit between the view and the database driver.
+INSTRUMENTATION = (__file__, os.path.join(os.path.dirname(__file__), 'middleware.py'))
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+def normalize(sql):
+    """Shape of a query: parameters are already placeholders, so only
+    IN lists of varying length and inlined numbers (LIMIT/OFFSET) need
+    folding."""
+    return NUMBER.sub('N', IN_LIST.sub('(...)', sql))
+
+
+def call_site():
+    """First frame that belongs to the project, or the template node that is
+    rendering, walking outwards from the query."""
+    base_dir = str(settings.BASE_DIR)
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(base_dir) and 'site-packages' not in filename
+                and filename not in INSTRUMENTATION):
+            return f"{filename[len(base_dir) + 1:]}:{frame.f_lineno}"
+        node = frame.f_locals.get('self') if TEMPLATE_CODE in filename else None
+        if isinstance(node, Node) and getattr(node, 'origin', None) and node.token:
+            return f"{node.origin.template_name}:{node.token.lineno}"
+        frame = frame.f_back
+    return 'unknown'
+
+
+class QueryFingerprints:
+    def __init__(self):
+        self.counts = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        self.counts[(normalize(sql), call_site())] += 1
+        return execute(sql, params, many, context)
+
+    def repeated(self, threshold):
+        return [(shape, site, count) for (shape, site), count in self.counts.items() if count > threshold]
+
+
+@contextmanager
+def detect_queries():
+    fingerprints = QueryFingerprints()
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(fingerprints))
+        yield fingerprints
+
+
+def report(path, repeated):
+    lines = [f"Possible N+1 queries in {path}:"]
+    for shape, site, count in repeated:
+        lines.append(f"  {count}x at {site}: {shape[:200]}")
+    message = "\n".join(lines)
+    if settings.NPLUSONE_RAISE:
+        raise NPlusOneError(message)
+    logger.warning(message)
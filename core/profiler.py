@@ -0,0 +1,143 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+
+FORMS_MIXIN_FILE = os.path.join('tasks', 'forms.py')
+
+# Innermost matching frame decides where a sample's time is attributed.
+CATEGORIES = (
+    ('orm', (os.path.join('django', 'db', ''), os.path.join('psycopg', ''))),
+    ('template', (os.path.join('django', 'template', ''),)),
+    ('forms', (os.path.join('django', 'forms', ''), FORMS_MIXIN_FILE)),
+)
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def categorize(frame):
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        for category, markers in CATEGORIES:
+            if any(marker in filename for marker in markers):
+                return category
+        frame = frame.f_back
+    return 'python'
+
+
+class Profile:
+    def __init__(self, label):
+        self.label = label
+        self.started = time.time()
+        self.stacks = Counter()
+        self.categories = Counter()
+
+    def add(self, frame):
+        category = categorize(frame)
+        stack = []
+        while frame is not None:
+            stack.append(frame_label(frame))
+            frame = frame.f_back
+        stack.append(f"[{category}]")
+        self.stacks[";".join(reversed(stack))] += 1
+        self.categories[category] += 1
+
+    def write(self):
+        """Write a folded-stack file (flamegraph.pl / speedscope import) and a
+        JSON summary of where the samples landed."""
+        with sampler.lock:
+            stacks = self.stacks.copy()
+            categories = dict(self.categories)
+        output_dir = Path(settings.PROFILER_OUTPUT_DIR)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started))}-{self.label}"
+        with open(output_dir / f"{name}.folded", 'w') as folded:
+            for stack, count in stacks.most_common():
+                folded.write(f"{stack} {count}\n")
+        with open(output_dir / f"{name}.json", 'w') as summary:
+            json.dump({
+                'label': self.label,
+                'interval': settings.PROFILER_INTERVAL,
+                'samples': sum(categories.values()),
+                'categories': categories,
+            }, summary, indent=2)
+        return output_dir / f"{name}.folded"
+
+
+class Sampler:
+    """One background thread that snapshots the stacks of every attached
+    request thread each PROFILER_INTERVAL seconds. It only runs while
+    something is attached, so unprofiled requests pay nothing."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.targets = {}
+        self.thread = None
+
+    def attach(self, profile):
+        with self.lock:
+            self.targets[threading.get_ident()] = profile
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='profiler-sampler', daemon=True)
+                self.thread.start()
+
+    def detach(self):
+        with self.lock:
+            self.targets.pop(threading.get_ident(), None)
+
+    def run(self):
+        while True:
+            with self.lock:
+                if not self.targets:
+                    self.thread = None
+                    return
+                frames = sys._current_frames()
+                for ident, profile in self.targets.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        profile.add(frame)
+            time.sleep(settings.PROFILER_INTERVAL)
+
+
+sampler = Sampler()
+
+_window_lock = threading.Lock()
+_window = {'profile': None, 'until': 0.0}
+
+
+def open_window(seconds):
+    with _window_lock:
+        if _window['profile'] is None:
+            _window['profile'] = Profile(f"window-{seconds}s")
+        _window['until'] = time.time() + seconds
+        return _window['profile']
+
+
+def current_window():
+    if _window['profile'] is None:
+        return None
+    with _window_lock:
+        if _window['profile'] is not None and _window['until'] > time.time():
+            return _window['profile']
+    return None
+
+
+def close_expired_window():
+    """Write the window profile once its time is up. Checked at the start of
+    every request, so the file appears with the first request after expiry."""
+    if _window['profile'] is None:
+        return
+    with _window_lock:
+        profile = _window['profile']
+        if profile is None or _window['until'] > time.time():
+            return
+        _window['profile'] = None
+    profile.write()
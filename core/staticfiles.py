@@ -0,0 +1,78 @@
+import gzip
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import brotli
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestFilesMixin, ManifestStaticFilesStorage
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico', '.ttf')
+# Below this, the encoding headers cost more than compression saves.
+MIN_COMPRESS_SIZE = 512
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def compress_file(path):
+    """Write .gz and .br siblings of `path`, keeping only those that are
+    actually smaller. Both codecs release the GIL, so threads scale."""
+    with open(path, 'rb') as source:
+        data = source.read()
+    written = []
+    for suffix, compress in (
+        ('.gz', lambda data: gzip.compress(data, compresslevel=9, mtime=0)),
+        ('.br', lambda data: brotli.compress(data, quality=11)),
+    ):
+        compressed = compress(data)
+        if len(compressed) < len(data):
+            with open(path + suffix, 'wb') as target:
+                target.write(compressed)
+            written.append(path + suffix)
+        elif os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that also precompresses every collected
+    text asset, in parallel over STATIC_COMPRESS_WORKERS threads.
+
+    The manifest is only read the first time a hashed name is needed rather
+    than when the storage is built, so importing it (e.g. in a preloading
+    server master) does no file I/O.
+    """
+    _hashed_files = None
+
+    def load_manifest(self):
+        return None, ''
+
+    @property
+    def hashed_files(self):
+        if self._hashed_files is None:
+            self._hashed_files, self.manifest_hash = ManifestFilesMixin.load_manifest(self)
+        return self._hashed_files
+
+    @hashed_files.setter
+    def hashed_files(self, value):
+        self._hashed_files = value
+
+    def post_process(self, paths, dry_run=False, **options):
+        collected = set(paths)
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                collected.add(hashed_name)
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+
+        targets = [
+            self.path(name) for name in collected
+            if name.endswith(COMPRESSIBLE_EXTENSIONS) and self.exists(name)
+            and self.size(name) >= MIN_COMPRESS_SIZE
+        ]
+        with ThreadPoolExecutor(max_workers=settings.STATIC_COMPRESS_WORKERS) as pool:
+            # list() re-raises the first failure instead of dropping it
+            list(pool.map(compress_file, targets))
+
+    def immutable_names(self):
+        """Collected names that carry a content hash and can be cached forever."""
+        return set(self.hashed_files.values())
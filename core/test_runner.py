@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+# A process-local cache instead of the shared Redis one.
+LOCAL_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def uncollected_static_storages():
+    """STORAGES with static files served by name, for code that renders
+    templates with DEBUG off but without a collectstatic manifest."""
+    return {
+        **settings.STORAGES,
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    }
+
+
+class NPlusOneTestRunner(DiscoverRunner):
+    """Test runner that turns N+1 warnings from NPlusOneMiddleware into errors.
+
+    Tests render templates with DEBUG off, so {% static %} would need a
+    collectstatic manifest; they use the plain static storage instead. They
+    also get a process-local cache rather than the shared Redis one, so a
+    run neither needs a server nor sees another run's generation counter.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.NPLUSONE_RAISE = True
+        settings.STORAGES = uncollected_static_storages()
+        self.local_cache = override_settings(CACHES=LOCAL_CACHES)
+        self.local_cache.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.local_cache.disable()
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,440 @@
-from django.test import TestCase
+import datetime
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import brotli
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import Group, Permission
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template import engines
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from core import bench, profiler
+from core.management.commands.bench_views import Command as BenchViewsCommand
+from core.metrics import registry
+from core.middleware import (
+    IMMUTABLE_CACHE_CONTROL, RequestMetricsMiddleware, SamplingProfilerMiddleware, StaticFilesMiddleware,
+    render_timer,
+)
+from core.nplusone import NPlusOneError, detect_queries, normalize
+from task_management.db_router import PrimaryPinMiddleware, PrimaryReplicaRouter
+from tasks.models import Project, Task, TaskDetail
+from tasks.urls import urlpatterns as task_urlpatterns
+from users.models import CustomUser
+from users.urls import urlpatterns as user_urlpatterns
+
+ROWS = 8
+
+
+@override_settings(NPLUSONE_ENABLED=True, NPLUSONE_RAISE=True, NPLUSONE_THRESHOLD=ROWS - 2)
+class NoNPlusOneTests(TestCase):
+    """Every URL of the tasks and users apps must run in a bounded number of
+    queries however many rows it shows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            'boss', email='boss@example.com', password='Secret#123', is_superuser=True, is_staff=True)
+        for name in ('Admin', 'Manager', 'Employee'):
+            group, created = Group.objects.get_or_create(name=name)
+            group.permissions.set(Permission.objects.all()[:ROWS])
+            cls.user.groups.add(group)
+
+        employees = [
+            CustomUser.objects.create_user(f'employee{i}', email=f'employee{i}@example.com')
+            for i in range(ROWS)
+        ]
+        projects = [
+            Project.objects.create(name=f'Project {i}', start_date=datetime.date.today())
+            for i in range(ROWS)
+        ]
+        parent = None
+        for i in range(ROWS):
+            task = Task.objects.create(
+                project=projects[i % len(projects)], title=f'Task {i}', description='Description',
+                due_date=datetime.date.today(), parent=parent)
+            task.assigned_to.set(employees)
+            TaskDetail.objects.create(task=task)
+            parent = parent or task
+        # The first task, with the others as its subtasks.
+        cls.task = parent
+
+    def url_kwargs(self, pattern):
+        values = {
+            'task_id': self.task.id,
+            'id': self.task.id,
+            'project_id': self.task.project_id,
+            'user_id': self.user.id,
+            'upload_id': uuid.uuid4(),
+            'uidb64': urlsafe_base64_encode(force_bytes(self.user.pk)),
+            'token': default_token_generator.make_token(self.user),
+        }
+        return {name: values[name] for name in pattern.pattern.converters}
+
+    def test_no_repeated_queries(self):
+        self.client.force_login(self.user)
+        for urlpatterns in (task_urlpatterns, user_urlpatterns):
+            for pattern in urlpatterns:
+                if pattern.name in ('sign-out',):
+                    continue
+                if pattern.name:
+                    path = reverse(pattern.name, kwargs=self.url_kwargs(pattern))
+                else:
+                    path = '/users/' + str(pattern.pattern).replace(
+                        '<int:user_id>', str(self.user.id)).replace('<str:token>', 'token')
+                with self.subTest(path=path):
+                    try:
+                        self.client.get(path)
+                    except NPlusOneError as e:
+                        self.fail(str(e))
+
+    def test_detects_repeated_queries(self):
+        with detect_queries() as fingerprints:
+            for task in Task.objects.all():
+                task.details
+        repeated = fingerprints.repeated(ROWS - 2)
+        self.assertEqual(len(repeated), 1)
+        self.assertEqual(repeated[0][2], ROWS)
+        self.assertTrue(repeated[0][1].startswith('core/tests.py:'))
+
+    def test_normalize_folds_in_lists_and_numbers(self):
+        self.assertEqual(
+            normalize('SELECT * FROM t WHERE id IN (%s, %s, %s) LIMIT 21'),
+            normalize('SELECT * FROM t WHERE id IN (%s, %s) LIMIT 5'),
+        )
+
+
+class MetricsTests(TestCase):
+
+    def observed(self, name, view):
+        histogram = registry.histograms.get((name, view))
+        return (histogram.count, histogram.sum) if histogram else (0, 0)
+
+    def test_endpoint_needs_staff_token_or_listed_address(self):
+        self.assertEqual(self.client.get('/metrics/').status_code, 403)
+        with override_settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.client.get('/metrics/', headers={'Authorization': 'Bearer nope'}).status_code, 403)
+            self.assertEqual(self.client.get('/metrics/', headers={'Authorization': 'Bearer s3cret'}).status_code, 200)
+        with override_settings(METRICS_ALLOWED_IPS=['127.0.0.1']):
+            self.assertEqual(self.client.get('/metrics/').status_code, 200)
+        self.client.force_login(CustomUser.objects.create_user('staff', is_staff=True))
+        self.assertEqual(self.client.get('/metrics/').status_code, 200)
+
+    def test_streaming_response_is_timed_until_sent(self):
+        request = RequestFactory().get('/')
+        request.resolver_match = SimpleNamespace(view_name='test-streaming')
+        middleware = RequestMetricsMiddleware(lambda request: StreamingHttpResponse(['ab', b'cde', 'f']))
+        before = self.observed('django_response_size_bytes', 'test-streaming')
+
+        response = middleware(request)
+        self.assertEqual(self.observed('django_response_size_bytes', 'test-streaming'), before)
+        self.assertEqual(b''.join(response.streaming_content), b'abcdef')
+        count, size = self.observed('django_response_size_bytes', 'test-streaming')
+        self.assertEqual((count, size), (before[0] + 1, before[1] + 6))
+
+    def test_plain_response_is_recorded_right_away(self):
+        request = RequestFactory().get('/')
+        request.resolver_match = SimpleNamespace(view_name='test-plain')
+        before = self.observed('django_request_duration_seconds', 'test-plain')[0]
+        RequestMetricsMiddleware(lambda request: HttpResponse('hello'))(request)
+        self.assertEqual(self.observed('django_request_duration_seconds', 'test-plain')[0], before + 1)
+
+    def test_template_render_time_is_recorded_for_rendering_views(self):
+        engine = engines['django']
+        renders = []
+
+        def view(request):
+            # A template rendered inside another one is part of its time.
+            inner = lambda: engine.from_string('{{ 1 }}').render()
+            response = HttpResponse(engine.from_string('{{ inner }}').render({'inner': inner}))
+            renders.append(dict(render_timer.get()))
+            return response
+
+        request = RequestFactory().get('/')
+        request.resolver_match = SimpleNamespace(view_name='test-render')
+        before = self.observed('django_template_render_seconds', 'test-render')
+        RequestMetricsMiddleware(view)(request)
+        self.assertEqual(renders[0]['renders'], 1)
+        self.assertEqual(renders[0]['depth'], 0)
+        count, total = self.observed('django_template_render_seconds', 'test-render')
+        self.assertEqual(count, before[0] + 1)
+        self.assertAlmostEqual(total - before[1], renders[0]['time'])
+
+        request.resolver_match = SimpleNamespace(view_name='test-no-render')
+        RequestMetricsMiddleware(lambda request: HttpResponse('hello'))(request)
+        self.assertEqual(self.observed('django_template_render_seconds', 'test-no-render'), (0, 0))
+        # Outside a measured request, rendering records nothing.
+        self.assertEqual(engine.from_string('{{ 1 }}').render(), '1')
+        self.assertIsNone(render_timer.get())
+
+
+class SamplingProfilerTests(TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+        settings = override_settings(PROFILER_OUTPUT_DIR=self.output_dir, PROFILER_INTERVAL=0.001)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def profiled(self, user, view):
+        request = RequestFactory().get('/', headers={'X-Profile': 'request'})
+        request.user = user
+        request.resolver_match = SimpleNamespace(url_name='busy')
+        return SamplingProfilerMiddleware(view)(request)
+
+    def test_staff_requests_get_a_folded_stack_file(self):
+        def view(request):
+            deadline = time.monotonic() + 0.05
+            while time.monotonic() < deadline:
+                list(Project.objects.all())
+            return HttpResponse('ok')
+
+        response = self.profiled(CustomUser(is_staff=True), view)
+        folded = Path(self.output_dir) / response['X-Profile-File']
+        self.assertTrue(folded.name.endswith('-request-busy.folded'))
+        stacks = folded.read_text().splitlines()
+        self.assertTrue(stacks)
+        self.assertTrue(all(line.startswith('[') and line.rsplit(' ', 1)[1].isdigit() for line in stacks))
+        summary = json.loads(folded.with_suffix('.json').read_text())
+        self.assertGreater(summary['categories'].get('orm', 0), 0)
+        self.assertEqual(summary['samples'], sum(summary['categories'].values()))
+
+    def test_other_users_are_not_sampled(self):
+        response = self.profiled(CustomUser(), lambda request: HttpResponse('ok'))
+        self.assertNotIn('X-Profile-File', response)
+        self.assertEqual(os.listdir(self.output_dir), [])
+
+    def test_samples_are_put_down_to_the_innermost_known_layer(self):
+        def frame(filename, back=None):
+            return SimpleNamespace(f_code=SimpleNamespace(co_filename=filename, co_name='f'), f_back=back)
+
+        view = frame('/app/tasks/views.py')
+        self.assertEqual(profiler.categorize(view), 'python')
+        template = frame('/site-packages/django/template/base.py', view)
+        self.assertEqual(profiler.categorize(frame('/site-packages/django/db/models/query.py', template)), 'orm')
+        self.assertEqual(profiler.categorize(frame('/app/tasks/templatetags/extras.py', template)), 'template')
+
+    def test_async_requests_are_not_sampled(self):
+        async def view(request):
+            return HttpResponse('ok')
+
+        request = RequestFactory().get('/', headers={'X-Profile': 'request'})
+        request.user = CustomUser(is_staff=True)
+        response = async_to_sync(SamplingProfilerMiddleware(view))(request)
+        self.assertNotIn('X-Profile-File', response)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'], REPLICA_MAX_LAG=5, REPLICA_PIN_SECONDS=10)
+class PrimaryReplicaRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.lag = {'replica1': 0.5, 'replica2': 0.5}
+        patcher = mock.patch('task_management.db_router.replica_lag', side_effect=self.lag.get)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def read_alias(self, request):
+        aliases = []
+
+        def view(request):
+            aliases.append(self.router.db_for_read(Task))
+            return HttpResponse()
+
+        PrimaryPinMiddleware(view)(request)
+        return aliases[0]
+
+    def test_reads_go_to_replicas_that_keep_up(self):
+        self.assertIn(self.router.db_for_read(Task), ('replica1', 'replica2'))
+        self.lag.update(replica1=30, replica2=None)
+        self.assertEqual(self.router.db_for_read(Task), 'default')
+        self.lag['replica2'] = 1
+        self.assertEqual(self.router.db_for_read(Task), 'replica2')
+        self.assertEqual(self.router.db_for_write(Task), 'default')
+
+    def test_writes_pin_the_following_reads_to_the_primary(self):
+        factory = RequestFactory()
+        self.assertEqual(self.read_alias(factory.post('/')), 'default')
+        response = PrimaryPinMiddleware(lambda request: HttpResponse())(factory.post('/'))
+        pinned_until = response.cookies[PrimaryPinMiddleware.cookie_name].value
+
+        self.assertEqual(self.read_alias(factory.get('/', headers={'Cookie': f'db_pinned_until={pinned_until}'})),
+                         'default')
+        self.assertNotEqual(self.read_alias(factory.get('/', headers={'Cookie': 'db_pinned_until=1'})), 'default')
+        self.assertNotEqual(self.read_alias(factory.get('/')), 'default')
+        # The pin ends with the request.
+        self.assertNotEqual(self.router.db_for_read(Task), 'default')
+
+    def test_async_requests_are_pinned_too(self):
+        aliases = []
+
+        async def view(request):
+            aliases.append(self.router.db_for_read(Task))
+            return HttpResponse()
+
+        async_to_sync(PrimaryPinMiddleware(view))(RequestFactory().post('/'))
+        self.assertEqual(aliases, ['default'])
+
+
+class PoolStatsTests(TestCase):
+
+    def test_staff_see_each_alias_pool(self):
+        self.assertEqual(self.client.get(reverse('db-pool-stats')).status_code, 302)
+        self.client.force_login(CustomUser.objects.create_user('staff', is_staff=True))
+        self.assertEqual(self.client.get(reverse('db-pool-stats')).json()['default'], {'pool': False})
+
+        pool = mock.Mock(**{'get_stats.return_value': {'pool_size': 2, 'pool_available': 1}})
+        with mock.patch.object(type(connections['default']), 'pool', new_callable=mock.PropertyMock,
+                               return_value=pool):
+            self.assertEqual(self.client.get(reverse('db-pool-stats')).json()['default'],
+                             {'pool_size': 2, 'pool_available': 1})
+
+    def test_connections_are_health_checked_before_reuse(self):
+        self.assertTrue(connections['default'].settings_dict['CONN_HEALTH_CHECKS'])
+
+
+class BenchTests(TransactionTestCase):
+    # The suite seeds through populate_db --clear, which truncates tables.
+
+    def test_suite_measures_each_view(self):
+        results = bench.Suite(scale=1, iterations=2).run(only={'task_details', 'delete_task', 'sign_in'})
+        self.assertEqual(set(results), {'task_details', 'delete_task', 'sign_in'})
+        for result in results.values():
+            self.assertGreater(result['queries'], 0)
+            self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+            self.assertLessEqual(result['p95_ms'], result['p99_ms'])
+
+    def test_failing_views_stop_the_suite(self):
+        scenario = bench.Scenario('missing', 'manager', 'get', lambda s, t: '/no-such-page/')
+        with mock.patch.object(bench, 'SCENARIOS', [scenario]):
+            with self.assertRaisesMessage(RuntimeError, 'missing: GET /no-such-page/ returned 404'):
+                bench.Suite(scale=1, iterations=2).run()
+
+
+class BenchCheckTests(SimpleTestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        self.path = Path(self.dir) / 'baseline.json'
+        self.baseline = {1: {'task_details': {
+            'p50_ms': 10.0, 'p95_ms': 20.0, 'p99_ms': 30.0, 'queries': 8, 'alloc_kib': 100.0}}}
+
+    def check(self, current):
+        with mock.patch.object(BenchViewsCommand, 'benchmark', return_value=current) as benchmark:
+            call_command('bench_check', baseline=str(self.path), tolerance=0.25,
+                         stdout=io.StringIO(), stderr=io.StringIO())
+        return benchmark
+
+    def test_compare_allows_the_tolerance_but_no_extra_queries(self):
+        old = self.baseline[1]['task_details']
+        slower = {**old, 'p50_ms': 12.5, 'p99_ms': 300.0}
+        self.assertEqual(list(bench.compare(self.baseline, {1: {'task_details': slower}}, 0.25)), [])
+        worse = {**old, 'queries': 9, 'p95_ms': 25.1}
+        self.assertEqual(list(bench.compare(self.baseline, {1: {'task_details': worse}}, 0.25)), [
+            (1, 'task_details', 'queries', 8, 9), (1, 'task_details', 'p95_ms', 20.0, 25.1)])
+        self.assertEqual(list(bench.compare(self.baseline, {}, 0.25)), [])
+
+    def test_reruns_the_baseline_scales(self):
+        with self.assertRaisesMessage(CommandError, 'run bench_views --save first'):
+            self.check(self.baseline)
+        bench.save_baseline(self.path, self.baseline, iterations=30)
+        self.assertEqual(bench.load_baseline(self.path)['results'], self.baseline)
+
+        benchmark = self.check(self.baseline)
+        self.assertEqual(benchmark.call_args.args[0], [1])
+        regressed = {1: {'task_details': {**self.baseline[1]['task_details'], 'alloc_kib': 200.0}}}
+        with self.assertRaisesMessage(CommandError, '1 benchmark regression(s)'):
+            self.check(regressed)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                                           'LOCATION': 'redis://127.0.0.1:1/0'}})
+    def test_benchmarks_use_a_local_cache(self):
+        backends = []
+        command = 'core.management.commands.bench_views'
+        with mock.patch(f'{command}.setup_test_environment'), mock.patch(f'{command}.teardown_test_environment'), \
+                mock.patch(f'{command}.setup_databases'), mock.patch(f'{command}.teardown_databases'), \
+                mock.patch.object(bench, 'Suite') as suite:
+            suite.return_value.run.side_effect = lambda only: backends.append(type(caches['default']).__name__)
+            BenchViewsCommand().benchmark([1], {'views': None, 'iterations': 2, 'workers': 1, 'keepdb': False})
+        self.assertEqual(backends, ['LocMemCache'])
+        self.assertEqual(type(caches['default']).__name__, 'RedisCache')
+
+
+class StaticFilesTests(SimpleTestCase):
+
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.dir)
+        source = self.dir / 'source'
+        (source / 'css').mkdir(parents=True)
+        (source / 'css' / 'site.css').write_text('body { color: #123456; }\n' * 100)
+        (source / 'tiny.js').write_text('let x = 1;\n')
+        settings = override_settings(
+            STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+            STATICFILES_DIRS=[source], STATIC_ROOT=self.dir / 'root', STATIC_COMPRESS_WORKERS=2,
+            STORAGES={'staticfiles': {'BACKEND': 'core.staticfiles.CompressedManifestStaticFilesStorage'}})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.hashed = json.loads((self.dir / 'root' / 'staticfiles.json').read_text())['paths']['css/site.css']
+
+    def get(self, name, **headers):
+        response = StaticFilesMiddleware(lambda request: HttpResponse('app'))(
+            RequestFactory().get(f'/static/{name}', headers=headers))
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, content
+
+    def test_collectstatic_precompresses_text_assets(self):
+        root = self.dir / 'root'
+        for name in ('css/site.css', self.hashed):
+            self.assertEqual(gzip.decompress((root / f'{name}.gz').read_bytes()), (root / name).read_bytes())
+            self.assertEqual(brotli.decompress((root / f'{name}.br').read_bytes()), (root / name).read_bytes())
+        self.assertFalse((root / 'tiny.js.gz').exists())
+        self.assertFalse((root / 'tiny.js.br').exists())
+
+    def test_serves_the_accepted_encoding(self):
+        plain = (self.dir / 'root' / self.hashed).read_bytes()
+        response, content = self.get(self.hashed, accept_encoding='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(content), plain)
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['Content-Type'], 'text/css')
+
+        response, content = self.get(self.hashed, accept_encoding='br;q=0, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(content), plain)
+        response, content = self.get(self.hashed)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(content, plain)
+
+    def test_only_hashed_names_are_immutable(self):
+        response, _ = self.get(self.hashed)
+        self.assertEqual(response['Cache-Control'], IMMUTABLE_CACHE_CONTROL)
+        response, _ = self.get('tiny.js')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertNotIn('Vary', response)
+
+        response, _ = self.get('tiny.js', if_modified_since=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_other_paths_reach_the_app(self):
+        for name in ('missing.css', '../source/tiny.js', 'css'):
+            self.assertEqual(self.get(name)[1], b'app')
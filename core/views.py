@@ -1,4 +1,11 @@
+import hmac
+
 from django.shortcuts import render
+from django.http import JsonResponse, HttpResponse, HttpResponseForbidden
+from django.conf import settings
+from django.db import connections
+from django.contrib.auth.decorators import user_passes_test
+from core.metrics import registry
 
 # Create your views here.
 def home(request):
@@ -9,4 +16,25 @@ def home(request):
     return render(request,'home.html')
 
 def no_permission(request):
-    return render(request,'no_permission.html')
\ No newline at end of file
+    return render(request,'no_permission.html')
+
+@user_passes_test(lambda user: user.is_staff, login_url='no-permission')
+def db_pool_stats(request):
+    stats = {}
+    for alias in connections:
+        pool = getattr(connections[alias], 'pool', None)
+        stats[alias] = pool.get_stats() if pool else {'pool': False}
+    return JsonResponse(stats)
+
+
+def metrics_allowed(request):
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if settings.METRICS_TOKEN and scheme.lower() == 'bearer' and hmac.compare_digest(token, settings.METRICS_TOKEN):
+        return True
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS or request.user.is_staff
+
+
+def metrics(request):
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.export(), content_type='text/plain; version=0.0.4; charset=utf-8')
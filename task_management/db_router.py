@@ -0,0 +1,118 @@
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_pinned_to_primary = ContextVar('pinned_to_primary', default=False)
+# alias -> (checked_at, lag in seconds or None when unreachable)
+_replica_lag = {}
+
+LAG_QUERY = """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+
+def replica_lag(alias):
+    """Replication lag of a replica, re-checked at most every
+    REPLICA_LAG_CHECK_INTERVAL seconds per process.
+
+    A database that is not in recovery (e.g. a plain local database standing
+    in for a replica) reports no lag.
+    """
+    checked_at, lag = _replica_lag.get(alias, (None, None))
+    now = time.monotonic()
+    if checked_at is not None and now - checked_at < settings.REPLICA_LAG_CHECK_INTERVAL:
+        return lag
+
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(LAG_QUERY)
+            row = cursor.fetchone()
+        lag = float(row[0] or 0)
+    except DatabaseError:
+        lag = None
+    _replica_lag[alias] = (now, lag)
+    return lag
+
+
+class PrimaryReplicaRouter:
+    """Send writes to `default` and reads to a replica that is not lagging.
+
+    Reads stay on the primary while the request is pinned (see
+    PrimaryPinMiddleware) or inside a transaction on the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _pinned_to_primary.get() or connections['default'].in_atomic_block:
+            return 'default'
+        replicas = []
+        for alias in settings.DATABASE_REPLICAS:
+            lag = replica_lag(alias)
+            if lag is not None and lag <= settings.REPLICA_MAX_LAG:
+                replicas.append(alias)
+        return random.choice(replicas) if replicas else 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class PrimaryPinMiddleware:
+    """Read-your-writes: a non-safe request and every request for
+    REPLICA_PIN_SECONDS after it (tracked with a timestamp cookie) read from
+    the primary."""
+    cookie_name = 'db_pinned_until'
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _pinned_to_primary.set(self.pinned(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _pinned_to_primary.reset(token)
+        return self.remember_write(request, response)
+
+    async def __acall__(self, request):
+        token = _pinned_to_primary.set(self.pinned(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _pinned_to_primary.reset(token)
+        return self.remember_write(request, response)
+
+    def pinned(self, request):
+        try:
+            pinned_until = float(request.COOKIES.get(self.cookie_name, 0))
+        except ValueError:
+            pinned_until = 0
+        return request.method not in SAFE_METHODS or pinned_until > time.time()
+
+    def remember_write(self, request, response):
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(
+                self.cookie_name, str(time.time() + settings.REPLICA_PIN_SECONDS),
+                max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax')
+        return response
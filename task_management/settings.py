@@ -1,5 +1,5 @@
 from pathlib import Path
-from decouple import config
+from decouple import config, Csv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -26,6 +26,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "tasks",
     "users",
     "core",
@@ -33,12 +34,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.StaticFilesMiddleware",
+    "core.middleware.RequestMetricsMiddleware",
+    "core.middleware.NPlusOneMiddleware",
     "debug_toolbar.middleware.DebugToolbarMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "task_management.db_router.PrimaryPinMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core.middleware.SamplingProfilerMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -51,6 +57,90 @@ INTERNAL_IPS = [
     # ...
 ]
 
+# /metrics/ is for staff, and for scrapers sending "Authorization: Bearer
+# <METRICS_TOKEN>" or connecting from METRICS_ALLOWED_IPS. Both are off
+# unless set: behind a reverse proxy every request's REMOTE_ADDR is the
+# proxy's, so only list addresses the app is reached from directly.
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+METRICS_ALLOWED_IPS = config('METRICS_ALLOWED_IPS', default='', cast=Csv())
+
+# N+1 detection: a query shape repeated more than NPLUSONE_THRESHOLD times
+# from one call site is logged, and raised under the test runner.
+NPLUSONE_ENABLED = config('NPLUSONE_ENABLED', default=True, cast=bool)
+NPLUSONE_THRESHOLD = config('NPLUSONE_THRESHOLD', default=5, cast=int)
+NPLUSONE_RAISE = False
+TEST_RUNNER = 'core.test_runner.NPlusOneTestRunner'
+
+# Staff-only sampling profiler (see core.middleware.SamplingProfilerMiddleware)
+PROFILER_OUTPUT_DIR = BASE_DIR / 'profiles'
+PROFILER_INTERVAL = config('PROFILER_INTERVAL', default=0.005, cast=float)
+PROFILER_WINDOW_SECONDS = 30
+PROFILER_MAX_WINDOW_SECONDS = 600
+
+# Live task events for dashboards (Server-Sent Events, ASGI only). A
+# connection with more than TASK_EVENTS_MAX_PENDING unsent task changes is
+# told to reload instead.
+TASK_EVENTS_BACKEND = 'tasks.events.InMemoryBroker'
+TASK_EVENTS_MAX_PENDING = 500
+TASK_EVENTS_HEARTBEAT = 15
+
+# `manage.py archive_tasks` (run it daily from cron) moves completed tasks
+# that haven't changed for TASK_ARCHIVE_AFTER_DAYS into the archive tables,
+# TASK_ARCHIVE_BATCH_SIZE tasks per transaction.
+TASK_ARCHIVE_AFTER_DAYS = config('TASK_ARCHIVE_AFTER_DAYS', default=90, cast=int)
+TASK_ARCHIVE_BATCH_SIZE = 2000
+
+# `manage.py send_reminders` mails assignees TASK_REMINDER_LEAD_DAYS before
+# an open task is due and once more the day after it's overdue.
+TASK_REMINDER_LEAD_DAYS = config('TASK_REMINDER_LEAD_DAYS', default=1, cast=int)
+TASK_REMINDER_BATCH_SIZE = 500
+
+# `manage.py import_tasks` inserts TASK_IMPORT_BATCH_SIZE tasks per transaction,
+# and its summary mail goes out Bcc to at most TASK_IMPORT_MAIL_RECIPIENTS
+# assignees per message (mail servers commonly refuse more than 100).
+TASK_IMPORT_BATCH_SIZE = 5000
+TASK_IMPORT_MAIL_RECIPIENTS = 50
+
+# Shared by every process: the task data generation (tasks.workload) that
+# the cached reports, facets and roll-ups and the pages' ETags are keyed on
+# must move for all of them when any one of them writes. REDIS_URL is
+# required (e.g. redis://127.0.0.1:6379/1). While Redis can't be reached,
+# writes still succeed and pages are computed afresh, without ETags; the
+# short timeouts keep that from stalling every request.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config('REDIS_URL'),
+        'KEY_PREFIX': 'task_management',
+        'OPTIONS': {
+            'socket_connect_timeout': config('REDIS_CONNECT_TIMEOUT', default=0.5, cast=float),
+            'socket_timeout': config('REDIS_TIMEOUT', default=0.5, cast=float),
+        },
+    }
+}
+
+# Per-employee workload report (tasks.workload); task changes invalidate it
+# right away, this only bounds how long an idle entry is kept.
+WORKLOAD_CACHE_SECONDS = 300
+
+# Manager dashboard facet counts (tasks.facets), cached like the workload
+# report per filter combination until the next task change.
+DASHBOARD_FACET_CACHE_SECONDS = 300
+
+# Auto-assign on task creation (tasks.autoassign) picks the employees with
+# the lowest open-task load, each open task weighing its priority's weight.
+# Loads are kept in memory per process, loaded when the server starts and,
+# to see other processes' changes, re-read in the background for the
+# employees just chosen and reloaded every AUTO_ASSIGN_REFRESH_SECONDS.
+AUTO_ASSIGN_PRIORITY_WEIGHTS = {'H': 3, 'M': 2, 'L': 1}
+AUTO_ASSIGN_REFRESH_SECONDS = 60
+
+# Subtask roll-ups (tasks.hierarchy), cached per task until the next task change.
+TASK_SUBTREE_CACHE_SECONDS = 300
+
+# Written by `manage.py bench_views --save`, read by `manage.py bench_check`
+BENCHMARK_BASELINE = BASE_DIR / 'benchmarks' / 'baseline.json'
+
 ROOT_URLCONF = "task_management.urls"
 
 TEMPLATES = [
@@ -96,6 +186,45 @@ DATABASES = {
     }
 }
 
+# Connection reuse. With DB_POOL on, each worker process keeps a psycopg pool
+# (Django 5.1+); without it DB_CONN_MAX_AGE can still keep one persistent
+# connection per thread. Either way connections are health checked before
+# being reused.
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+if config('DB_POOL', default=False, cast=bool):
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+            'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+            'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),
+            'max_idle': config('DB_POOL_MAX_IDLE', default=300, cast=float),
+        }
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = config('DB_CONN_MAX_AGE', default=0, cast=int)
+
+# Read replicas, e.g. DB_REPLICAS=replica-1:5432,replica-2 or, for two local
+# databases, DB_REPLICAS=localhost/task_db_replica. Each one becomes a
+# `replicaN` alias that inherits the primary's credentials and options.
+DATABASE_REPLICAS = []
+for number, replica in enumerate(config('DB_REPLICAS', default='', cast=Csv()), start=1):
+    address, _, name = replica.partition('/')
+    host, _, port = address.partition(':')
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host or DATABASES['default']['HOST'],
+        'PORT': int(port) if port else DATABASES['default']['PORT'],
+        'NAME': name or DATABASES['default']['NAME'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['task_management.db_router.PrimaryReplicaRouter']
+REPLICA_MAX_LAG = config('DB_REPLICA_MAX_LAG', default=5, cast=float)
+REPLICA_LAG_CHECK_INTERVAL = config('DB_REPLICA_LAG_CHECK_INTERVAL', default=2, cast=float)
+REPLICA_PIN_SECONDS = config('DB_REPLICA_PIN_SECONDS', default=10, cast=int)
+
 FRONTEND_URL = config('FRONTEND_URL')
 
 #mail
@@ -146,9 +275,27 @@ STATICFILES_DIRS = [
     BASE_DIR/'static/',
 ]
 
+# collectstatic writes content-hashed names plus .gz/.br siblings here;
+# core.middleware.StaticFilesMiddleware serves them.
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "core.staticfiles.CompressedManifestStaticFilesStorage"},
+}
+STATIC_COMPRESS_WORKERS = config('STATIC_COMPRESS_WORKERS', default=4, cast=int)
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Chunked task asset uploads. The temp dir must live on the same filesystem
+# as MEDIA_ROOT so finished files can be moved in with an atomic rename.
+ASSET_UPLOAD_CHUNK_SIZE = config('ASSET_UPLOAD_CHUNK_SIZE', default=4 * 1024 * 1024, cast=int)
+ASSET_UPLOAD_TEMP_DIR = BASE_DIR / 'upload_tmp'
+ASSET_UPLOAD_MAX_SIZE = config('ASSET_UPLOAD_MAX_SIZE', default=50 * 1024 * 1024, cast=int)
+# Uploads without a chunk for this long are refused and, by
+# `manage.py cleanup_uploads` (run it hourly from cron), deleted.
+ASSET_UPLOAD_EXPIRE_HOURS = config('ASSET_UPLOAD_EXPIRE_HOURS', default=24, cast=int)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.urls import path,include
 from debug_toolbar.toolbar import debug_toolbar_urls
-from core.views import home,no_permission
+from core.views import home,no_permission,db_pool_stats,metrics
 from django.conf.urls.static import static
 from django.conf import settings
 
@@ -9,6 +9,8 @@ urlpatterns = [
     path("admin/", admin.site.urls),
     path("", home, name='home'),
     path("no-permission/", no_permission, name='no-permission'),
+    path("db-pool-stats/", db_pool_stats, name='db-pool-stats'),
+    path("metrics/", metrics, name='metrics'),
     path("tasks/", include("tasks.urls")),
     path("users/", include("users.urls"))
 ] + debug_toolbar_urls()
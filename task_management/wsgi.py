@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "task_management.settings")
 
 application = get_wsgi_application()
+
+# Load the auto-assign balancer in the background now, not in the first
+# request that creates a task.
+from tasks.autoassign import balancer  # noqa: E402
+
+balancer.refresh()
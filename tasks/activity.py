@@ -0,0 +1,115 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from tasks.models import TaskActivity
+
+# Bookkeeping fields that change on every save and say nothing about the edit.
+IGNORED_FIELDS = ('id', 'task', 'created_at', 'updated_at')
+
+_current = ContextVar('task_activity', default=None)
+
+
+def field_values(instance):
+    return {
+        field.name: field.value_to_string(instance)
+        for field in instance._meta.concrete_fields
+        if field.name not in IGNORED_FIELDS
+    }
+
+
+class ActivityLog:
+    """Changes made during one request, merged per task and written in one
+    bulk_create at the end of the request's transaction.
+
+    A watched instance is diffed against the values it had when it was
+    loaded each time it is saved, so nothing is re-read to find out what
+    changed and edits that never reach save() (say, an invalid form) aren't
+    logged. Assignee changes arrive through m2m_changed instead.
+    """
+
+    def __init__(self, user):
+        # Often request.user, which stays lazy unless there is something to log.
+        self.user = user
+        self.watched = {}
+        self.changes = {}
+        self.projects = {}
+
+    def watch(self, instance, task):
+        """Remember `instance` (the task itself or one of its related rows)
+        as loaded. Call it before anything, e.g. a ModelForm, modifies it."""
+        if instance is not None and instance.pk is not None:
+            self.watched[id(instance)] = (instance, task, field_values(instance))
+
+    def saved(self, instance):
+        if id(instance) not in self.watched:
+            return
+        instance, task, before = self.watched[id(instance)]
+        after = field_values(instance)
+        for field, old in before.items():
+            if after[field] != old:
+                self.add(task, field, old, after[field])
+        self.watched[id(instance)] = (instance, task, after)
+
+    def add(self, task, field, old, new):
+        changes = self.changes.setdefault(task.pk, {})
+        if field in changes:
+            old = changes.pop(field)[0]
+        if old != new:
+            changes[field] = [old, new]
+        self.projects[task.pk] = task.project_id
+
+    def assignees_changed(self, task, action, pk_set):
+        changes = self.changes.setdefault(task.pk, {})
+        change = changes.setdefault('assigned_to', {'added': [], 'removed': []})
+        key, opposite = ('added', 'removed') if action == 'post_add' else ('removed', 'added')
+        for pk in pk_set:
+            if pk in change[opposite]:
+                change[opposite].remove(pk)
+            else:
+                change[key].append(pk)
+        change['added'].sort()
+        change['removed'].sort()
+        self.projects[task.pk] = task.project_id
+
+    def entries(self):
+        user = self.user if self.user is not None and self.user.is_authenticated else None
+        for task_id, changes in self.changes.items():
+            changes = {field: change for field, change in changes.items()
+                       if field != 'assigned_to' or change['added'] or change['removed']}
+            if changes:
+                yield TaskActivity(task_id=task_id, project_id=self.projects[task_id],
+                                   user=user, changes=changes)
+
+    def flush(self):
+        if not self.changes:
+            return
+        entries = list(self.entries())
+        if entries:
+            TaskActivity.objects.bulk_create(entries)
+
+
+@contextmanager
+def recording(user):
+    """Log what changes inside the block. Use it inside transaction.atomic():
+    the log is then written as the last statement of that transaction, so
+    it commits with, and only with, the changes it describes, and costs a
+    single INSERT (none when nothing changed)."""
+    log = ActivityLog(user)
+    token = _current.set(log)
+    try:
+        yield log
+    finally:
+        _current.reset(token)
+    log.flush()
+
+
+def instance_saved(instance):
+    log = _current.get()
+    if log is not None:
+        log.saved(instance)
+
+
+def assignees_changed(task, action, pk_set):
+    log = _current.get()
+    if log is not None:
+        log.assignees_changed(task, action, pk_set)
@@ -1,7 +1,50 @@
 from django.contrib import admin
 from tasks.models import *
+from tasks.paginator import EstimatedCountPaginator
 
 # Register your models here.
-admin.site.register(Task)
-admin.site.register(TaskDetail)
-admin.site.register(Project)
\ No newline at end of file
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ('title', 'project', 'status', 'due_date', 'created_at')
+    list_filter = ('status',)
+    list_select_related = ('project',)
+    # '^' searches by prefix so the Upper(title) index in Task.Meta is used
+    search_fields = ('^title',)
+    autocomplete_fields = ('project', 'assigned_to')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(TaskDetail)
+class TaskDetailAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'priority')
+    list_filter = ('priority',)
+    list_select_related = ('task',)
+    search_fields = ('^task__title',)
+    autocomplete_fields = ('task',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(Project)
+class ProjectAdmin(admin.ModelAdmin):
+    list_display = ('name', 'start_date')
+    search_fields = ('^name',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(ArchivedTask)
+class ArchivedTaskAdmin(admin.ModelAdmin):
+    list_display = ('title', 'project', 'due_date', 'updated_at', 'archived_at')
+    list_select_related = ('project',)
+    search_fields = ('^title',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    # Archived tasks are a record; changes go through the live Task table.
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,95 @@
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from tasks import workload
+from tasks.models import ArchivedTask, ArchivedTaskDetail, AssetUpload, Task, TaskDetail, TaskReminder
+
+# ArchivedTask has no parent: tasks in a hierarchy are never archived.
+TASK_COLUMNS = [field.column for field in Task._meta.concrete_fields if field.name != 'parent']
+DETAIL_COLUMNS = [field.column for field in TaskDetail._meta.concrete_fields]
+
+
+def archive_cutoff(days):
+    return timezone.now() - timedelta(days=days)
+
+
+def archivable(cutoff):
+    """Completed tasks untouched since `cutoff`. A task with an asset upload
+    still in flight stays live until the upload finishes or is cleaned up.
+    Subtasks and their parents stay live too, so subtree roll-ups
+    (tasks.hierarchy) keep counting every task of the tree."""
+    return Task.objects.filter(status='COMPLETED', updated_at__lt=cutoff, parent__isnull=True).exclude(
+        Exists(AssetUpload.objects.filter(task=OuterRef('pk')))).exclude(
+        Exists(Task.objects.filter(parent=OuterRef('pk'))))
+
+
+def move_rows(cursor, target, source, columns, key, ids, target_columns=None, extra=()):
+    """INSERT ... SELECT the rows of `source` whose `key` is in `ids` into
+    `target`; `extra` values are appended to every row."""
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(ids))
+    selected = ', '.join([quote(column) for column in columns] + ['%s'] * len(extra))
+    inserted = ', '.join(quote(column) for column in (target_columns or columns))
+    cursor.execute(
+        f"INSERT INTO {quote(target)} ({inserted}) "
+        f"SELECT {selected} FROM {quote(source)} WHERE {quote(key)} IN ({placeholders})",
+        [*extra, *ids],
+    )
+
+
+def delete_rows(cursor, table, key, ids):
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(ids))
+    cursor.execute(f"DELETE FROM {quote(table)} WHERE {quote(key)} IN ({placeholders})", ids)
+
+
+def archive_batch(cutoff, batch_size, after=0):
+    """Move up to `batch_size` archivable tasks with ids above `after`, with
+    their details and assignments, in one transaction. Returns the moved ids.
+
+    Rows are copied and deleted with plain SQL: the ORM's delete() would load
+    every task to send post_delete, and archiving is not a deletion for the
+    dashboards' live events or anyone else listening.
+    """
+    Assignment = Task.assigned_to.through
+    ArchivedAssignment = ArchivedTask.assigned_to.through
+    with transaction.atomic():
+        # Locked rows are being edited right now; they'll be picked up next run.
+        ids = list(
+            archivable(cutoff).filter(id__gt=after).order_by('id')
+            .select_for_update(skip_locked=connection.features.has_select_for_update_skip_locked)
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return ids
+        with connection.cursor() as cursor:
+            move_rows(cursor, ArchivedTask._meta.db_table, Task._meta.db_table, TASK_COLUMNS, 'id', ids,
+                      target_columns=TASK_COLUMNS + ['archived_at'], extra=[timezone.now()])
+            move_rows(cursor, ArchivedTaskDetail._meta.db_table, TaskDetail._meta.db_table, DETAIL_COLUMNS,
+                      'task_id', ids)
+            move_rows(cursor, ArchivedAssignment._meta.db_table, Assignment._meta.db_table,
+                      ['task_id', 'customuser_id'], 'task_id', ids,
+                      target_columns=['archivedtask_id', 'customuser_id'])
+            delete_rows(cursor, TaskReminder._meta.db_table, 'task_id', ids)
+            delete_rows(cursor, Assignment._meta.db_table, 'task_id', ids)
+            delete_rows(cursor, TaskDetail._meta.db_table, 'task_id', ids)
+            delete_rows(cursor, Task._meta.db_table, 'id', ids)
+    # Cached reports, facets, roll-ups and calendar counts are stale now.
+    workload.bump_generation()
+    return ids
+
+
+def archive_tasks(cutoff, batch_size):
+    """Archive everything archivable, one batch per transaction, so locks are
+    short and a failure only rolls back the batch in flight. Yields the
+    number of tasks moved per batch."""
+    after = 0
+    while True:
+        ids = archive_batch(cutoff, batch_size, after)
+        if not ids:
+            return
+        after = ids[-1]
+        yield len(ids)
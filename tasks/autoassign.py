@@ -0,0 +1,265 @@
+import heapq
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Case, Sum, Value, When
+
+from tasks.models import Task, TaskDetail
+
+OPEN_STATUSES = ('PENDING', 'IN_PROGRESS')
+
+
+def priority_weight(priority):
+    # A task whose details don't exist yet counts as low priority.
+    return settings.AUTO_ASSIGN_PRIORITY_WEIGHTS[priority or TaskDetail.LOW]
+
+
+def weighted_load():
+    return Sum(Case(
+        *[When(task__details__priority=priority, then=Value(weight))
+          for priority, weight in settings.AUTO_ASSIGN_PRIORITY_WEIGHTS.items()],
+        default=Value(priority_weight(None)),
+    ))
+
+
+def current_loads(user_ids):
+    Assignment = Task.assigned_to.through
+    loads = dict.fromkeys(user_ids, 0)
+    loads.update(Assignment.objects.filter(customuser_id__in=user_ids, task__status__in=OPEN_STATUSES)
+                 .values('customuser_id').annotate(load=weighted_load()).values_list('customuser_id', 'load'))
+    return loads
+
+
+class LoadBalancer:
+    """Weighted open-task load per employee, with one min-heap per project
+    (and one over everybody), so picking the least-loaded employees is a few
+    heap pops and never a query.
+
+    A project's candidates are the employees who have held a task in it.
+    Loads are changed in place by the task signals once their transaction
+    commits; a load change pushes a fresh (load, user) entry and the old
+    one is skipped when it surfaces. Other processes' changes are caught up
+    with on a background thread, so no request waits for the database: the
+    chosen employees' loads are read back once the choosing transaction
+    commits, and the whole state is reloaded every
+    AUTO_ASSIGN_REFRESH_SECONDS.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loaded_at = None
+        self.refreshing = False
+        self.worker = None
+        self.stale = False
+        self.pending = set()
+
+    @property
+    def ready(self):
+        return self.loaded_at is not None
+
+    def reload(self):
+        Assignment = Task.assigned_to.through
+        employees = set(get_user_model().objects.filter(groups__name='Employee').values_list('id', flat=True))
+        loads = defaultdict(int, Assignment.objects.filter(task__status__in=OPEN_STATUSES)
+                            .values('customuser_id').annotate(load=weighted_load())
+                            .values_list('customuser_id', 'load'))
+        projects = defaultdict(set)
+        for project_id, user_id in Assignment.objects.values_list('task__project_id', 'customuser_id').distinct():
+            if user_id in employees:
+                projects[user_id].add(project_id)
+
+        heaps = defaultdict(list)
+        for user_id in employees:
+            for key in projects[user_id] | {None}:
+                heaps[key].append((loads[user_id], user_id))
+        for heap in heaps.values():
+            heapq.heapify(heap)
+        with self.lock:
+            self.employees, self.loads, self.projects, self.heaps = employees, loads, projects, heaps
+            self.loaded_at = time.monotonic()
+
+    def refresh(self, user_ids=None):
+        """Re-read the loads of `user_ids`, or reload everything if None, on
+        the background thread, starting it unless it is running; choose()
+        goes on with the current state meanwhile."""
+        with self.lock:
+            if user_ids is None:
+                self.stale = True
+            else:
+                self.pending.update(user_ids)
+            if self.refreshing:
+                return
+            self.refreshing = True
+            self.worker = threading.Thread(target=self.background_refresh, name='autoassign-refresh', daemon=True)
+            self.worker.start()
+
+    def background_refresh(self):
+        try:
+            self.catch_up()
+        finally:
+            # The thread's own connection, which nothing else would close.
+            connection.close()
+
+    def catch_up(self):
+        """Work through what refresh() asked for until nothing is left."""
+        try:
+            while True:
+                with self.lock:
+                    stale, user_ids = self.stale or not self.ready, self.pending
+                    self.stale, self.pending = False, set()
+                    if not stale and not user_ids:
+                        self.refreshing = False
+                        return
+                if stale:
+                    self.reload()
+                else:
+                    self.correct(current_loads(user_ids))
+        except BaseException:
+            with self.lock:
+                self.refreshing = False
+            raise
+
+    def least_loaded(self, project_id, count):
+        with self.lock:
+            heap = self.heaps.get(project_id) or self.heaps[None]
+            chosen = []
+            while heap and len(chosen) < count:
+                load, user_id = heapq.heappop(heap)
+                if load == self.loads[user_id] and user_id not in chosen:
+                    chosen.append(user_id)
+            for user_id in chosen:
+                heapq.heappush(heap, (self.loads[user_id], user_id))
+            return chosen
+
+    def correct(self, loads):
+        """Set {user_id: load} read from the database."""
+        with self.lock:
+            for user_id, load in loads.items():
+                if self.loads[user_id] != load:
+                    self.loads[user_id] = load
+                    for key in self.projects[user_id] | {None}:
+                        heapq.heappush(self.heaps[key], (load, user_id))
+
+    def choose(self, project_id, count):
+        """The `count` least-loaded employees of the project (of everybody if
+        nobody has worked on it yet), least loaded first. Empty if there is
+        nobody to choose."""
+        if not self.ready:
+            # Normally loaded at startup (see task_management.wsgi); wait for
+            # that rather than load a second time.
+            worker = self.worker
+            if worker is not None:
+                worker.join()
+            if not self.ready:
+                self.reload()
+        elif time.monotonic() - self.loaded_at > settings.AUTO_ASSIGN_REFRESH_SECONDS:
+            self.refresh()
+        chosen = self.least_loaded(project_id, count)
+        if chosen:
+            # Tasks another process assigned since the last reload may make
+            # these employees busier than they look here; the next choice
+            # knows once this one is saved.
+            transaction.on_commit(lambda: self.refresh(chosen))
+        return chosen
+
+    def apply(self, changes):
+        """Apply [(user_id, project_id, load delta)] from one transaction."""
+        with self.lock:
+            for user_id, project_id, delta in changes:
+                self.loads[user_id] += delta
+                if user_id not in self.employees:
+                    continue
+                keys = {None} | self.projects[user_id] if delta else set()
+                if project_id is not None and project_id not in self.projects[user_id]:
+                    self.projects[user_id].add(project_id)
+                    keys.add(project_id)
+                for key in keys:
+                    heap = self.heaps[key]
+                    heapq.heappush(heap, (self.loads[user_id], user_id))
+                    if len(heap) > 4 * len(self.employees) + 64:
+                        self.compact(key)
+
+    def compact(self, key):
+        # Drop the stale entries that load changes left behind.
+        members = {user_id for _, user_id in self.heaps[key]}
+        self.heaps[key] = [(self.loads[user_id], user_id) for user_id in members]
+        heapq.heapify(self.heaps[key])
+
+
+balancer = LoadBalancer()
+
+
+def record(changes):
+    if changes and balancer.ready:
+        transaction.on_commit(lambda: balancer.apply(changes))
+
+
+# Signal entry points (wired up in tasks.signals). Each one works out the
+# load deltas from what the instance already carries where it can.
+
+def task_saved(task, created):
+    previous = task.__dict__.pop('_loaded_status', None)
+    task._loaded_status = task.status
+    if created or previous is None or not balancer.ready:
+        return
+    was_open, is_open = previous in OPEN_STATUSES, task.status in OPEN_STATUSES
+    if was_open == is_open:
+        return
+    sign = 1 if is_open else -1
+    assignees = Task.assigned_to.through.objects.filter(task_id=task.pk).values_list(
+        'customuser_id', 'task__details__priority')
+    record([(user_id, task.project_id, sign * priority_weight(priority)) for user_id, priority in assignees])
+
+
+def detail_saved(detail, created):
+    previous = None if created else detail.__dict__.pop('_loaded_priority', detail.priority)
+    detail._loaded_priority = detail.priority
+    if not balancer.ready:
+        return
+    delta = priority_weight(detail.priority) - priority_weight(previous)
+    if delta:
+        assignees = Task.assigned_to.through.objects.filter(
+            task_id=detail.task_id, task__status__in=OPEN_STATUSES).values_list('customuser_id', 'task__project_id')
+        record([(user_id, project_id, delta) for user_id, project_id in assignees])
+
+
+def task_weight(task):
+    if task.status not in OPEN_STATUSES:
+        return 0
+    if Task.details.is_cached(task):
+        return priority_weight(task.details.priority)
+    return priority_weight(TaskDetail.objects.filter(task_id=task.pk).values_list('priority', flat=True).first())
+
+
+def assignees_changed(task, action, user_ids):
+    """Forward m2m change on `task`; a removal never drops the project from
+    the employee's candidate projects."""
+    if not balancer.ready or not user_ids:
+        return
+    sign = 1 if action == 'post_add' else -1
+    weight = task_weight(task)
+    record([(user_id, task.project_id if sign > 0 else None, sign * weight) for user_id in user_ids])
+
+
+def tasks_changed_for_user(user_id, action, task_ids):
+    """Reverse m2m change (user.tasks.add(...))."""
+    if not balancer.ready or not task_ids:
+        return
+    sign = 1 if action == 'post_add' else -1
+    changes = []
+    for task_id, project_id, status, priority in Task.objects.filter(pk__in=task_ids).values_list(
+            'id', 'project_id', 'status', 'details__priority'):
+        weight = priority_weight(priority) if status in OPEN_STATUSES else 0
+        changes.append((user_id, project_id if sign > 0 else None, sign * weight))
+    record(changes)
+
+
+def task_deleting(task):
+    if balancer.ready and task.status in OPEN_STATUSES:
+        weight = task_weight(task)
+        user_ids = Task.assigned_to.through.objects.filter(task_id=task.pk).values_list('customuser_id', flat=True)
+        record([(user_id, None, -weight) for user_id in user_ids])
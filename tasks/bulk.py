@@ -0,0 +1,62 @@
+from django.db import connection, transaction
+
+from tasks import workload
+from tasks.models import Task, TaskDetail
+
+
+def insert_batch(tasks, details, assignments):
+    """Insert unsaved tasks with their details (which refer to their task
+    through `.task`) and assignments, as (task, user id) pairs, in one
+    transaction.
+
+    Neither COPY nor bulk_create sends post_save or m2m_changed, so no
+    assignment emails, live events or activity happen; callers deal with
+    that once for the whole run. The task data generation is bumped here,
+    once the batch is committed, so cached counts and ETags never outlive
+    it whoever inserted it. bulk_create overwrites
+    created_at/updated_at with now (auto_now); COPY keeps what the tasks
+    carry.
+    """
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            copy_batch(tasks, details, assignments)
+        else:
+            Assignment = Task.assigned_to.through
+            Task.objects.bulk_create(tasks)
+            for detail in details:
+                detail.task_id = detail.task.id
+            TaskDetail.objects.bulk_create(details)
+            Assignment.objects.bulk_create(
+                Assignment(task_id=task.id, customuser_id=user_id) for task, user_id in assignments)
+    workload.bump_generation()
+
+
+def copy_batch(tasks, details, assignments):
+    """PostgreSQL fast path: reserve ids from the sequence, then COPY the
+    three tables instead of multi-row INSERTs."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+            [Task._meta.db_table, len(tasks)],
+        )
+        for task, (task_id,) in zip(tasks, cursor.fetchall()):
+            task.id = task_id
+
+        with cursor.copy(
+            f"COPY {Task._meta.db_table} (id, project_id, title, description, due_date, status, "
+            f"created_at, updated_at) FROM STDIN"
+        ) as copy:
+            for task in tasks:
+                copy.write_row((task.id, task.project_id, task.title, task.description,
+                                task.due_date, task.status, task.created_at, task.updated_at))
+        with cursor.copy(
+            f"COPY {TaskDetail._meta.db_table} (task_id, priority, assets, notes) FROM STDIN"
+        ) as copy:
+            assets = TaskDetail._meta.get_field('assets').default
+            for detail in details:
+                copy.write_row((detail.task.id, detail.priority, assets, detail.notes))
+        with cursor.copy(
+            f"COPY {Task.assigned_to.through._meta.db_table} (task_id, customuser_id) FROM STDIN"
+        ) as copy:
+            for task, user_id in assignments:
+                copy.write_row((task.id, user_id))
@@ -0,0 +1,71 @@
+import calendar
+from datetime import date, timedelta
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+PREVIEW_SIZE = 3
+MAX_RANGE_DAYS = 62
+
+
+def month_range(day):
+    """[first, last + 1 day) of the month `day` falls in."""
+    first = day.replace(day=1)
+    return first, first + timedelta(days=calendar.monthrange(first.year, first.month)[1])
+
+
+def week_range(day):
+    """[Monday, next Monday) of the week `day` falls in."""
+    monday = day - timedelta(days=day.weekday())
+    return monday, monday + timedelta(days=7)
+
+
+def day_buckets(tasks, start, end):
+    """Tasks due in [start, end) bucketed per day, as dicts with the day's
+    task count, how many of them are completed and the first PREVIEW_SIZE
+    tasks (by id). Days without tasks are left out.
+
+    Two queries, both ranges over task_due_idx: a GROUP BY for the counts
+    (index only, status is included in the index), then one UNION ALL arm
+    of PREVIEW_SIZE rows per day that has tasks. A correlated subquery next
+    to the counts would end up in the GROUP BY and run once per task.
+    """
+    tasks = tasks.filter(due_date__gte=start, due_date__lt=end)
+    days = list(
+        tasks.values('due_date')
+        .annotate(count=Count('id'), completed=Count('id', filter=Q(status='COMPLETED')))
+        .order_by('due_date')
+    )
+    if not days:
+        return []
+    arms = [
+        tasks.filter(due_date=day['due_date']).order_by('id').values_list('due_date', 'id', 'title', 'status')[:PREVIEW_SIZE]
+        for day in days
+    ]
+    previews = {}
+    for due_date, task_id, title, status in arms[0].union(*arms[1:], all=True):
+        previews.setdefault(due_date, []).append({'id': task_id, 'title': title, 'status': status})
+    return [
+        {
+            'date': day['due_date'],
+            'count': day['count'],
+            'completed': day['completed'],
+            'tasks': sorted(previews.get(day['due_date'], []), key=lambda task: task['id']),
+        }
+        for day in days
+    ]
+
+
+def parse_range(start, end, today=None):
+    """[start, end) from ISO dates; the current month when both are missing.
+    Raises ValueError for malformed, reversed or over-long ranges."""
+    if not start and not end:
+        return month_range(today or timezone.localdate())
+    if not start or not end:
+        raise ValueError("start and end go together")
+    start, end = date.fromisoformat(start), date.fromisoformat(end)
+    if end <= start:
+        raise ValueError("end must be after start")
+    if (end - start).days > MAX_RANGE_DAYS:
+        raise ValueError(f"ranges are limited to {MAX_RANGE_DAYS} days")
+    return start, end
@@ -0,0 +1,231 @@
+import asyncio
+import itertools
+import json
+import threading
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from tasks.facets import filter_query, matched, matches
+
+
+def task_event(task, assignees, previous=None, created=False):
+    """Compact change record pushed to dashboards, with every field the
+    dashboard filters on (see tasks.facets.matches). `previous` holds the
+    old values of the fields that may have changed, or is None when they
+    aren't known."""
+    details = getattr(task, 'details', None)
+    return {
+        'id': task.id,
+        'project': task.project_id,
+        'status': task.status,
+        'previous_status': previous.get('status') if previous else None,
+        'previous': previous,
+        'priority': details.priority if details else None,
+        'assignees': sorted(assignees),
+        'due_date': task.due_date.isoformat(),
+        'created_at': task.created_at.isoformat() if task.created_at else None,
+        'updated_at': task.updated_at.isoformat() if task.updated_at else None,
+        'created': created,
+    }
+
+
+def deleted_event(task):
+    """The task as it was, for tasks.facets.matched(); its assignees are
+    gone by now and the priority is left out unless the details are loaded."""
+    event = {
+        'id': task.id, 'project': task.project_id, 'status': task.status, 'due_date': task.due_date.isoformat(),
+        'created_at': task.created_at.isoformat() if task.created_at else None, 'deleted': True,
+    }
+    if type(task).details.is_cached(task):
+        details = getattr(task, 'details', None)
+        event['priority'] = details.priority if details else None
+    return event
+
+
+def merge(old, new):
+    """Fold two undelivered events for the same task into one, or None when
+    they cancel out (created and deleted before the client saw either)."""
+    if old.get('created') and new.get('deleted'):
+        return None
+    merged = dict(new, created=old.get('created', False) or new.get('created', False))
+    if old.get('previous_status') is not None:
+        merged['previous_status'] = old['previous_status']
+    return merged
+
+
+class Subscription:
+    """One SSE connection's mailbox.
+
+    Events are snapshots of a task, so pending events are kept per task id
+    and a newer one is merged into an older one that hasn't been sent yet. A slow
+    client therefore costs at most `max_pending` entries. If even that fills
+    up, everything pending is dropped and the client is told to reload.
+    """
+
+    def __init__(self, loop, filters=None, max_pending=None):
+        self.loop = loop
+        self.filters = filters or {}
+        self.key = filter_query(self.filters)
+        # The status cards count every status (a facet), so their figures
+        # follow changes that the table's filters leave out.
+        self.count_filters = {dimension: value for dimension, value in self.filters.items() if dimension != 'status'}
+        # seq of the last change the counts depend on
+        self.changed = 0
+        self.max_pending = max_pending or settings.TASK_EVENTS_MAX_PENDING
+        self.pending = OrderedDict()
+        self.overflowed = False
+        self.ready = asyncio.Event()
+
+    def offer(self, seq, event):
+        # Runs on the subscriber's event loop. Of the changes the counts
+        # depend on, the client gets those to tasks that were in its filters
+        # or are in them now (a task leaving them as much as one entering
+        # them), marked with whether the task is in them now.
+        if not matches(self.count_filters, event) and not matched(self.count_filters, event):
+            return
+        self.changed = seq
+        self.ready.set()
+        now = matches(self.filters, event)
+        if not now and not matched(self.filters, event):
+            return
+        event = dict(event, matches=now)
+        previous = self.pending.pop(event['id'], None)
+        if previous is not None:
+            event = merge(previous[1], event)
+            if event is None:
+                return
+        if len(self.pending) >= self.max_pending:
+            self.pending.clear()
+            self.overflowed = True
+        else:
+            self.pending[event['id']] = (seq, event)
+        self.ready.set()
+
+    async def next_batch(self, timeout):
+        """Wait up to `timeout` seconds; returns (overflowed, [(seq, event)])."""
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False, []
+        self.ready.clear()
+        overflowed, events = self.overflowed, list(self.pending.values())
+        self.overflowed = False
+        self.pending.clear()
+        return overflowed, events
+
+
+class InMemoryBroker:
+    """Fans task events out to the SSE connections of this process.
+
+    Publishing happens in whatever thread saved the task; delivery is handed
+    to each subscriber's event loop, so the publisher never blocks on a
+    client. Deployments with several processes need a backend that goes
+    through a shared channel (e.g. Redis pub/sub) with the same interface.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = set()
+        self.sequence = itertools.count(1)
+        self.published = 0
+        # (event loop, filter query) -> (last event seq counted, future)
+        self.counting = {}
+
+    def has_subscribers(self):
+        """Lets publishers skip building events nobody will read. A shared
+        backend can't know about other processes and should return True."""
+        return bool(self.subscriptions)
+
+    def subscribe(self, **filters):
+        subscription = Subscription(asyncio.get_running_loop(), **filters)
+        with self.lock:
+            self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions.discard(subscription)
+            if not any(other.key == subscription.key and other.loop is subscription.loop
+                       for other in self.subscriptions):
+                self.counting.pop((subscription.loop, subscription.key), None)
+
+    async def counts(self, subscription, compute, seq):
+        """compute(filters) for the subscription's filters, run in a thread
+        once every event up to `seq` has been published, and shared by every
+        stream of this event loop with the same filters. A change therefore
+        costs one count per filter combination, however many dashboards
+        show it."""
+        key = (subscription.loop, subscription.key)
+        with self.lock:
+            counted, future = self.counting.get(key, (-1, None))
+            if counted < seq:
+                # Events are published once committed, so a count started
+                # now sees every event published so far.
+                future = asyncio.ensure_future(sync_to_async(compute)(subscription.filters))
+                self.counting[key] = (self.published, future)
+        # One stream going away mustn't cancel the others' count.
+        return await asyncio.shield(future)
+
+    def publish(self, event):
+        with self.lock:
+            seq = self.published = next(self.sequence)
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, seq, event)
+            except RuntimeError:
+                # loop already closed; the stream's cleanup will unsubscribe
+                pass
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(settings.TASK_EVENTS_BACKEND)()
+    return _broker
+
+
+def format_sse(name, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {name}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def stream(subscription, counts=None):
+    """Async generator behind the SSE response. Sends a comment line every
+    TASK_EVENTS_HEARTBEAT seconds so proxies keep the connection open and
+    dead clients are noticed.
+
+    With `counts` (a function of the filters), its result goes out as a
+    `counts` event on connecting and after every batch or reset, so clients
+    show the server's figures for their filters rather than adding events
+    up. The broker shares each count between the streams that need it.
+    """
+    broker = get_broker()
+    counted = broker.published
+    try:
+        yield "retry: 5000\n\n"
+        if counts is not None:
+            yield format_sse('counts', await broker.counts(subscription, counts, counted))
+        while True:
+            overflowed, events = await subscription.next_batch(settings.TASK_EVENTS_HEARTBEAT)
+            if overflowed:
+                yield format_sse('reset', {})
+            for seq, event in events:
+                yield format_sse('task', event, seq)
+            if counts is not None and subscription.changed > counted:
+                counted = subscription.changed
+                yield format_sse('counts', await broker.counts(subscription, counts, counted))
+            elif not overflowed and not events:
+                yield ": keepalive\n\n"
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,242 @@
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Case, Count, Exists, OuterRef, Q, When
+from django.http import QueryDict
+from django.utils import timezone
+
+from tasks import workload
+from tasks.models import Project, Task, TaskDetail
+
+STATUS_FILTERS = {'completed': 'COMPLETED', 'in_progress': 'IN_PROGRESS', 'pending': 'PENDING'}
+PRIORITIES = [priority for priority, _ in TaskDetail.PRIORITY_OPTIONS]
+# Query parameter of each dimension; ranges take <param>_after and <param>_before.
+PARAMS = {'status': 'type', 'project': 'project', 'priority': 'priority', 'assignee': 'assignee',
+          'due': 'due', 'created': 'created'}
+RANGES = ('due', 'created')
+# Live event field of the dimensions not named after theirs.
+EVENT_FIELDS = {'assignee': 'assignees', 'due': 'due_date', 'created': 'created_at'}
+FACET_LIMIT = 10
+
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_filters(params):
+    """Dashboard filters from request.GET, as {dimension: values} or, for
+    the date ranges, {dimension: (after, before)} with inclusive, possibly
+    open ends. Values that don't parse are dropped, like an unknown ?type=
+    always was."""
+    filters = {
+        'status': [STATUS_FILTERS[value] for value in params.getlist('type') if value in STATUS_FILTERS],
+        'project': [int(value) for value in params.getlist('project') if value.isdigit()],
+        'priority': [value for value in params.getlist('priority') if value in PRIORITIES],
+        'assignee': [int(value) for value in params.getlist('assignee') if value.isdigit()],
+    }
+    for dimension in RANGES:
+        bounds = (parse_date(params.get(f'{dimension}_after')), parse_date(params.get(f'{dimension}_before')))
+        filters[dimension] = bounds if any(bounds) else None
+    return {dimension: sorted(set(value)) if isinstance(value, list) else value
+            for dimension, value in filters.items() if value}
+
+
+def filter_query(filters, **changes):
+    """Canonical query string for `filters` (with `changes` applied), so
+    equal filters give equal URLs, saved filters and cache keys."""
+    filters = {**filters, **changes}
+    query = QueryDict(mutable=True)
+    statuses = {status: param for param, status in STATUS_FILTERS.items()}
+    for dimension, param in PARAMS.items():
+        value = filters.get(dimension)
+        if not value:
+            continue
+        if dimension in RANGES:
+            for suffix, bound in zip(('after', 'before'), value):
+                if bound:
+                    query[f'{param}_{suffix}'] = bound.isoformat()
+        else:
+            query.setlist(param, [statuses[item] if dimension == 'status' else item for item in value])
+    return query.urlencode()
+
+
+def start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def dimension_q(dimension, value, prefix=''):
+    if dimension == 'status':
+        return Q(**{f'{prefix}status__in': value})
+    if dimension == 'project':
+        return Q(**{f'{prefix}project_id__in': value})
+    if dimension == 'priority':
+        return Q(**{f'{prefix}details__priority__in': value})
+    if dimension == 'assignee':
+        # EXISTS rather than a join, so a task with two matching assignees
+        # is still one row (and counted once).
+        return Q(Exists(Task.assigned_to.through.objects.filter(
+            task_id=OuterRef(f'{prefix}pk'), customuser_id__in=value)))
+    after, before = value
+    q = Q()
+    if dimension == 'due':
+        if after:
+            q &= Q(**{f'{prefix}due_date__gte': after})
+        if before:
+            q &= Q(**{f'{prefix}due_date__lte': before})
+    else:
+        # Whole local days as a range on the column, which keeps it indexable.
+        if after:
+            q &= Q(**{f'{prefix}created_at__gte': start_of_day(after)})
+        if before:
+            q &= Q(**{f'{prefix}created_at__lt': start_of_day(before + timedelta(days=1))})
+    return q
+
+
+def conditions(filters, dimensions=None, prefix=''):
+    """The filters of `dimensions` (default: all) ANDed together; an empty
+    Q() when none of them is set."""
+    q = Q()
+    for dimension, value in filters.items():
+        if dimensions is None or dimension in dimensions:
+            q &= dimension_q(dimension, value, prefix)
+    return q
+
+
+def matches(filters, event):
+    """Whether the task in a live event (tasks.events.task_event) passes
+    `filters`: conditions() on the event's snapshot instead of the table."""
+    if event.get('deleted'):
+        return False
+    return passes(filters, event)
+
+
+def matched(filters, event):
+    """Whether the task in a live event passed `filters` before the change:
+    matches() on its previous values. What the event can't tell passes, so
+    a dashboard never keeps showing a task that left its filters."""
+    if event.get('created'):
+        return False
+    if event.get('deleted'):
+        # A deleted event is the task as it was.
+        return passes(filters, event)
+    if event.get('previous') is None:
+        return True
+    return passes(filters, {**event, **event['previous']})
+
+
+def passes(filters, snapshot):
+    for dimension, value in filters.items():
+        field = EVENT_FIELDS.get(dimension, dimension)
+        if field not in snapshot:
+            continue
+        if dimension == 'assignee':
+            passed = not set(value).isdisjoint(snapshot['assignees'])
+        elif dimension in RANGES:
+            after, before = value
+            if dimension == 'due':
+                day = date.fromisoformat(snapshot['due_date'])
+            else:
+                day = timezone.localdate(datetime.fromisoformat(snapshot['created_at']))
+            passed = (not after or day >= after) and (not before or day <= before)
+        else:
+            passed = snapshot[dimension] in value
+        if not passed:
+            return False
+    return True
+
+
+def other_dimensions(dimension):
+    return [other for other in PARAMS if other != dimension]
+
+
+def top_values(queryset, field, selected=()):
+    """The FACET_LIMIT most frequent values of `field` with their counts,
+    plus the `selected` ones outside them (with a count of 0 if no row has
+    them), so a picked value can always be seen and unpicked. Selected
+    values sort first in the same GROUP BY, so it is still one query.
+    Grouping on the bare id keeps it an index scan; names are looked up
+    for the few ids that make the cut."""
+    selected = set(selected)
+    rows = queryset.values_list(field).annotate(count=Count('*'))
+    if selected:
+        rows = rows.annotate(selected=Case(When(**{f'{field}__in': selected}, then=1), default=0))
+    rows = rows.order_by(*(['-selected'] if selected else []), '-count', field)[:FACET_LIMIT + len(selected)]
+    counts = sorted(((row[0], row[1]) for row in rows), key=lambda row: (-row[1], row[0]))
+    found = {value for value, _ in counts}
+    return (counts[:FACET_LIMIT]
+            + [(value, count) for value, count in counts[FACET_LIMIT:] if value in selected]
+            + [(value, 0) for value in sorted(selected - found)])
+
+
+def count_facets(filters):
+    """Facet counts for `filters`. Each dimension's counts apply every other
+    dimension's filter but not its own, so they show what picking another
+    value would give.
+
+    One query per dimension, whatever is selected: conditional COUNTs for
+    the statuses (plus the total with every filter applied), a GROUP BY on
+    the details for priorities, and a GROUP BY cut to the FACET_LIMIT
+    biggest values (and the selected ones) for projects and for
+    assignees, each followed by one lookup of their names. A dimension's query only joins the tables the
+    other filters need.
+    """
+    status_q = conditions(filters, ['status'])
+    statuses = Task.objects.filter(conditions(filters, other_dimensions('status'))).aggregate(
+        total=Count('status', filter=status_q or None),
+        **{status: Count('status', filter=Q(status=status)) for status in STATUS_FILTERS.values()},
+    )
+    priorities = dict(
+        TaskDetail.objects.filter(conditions(filters, other_dimensions('priority'), prefix='task__'))
+        .values_list('priority').annotate(count=Count('*')).order_by()
+    )
+    projects = top_values(
+        Task.objects.filter(conditions(filters, other_dimensions('project'))), 'project_id', filters.get('project', ()))
+    names = dict(Project.objects.filter(pk__in=[pk for pk, _ in projects]).values_list('id', 'name'))
+    assignees = top_values(
+        Task.assigned_to.through.objects.filter(conditions(filters, other_dimensions('assignee'), prefix='task__')),
+        'customuser_id', filters.get('assignee', ()),
+    )
+    users = get_user_model().objects.in_bulk([pk for pk, _ in assignees])
+    return {
+        'total': statuses.pop('total'),
+        'status': statuses,
+        'priority': {priority: priorities.get(priority, 0) for priority in PRIORITIES},
+        'project': [(pk, names.get(pk, ''), count) for pk, count in projects],
+        'assignee': [(users[pk], count) for pk, count in assignees if pk in users],
+    }
+
+
+def facets(filters):
+    """count_facets(), cached per generation of the task data (bumped on
+    every task, detail and assignment change, see tasks.workload) and per
+    filter combination."""
+    return workload.cached('facets', filter_query(filters), settings.DASHBOARD_FACET_CACHE_SECONDS,
+                           lambda: count_facets(filters))
+
+
+def toggled(filters, dimension, value):
+    """Query string with `value` added to, or removed from, `dimension`."""
+    values = set(filters.get(dimension, ())) ^ {value}
+    return filter_query(filters, **{dimension: sorted(values)})
+
+
+def facet_sections(filters, counts):
+    """What the dashboard's filter panel lists: per dimension, each value's
+    label, count, whether it is selected and the query string toggling it.
+    Statuses are left out; the dashboard's cards are that facet."""
+    def entry(dimension, value, label, count):
+        return {'label': label, 'count': count, 'selected': value in filters.get(dimension, ()),
+                'query': toggled(filters, dimension, value)}
+
+    priorities = dict(TaskDetail.PRIORITY_OPTIONS)
+    return [
+        ('Priority', [entry('priority', priority, priorities[priority], count)
+                      for priority, count in counts['priority'].items()]),
+        ('Project', [entry('project', pk, name or f'#{pk}', count) for pk, name, count in counts['project']]),
+        ('Assignee', [entry('assignee', user.pk, user.get_full_name() or user.username, count)
+                      for user, count in counts['assignee']]),
+    ]
@@ -1,4 +1,5 @@
 from django import forms
+from tasks import hierarchy
 from tasks.models import Task,TaskDetail
 # from tasks.models import *
 
@@ -63,11 +64,14 @@ class TaskModelForm(StyledFormMixin,forms.ModelForm):
     class Meta:
         model = Task
         # fields = '__all__'
-        fields = ['title', 'description', 'due_date', 'assigned_to', 'project']
+        fields = ['title', 'description', 'due_date', 'assigned_to', 'project', 'parent']
         widgets = {
             'due_date': forms.SelectDateWidget,
-            'assigned_to': forms.CheckboxSelectMultiple
+            'assigned_to': forms.CheckboxSelectMultiple,
+            # a select would list every task
+            'parent': forms.NumberInput,
         }
+        labels = {'parent': 'Parent task id (optional)'}
         # exclude = ['project', 'is_completed', 'created_at','updated_at']
         # widgets = {
         #     'title': forms.TextInput(attrs={
@@ -97,6 +101,30 @@ class TaskModelForm(StyledFormMixin,forms.ModelForm):
         #         'class': "form-checkbox h-5 w-5 text-rose-600"
         #     }),
         # }
+
+    def clean_parent(self):
+        parent = self.cleaned_data.get('parent')
+        hierarchy.check_parent(self.instance, parent)
+        return parent
+
+class AutoAssignTaskModelForm(TaskModelForm):
+    """Task creation form: pick assignees by hand, or have the N least-loaded
+    employees of the project picked (tasks.autoassign)."""
+    auto_assign = forms.IntegerField(
+        required=False, min_value=1, label="Or auto-assign to this many least-loaded employees")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['assigned_to'].required = False
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('assigned_to') and cleaned_data.get('auto_assign'):
+            raise forms.ValidationError("Pick assignees or auto-assign, not both.")
+        if not cleaned_data.get('assigned_to') and not cleaned_data.get('auto_assign') and not self.errors:
+            raise forms.ValidationError("Pick at least one assignee or use auto-assign.")
+        return cleaned_data
+
 class TaskDetailModelForm(StyledFormMixin,forms.ModelForm):
     class Meta:
         model=TaskDetail
@@ -0,0 +1,121 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection
+
+from tasks import workload
+from tasks.models import Task
+
+# Levels a hierarchy may have below its top-level task. Writes going deeper
+# are refused, and the recursive queries stop there too, so even a cycle
+# slipped in by two concurrent edits can't make them loop.
+MAX_DEPTH = 32
+# Subtasks listed on a task's page; the roll-up still covers all of them.
+SUBTASK_PREVIEW = 50
+
+
+def run(sql, params):
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(task=quote(Task._meta.db_table)), params)
+        return cursor.fetchall()
+
+
+def ancestor_ids(task_id):
+    """`task_id` followed by its parent, grandparent and so on up to the
+    top-level task, from one recursive query."""
+    rows = run(
+        "WITH RECURSIVE chain (id, parent_id, depth) AS ("
+        " SELECT id, parent_id, 0 FROM {task} WHERE id = %s"
+        " UNION ALL"
+        " SELECT t.id, t.parent_id, c.depth + 1 FROM {task} t JOIN chain c ON t.id = c.parent_id"
+        " WHERE c.depth < %s"
+        ") SELECT id FROM chain ORDER BY depth",
+        [task_id, MAX_DEPTH],
+    )
+    return [pk for pk, in rows]
+
+
+def subtree_height(task_id):
+    """Levels of subtasks below `task_id` (0 without any)."""
+    rows = run(
+        "WITH RECURSIVE subtree (id, depth) AS ("
+        " SELECT id, 0 FROM {task} WHERE id = %s"
+        " UNION ALL"
+        " SELECT t.id, s.depth + 1 FROM {task} t JOIN subtree s ON t.parent_id = s.id"
+        " WHERE s.depth < %s"
+        ") SELECT MAX(depth) FROM subtree",
+        [task_id, MAX_DEPTH],
+    )
+    return rows[0][0] or 0
+
+
+def check_parent(task, parent):
+    """Raise ValidationError unless `task` may become a subtask of `parent`:
+    not below itself, and no deeper than MAX_DEPTH levels."""
+    if parent is None:
+        return
+    chain = ancestor_ids(parent.pk)
+    if task.pk is not None and task.pk in chain:
+        raise ValidationError("A task can't be a subtask of itself or of one of its own subtasks.")
+    height = subtree_height(task.pk) if task.pk is not None else 0
+    if len(chain) + height > MAX_DEPTH:
+        raise ValidationError(f"Subtasks can't be nested more than {MAX_DEPTH} levels deep.")
+
+
+def compute_rollups(task_id, subtask_ids=()):
+    """Progress of the subtree under `task_id`, the task itself included,
+    and of the subtrees under `subtask_ids` (some of its direct subtasks),
+    from one walk down the tree whatever its depth:
+    {id: {'total', 'completed', 'percent', 'earliest_due'}}, where
+    `earliest_due` is the nearest due date of a task still open (None once
+    everything is completed).
+
+    Each row of the walk carries the subtask it descends from, so the
+    subtasks' figures are groups of the same rows rather than more walks.
+    """
+    columns = ("COUNT(*), SUM(CASE WHEN status = %s THEN 1 ELSE 0 END),"
+               " MIN(CASE WHEN status <> %s THEN due_date END)")
+    statuses = ['COMPLETED', 'COMPLETED']
+    sql = (
+        "WITH RECURSIVE subtree (branch, id, status, due_date, depth) AS ("
+        " SELECT CAST(NULL AS BIGINT), id, status, due_date, 0 FROM {task} WHERE id = %s"
+        " UNION ALL"
+        " SELECT COALESCE(s.branch, t.id), t.id, t.status, t.due_date, s.depth + 1"
+        " FROM {task} t JOIN subtree s ON t.parent_id = s.id"
+        " WHERE s.depth < %s"
+        f") SELECT CAST(%s AS BIGINT), {columns} FROM subtree"
+    )
+    params = [task_id, MAX_DEPTH, task_id, *statuses]
+    if subtask_ids:
+        placeholders = ', '.join(['%s'] * len(subtask_ids))
+        sql += f" UNION ALL SELECT branch, {columns} FROM subtree WHERE branch IN ({placeholders}) GROUP BY branch"
+        params += [*statuses, *subtask_ids]
+    return {
+        pk: {'total': total, 'completed': completed, 'percent': completed * 100 // total,
+             'earliest_due': earliest_due}
+        for pk, total, completed, earliest_due in run(sql, params) if total
+    }
+
+
+def rollups(task_id, subtask_ids=()):
+    """compute_rollups(), cached per generation of the task data (see
+    tasks.workload): any task change makes it recompute."""
+    return workload.cached('subtree', f"{task_id}:{','.join(map(str, subtask_ids))}",
+                           settings.TASK_SUBTREE_CACHE_SECONDS, lambda: compute_rollups(task_id, subtask_ids))
+
+
+def subtask_context(task):
+    """What a task's page shows of its hierarchy: the first SUBTASK_PREVIEW
+    subtasks with their own roll-ups, how many more there are, and the
+    task's roll-up over its whole subtree (None without subtasks)."""
+    subtasks = list(task.subtasks.order_by('id')[:SUBTASK_PREVIEW + 1])
+    more = 0
+    if len(subtasks) > SUBTASK_PREVIEW:
+        more = task.subtasks.count() - SUBTASK_PREVIEW
+        subtasks = subtasks[:SUBTASK_PREVIEW]
+    progress = rollups(task.pk, [subtask.pk for subtask in subtasks]) if subtasks else {}
+    return {
+        'subtasks': [(subtask, progress.get(subtask.pk)) for subtask in subtasks],
+        'more_subtasks': more,
+        'subtree': progress.get(task.pk),
+    }
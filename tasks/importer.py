@@ -0,0 +1,191 @@
+import csv
+import json
+import re
+from datetime import date
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMessage
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from tasks.bulk import insert_batch
+from tasks.models import Project, Task, TaskDetail
+
+FORMATS = ('csv', 'jsonl')
+# Row errors kept for the report; the rest are only counted.
+MAX_REPORTED_ERRORS = 20
+STATUSES = {key.lower(): code for code, label in Task.STATUS_CHOICES for key in (code, label)}
+PRIORITIES = {key.lower(): code for code, label in TaskDetail.PRIORITY_OPTIONS for key in (code, label)}
+TITLE_LENGTH = Task._meta.get_field('title').max_length
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(stream, fmt):
+    """(line number, record) for every record of `stream`, read as it goes.
+    CSV records are dicts keyed by the header row; JSONL records are left
+    as text for TaskImport.build() to decode, so a bad line is one row
+    error rather than the end of the import."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for number, line in enumerate(stream, 1):
+            if line.strip():
+                yield number, line
+
+
+def text(record, field):
+    value = record.get(field)
+    return '' if value is None else str(value).strip()
+
+
+def parse_timestamp(value, field):
+    moment = parse_datetime(value)
+    if moment is None:
+        raise RowError(f"{field} {value!r} is not an ISO date and time")
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+class TaskImport:
+    """Streams records into Task, TaskDetail and assignment rows,
+    `batch_size` tasks per transaction, without the per-task signals (see
+    tasks.bulk.insert_batch).
+
+    Record fields: title, due_date (YYYY-MM-DD) and project (a name) are
+    required; description, status and priority (code or label, defaults
+    Pending and Low), assignees (usernames, a JSON list or separated by
+    commas, semicolons or spaces), notes, created_at and updated_at are
+    optional. Project names and usernames are looked up in maps loaded
+    with one query each, so memory grows with projects and users, never
+    with the file.
+    """
+
+    def __init__(self, batch_size, default_project=None, create_projects=False):
+        self.batch_size = batch_size
+        self.default_project = default_project
+        self.create_projects = create_projects
+        self.projects = {}
+        for project_id, name in Project.objects.order_by('id').values_list('id', 'name'):
+            # A name shared by several projects can't say which one is meant.
+            self.projects[name] = None if name in self.projects else project_id
+        self.users = dict(get_user_model().objects.values_list('username', 'id'))
+        self.now = timezone.now()
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.assignee_ids = set()
+        self.project_ids = set()
+
+    def project_id(self, name):
+        if name not in self.projects:
+            if not self.create_projects:
+                raise RowError(f"unknown project {name!r}")
+            self.projects[name] = Project.objects.create(name=name, start_date=date.today()).id
+        if self.projects[name] is None:
+            raise RowError(f"several projects are named {name!r}")
+        return self.projects[name]
+
+    def build(self, record):
+        """(task, detail, assignee ids) for one record, unsaved; RowError
+        says what is wrong with it."""
+        if isinstance(record, str):
+            try:
+                record = json.loads(record)
+            except ValueError as e:
+                raise RowError(f"invalid JSON: {e}")
+            if not isinstance(record, dict):
+                raise RowError("expected a JSON object")
+
+        title = text(record, 'title')
+        if not title:
+            raise RowError("title is required")
+        if len(title) > TITLE_LENGTH:
+            raise RowError(f"title is longer than {TITLE_LENGTH} characters")
+        try:
+            due_date = date.fromisoformat(text(record, 'due_date'))
+        except ValueError:
+            raise RowError(f"due_date {text(record, 'due_date')!r} is not a YYYY-MM-DD date")
+        status = STATUSES.get(text(record, 'status').lower() or 'pending')
+        if status is None:
+            raise RowError(f"unknown status {text(record, 'status')!r}")
+        priority = PRIORITIES.get(text(record, 'priority').lower() or 'low')
+        if priority is None:
+            raise RowError(f"unknown priority {text(record, 'priority')!r}")
+        project = text(record, 'project') or self.default_project
+        if not project:
+            raise RowError("project is required")
+
+        assignees = record.get('assignees') or []
+        if isinstance(assignees, str):
+            assignees = [username for username in re.split(r'[\s,;]+', assignees) if username]
+        if not isinstance(assignees, list) or not all(isinstance(username, str) for username in assignees):
+            raise RowError("assignees must be a list of usernames or a string of them")
+        user_ids = set()
+        for username in assignees:
+            if username not in self.users:
+                raise RowError(f"unknown user {username!r}")
+            user_ids.add(self.users[username])
+
+        created_at = parse_timestamp(text(record, 'created_at'), 'created_at') if text(record, 'created_at') else self.now
+        updated_at = parse_timestamp(text(record, 'updated_at'), 'updated_at') if text(record, 'updated_at') else self.now
+        task = Task(
+            project_id=self.project_id(project), title=title, description=text(record, 'description'),
+            due_date=due_date, status=status, created_at=created_at, updated_at=max(created_at, updated_at),
+        )
+        return task, TaskDetail(task=task, priority=priority, notes=text(record, 'notes') or None), user_ids
+
+    def run(self, rows):
+        """Import `rows` from read_rows(). Each full batch is committed on its
+        own, so a failure loses at most the batch in flight. Yields the
+        running total of imported tasks after every batch."""
+        tasks, details, assignments = [], [], []
+        for number, record in rows:
+            try:
+                task, detail, user_ids = self.build(record)
+            except RowError as e:
+                self.failed += 1
+                if len(self.errors) < MAX_REPORTED_ERRORS:
+                    self.errors.append((number, str(e)))
+                continue
+            tasks.append(task)
+            details.append(detail)
+            assignments.extend((task, user_id) for user_id in user_ids)
+            self.assignee_ids |= user_ids
+            self.project_ids.add(task.project_id)
+            if len(tasks) == self.batch_size:
+                yield self.flush(tasks, details, assignments)
+                tasks, details, assignments = [], [], []
+        if tasks:
+            yield self.flush(tasks, details, assignments)
+
+    def flush(self, tasks, details, assignments):
+        insert_batch(tasks, details, assignments)
+        self.imported += len(tasks)
+        return self.imported
+
+    def summary_messages(self):
+        """The mail the import sends instead of one per task: to every
+        assignee of an imported task, as Bcc, split into messages of
+        settings.TASK_IMPORT_MAIL_RECIPIENTS. Empty if nobody got a task."""
+        emails = sorted(set(
+            get_user_model().objects.filter(pk__in=self.assignee_ids).exclude(email='')
+            .values_list('email', flat=True)
+        ))
+        if not emails:
+            return []
+        projects = ', '.join(sorted(Project.objects.filter(pk__in=self.project_ids).values_list('name', flat=True)))
+        body = (
+            f"{self.imported} tasks were imported into {projects}, and some of them are assigned to you.\n\n"
+            f"See them on your dashboard: {settings.FRONTEND_URL}{reverse('employee_dashboard')}\n\nThank you."
+        )
+        size = settings.TASK_IMPORT_MAIL_RECIPIENTS
+        return [
+            EmailMessage("New tasks imported", body, settings.EMAIL_HOST_USER, bcc=emails[start:start + size])
+            for start in range(0, len(emails), size)
+        ]
@@ -0,0 +1,42 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from tasks.archive import archivable, archive_cutoff, archive_tasks
+from tasks.models import ArchivedTask, Task
+
+
+class Command(BaseCommand):
+    help = "Move completed tasks that haven't changed for a while, with their details and assignments, to the archive tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.TASK_ARCHIVE_AFTER_DAYS,
+                            help="Archive completed tasks last updated more than this many days ago")
+        parser.add_argument('--batch-size', type=int, default=settings.TASK_ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would be archived")
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff(options['days'])
+        if options['dry_run']:
+            self.stdout.write(f"{archivable(cutoff).count()} tasks would be archived.")
+            return
+
+        started = time.perf_counter()
+        archived = 0
+        for moved in archive_tasks(cutoff, options['batch_size']):
+            archived += moved
+            if options['verbosity'] > 1:
+                self.stdout.write(f"Archived {archived} tasks...")
+        elapsed = time.perf_counter() - started
+
+        if archived and connection.vendor == 'postgresql':
+            # Refresh planner statistics (and EstimatedCountPaginator's
+            # estimate) now rather than whenever autovacuum gets to it.
+            with connection.cursor() as cursor:
+                for model in (Task, ArchivedTask):
+                    cursor.execute(f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {archived} tasks completed before {cutoff:%Y-%m-%d} in {elapsed:.1f}s."
+        ))
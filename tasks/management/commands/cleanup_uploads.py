@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tasks.uploads import cleanup_uploads
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete chunked asset uploads abandoned for ASSET_UPLOAD_EXPIRE_HOURS, with their temp "
+        "files, and temp files that no upload owns any more"
+    )
+
+    def handle(self, *args, **options):
+        uploads, strays = cleanup_uploads()
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {uploads} uploads idle for over {settings.ASSET_UPLOAD_EXPIRE_HOURS}h "
+            f"and {strays} stray temp files."
+        ))
@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from tasks.importer import FORMATS, TaskImport, read_rows
+from tasks.models import Task, TaskDetail
+
+
+class Command(BaseCommand):
+    help = (
+        "Import tasks from a CSV or JSON Lines file (- for stdin), streamed and inserted in "
+        "batches with their details and assignments. Mails the assignees a summary "
+        "instead of one mail per task."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help="Default: from the file extension")
+        parser.add_argument('--batch-size', type=int, default=settings.TASK_IMPORT_BATCH_SIZE)
+        parser.add_argument('--project', help="Project name for records that don't name one")
+        parser.add_argument('--create-projects', action='store_true', help="Create projects that don't exist yet")
+        parser.add_argument('--no-notify', action='store_true', help="Don't mail the assignees")
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or os.path.splitext(options['path'])[1].lstrip('.').lower()
+        if fmt not in FORMATS:
+            raise CommandError(f"Pass --format {' or '.join(FORMATS)} for {options['path']!r}")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        started = time.perf_counter()
+        task_import = TaskImport(options['batch_size'], options['project'], options['create_projects'])
+        if options['path'] == '-':
+            self.import_rows(task_import, sys.stdin, fmt, options['verbosity'])
+        else:
+            try:
+                stream = open(options['path'], newline='', encoding='utf-8')
+            except OSError as e:
+                raise CommandError(str(e))
+            with stream:
+                self.import_rows(task_import, stream, fmt, options['verbosity'])
+        elapsed = time.perf_counter() - started
+
+        if task_import.imported and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                for model in (Task, TaskDetail, Task.assigned_to.through):
+                    cursor.execute(f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
+        for number, error in task_import.errors:
+            self.stderr.write(f"Line {number}: {error}")
+        if task_import.failed > len(task_import.errors):
+            self.stderr.write(f"... and {task_import.failed - len(task_import.errors)} more rows with errors")
+
+        messages = [] if options['no_notify'] else task_import.summary_messages()
+        if messages:
+            with get_connection() as mail:
+                mail.send_messages(messages)
+        notified = sum(len(message.bcc) for message in messages)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {task_import.imported} tasks in {elapsed:.1f}s "
+            f"({task_import.imported / max(elapsed, 0.001):.0f} tasks/s), skipped {task_import.failed} rows"
+            + (f", notified {notified} assignees." if notified else ".")
+        ))
+
+    def import_rows(self, task_import, stream, fmt, verbosity):
+        # stdin isn't ours to close; files opened by handle() are closed there.
+        for imported in task_import.run(read_rows(stream, fmt)):
+            if verbosity > 1:
+                self.stdout.write(f"Imported {imported} tasks...")
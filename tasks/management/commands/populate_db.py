@@ -0,0 +1,215 @@
+import functools
+import random
+import time
+from datetime import date, datetime, timedelta
+from multiprocessing import Pool
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.utils import timezone
+from faker import Faker
+
+from tasks.bulk import insert_batch
+from tasks.models import Project, Task, TaskDetail
+
+USERNAME_PREFIX = 'load_'
+TASKS_PER_SCALE = 20
+USERS_PER_SCALE = 5
+# Tasks generated from one random stream; workers take whole chunks.
+CHUNK_TASKS = 1000
+
+# Most tasks in a long-lived tracker are done; priorities lean low.
+STATUS_WEIGHTS = {'COMPLETED': 55, 'IN_PROGRESS': 20, 'PENDING': 25}
+PRIORITY_WEIGHTS = {TaskDetail.LOW: 50, TaskDetail.MEDIUM: 35, TaskDetail.HIGH: 15}
+ASSIGNEE_COUNT_WEIGHTS = {1: 60, 2: 30, 3: 10}
+
+
+def skewed_choice(rng, items, power=3):
+    """Pick from `items` with a power-law bias towards the front, so a few
+    projects/employees end up holding most of the work."""
+    return items[int(len(items) * rng.random() ** power)]
+
+
+def timestamps(rng, status, due_date, now):
+    """created_at/updated_at with some history behind them: work is opened
+    a few weeks before it's due, and completed work stopped changing around
+    its due date, so old completed tasks look old to archive_tasks."""
+    def moment(day):
+        at = datetime.combine(day, datetime.min.time(), tzinfo=now.tzinfo)
+        return at + timedelta(seconds=rng.randint(0, 86399))
+
+    created_at = min(now, moment(due_date - timedelta(days=rng.randint(7, 90))))
+    if status == 'COMPLETED':
+        updated_at = moment(due_date - timedelta(days=rng.randint(0, 7)))
+    else:
+        updated_at = now - timedelta(days=rng.randint(0, 14), seconds=rng.randint(0, 86399))
+    return created_at, min(now, max(created_at, updated_at))
+
+
+@functools.lru_cache
+def text_pool(seed):
+    fake = Faker()
+    fake.seed_instance(seed)
+    return [fake.sentence() for _ in range(500)], [fake.paragraph() for _ in range(100)]
+
+
+def init_worker():
+    if not django.apps.apps.ready:
+        django.setup()
+    connections.close_all()
+
+
+def chunk_rows(seed, number, size, project_ids, user_ids, today, now):
+    """Yield `size` tasks with their detail and (task, user id) assignments.
+
+    The randomness comes from the seed and the chunk's number alone, so a
+    chunk is the same whichever worker makes it and however many there are.
+    """
+    rng = random.Random(f'{seed}:{number}')
+    titles, descriptions = text_pool(seed)
+    statuses, status_weights = zip(*STATUS_WEIGHTS.items())
+    priorities, priority_weights = zip(*PRIORITY_WEIGHTS.items())
+    assignee_counts, assignee_weights = zip(*ASSIGNEE_COUNT_WEIGHTS.items())
+    for _ in range(size):
+        status = rng.choices(statuses, status_weights)[0]
+        if status == 'COMPLETED':
+            due_date = today - timedelta(days=rng.randint(1, 365))
+        else:
+            # centred two weeks out; the left tail is overdue work
+            due_date = today + timedelta(days=int(rng.gauss(14, 21)))
+        task = Task(
+            project_id=skewed_choice(rng, project_ids),
+            title=rng.choice(titles)[:250],
+            description=rng.choice(descriptions),
+            due_date=due_date,
+            status=status,
+        )
+        task.created_at, task.updated_at = timestamps(rng, status, due_date, now)
+        detail = TaskDetail(task=task, priority=rng.choices(priorities, priority_weights)[0],
+                            notes=rng.choice(descriptions))
+        count = rng.choices(assignee_counts, assignee_weights)[0]
+        assignees = {skewed_choice(rng, user_ids) for _ in range(count)}
+        yield task, detail, [(task, user_id) for user_id in assignees]
+
+
+def populate_shard(shard):
+    """Create one shard's chunks of tasks with their details and assignments,
+    inserted `batch_size` tasks at a time.
+
+    Runs in a worker process. Neither COPY nor bulk_create sends post_save
+    or m2m_changed, so no assignment emails go out. bulk_create overwrites
+    the generated timestamps with now (auto_now), so only the PostgreSQL
+    path produces tasks old enough to archive.
+    """
+    today = date.today()
+    now = timezone.now()
+    tasks, details, assignments = [], [], []
+    created = 0
+    for number, size in shard['chunks']:
+        for task, detail, assigned in chunk_rows(shard['seed'], number, size, shard['project_ids'],
+                                                 shard['user_ids'], today, now):
+            tasks.append(task)
+            details.append(detail)
+            assignments.extend(assigned)
+            if len(tasks) == shard['batch_size']:
+                insert_batch(tasks, details, assignments)
+                created += len(tasks)
+                tasks, details, assignments = [], [], []
+    if tasks:
+        insert_batch(tasks, details, assignments)
+        created += len(tasks)
+    return created
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic projects, employees and tasks for load testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', type=int, default=1,
+            help=f"{TASKS_PER_SCALE} tasks and {USERS_PER_SCALE} employees per unit "
+                 "(50000 gives a million tasks)",
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--clear', action='store_true', help="Delete tasks, projects and generated users first")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        scale, seed = options['scale'], options['seed']
+        if options['clear']:
+            self.clear()
+
+        rng = random.Random(seed)
+        fake = Faker()
+        fake.seed_instance(seed)
+        today = date.today()
+
+        projects = Project.objects.bulk_create([
+            Project(name=fake.bs().capitalize()[:100], description=fake.paragraph(),
+                    start_date=today - timedelta(days=rng.randint(0, 730)))
+            for _ in range(max(5, scale // 4))
+        ], batch_size=options['batch_size'])
+        self.stdout.write(f"Created {len(projects)} projects.")
+
+        User = get_user_model()
+        password = make_password('password')
+        offset = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+        users = User.objects.bulk_create([
+            User(username=f"{USERNAME_PREFIX}{offset + i}", first_name=fake.first_name(),
+                 last_name=fake.last_name(), email=f"{USERNAME_PREFIX}{offset + i}@example.com",
+                 password=password, is_active=True)
+            for i in range(USERS_PER_SCALE * scale)
+        ], batch_size=options['batch_size'])
+        employee, created = Group.objects.get_or_create(name='Employee')
+        User.groups.through.objects.bulk_create([
+            User.groups.through(customuser_id=user.id, group_id=employee.id) for user in users
+        ], batch_size=options['batch_size'])
+        self.stdout.write(f"Created {len(users)} employees.")
+
+        total = TASKS_PER_SCALE * scale
+        chunks = [(number, min(CHUNK_TASKS, total - start))
+                  for number, start in enumerate(range(0, total, CHUNK_TASKS))]
+        workers = max(1, min(options['workers'], total // options['batch_size'] + 1, len(chunks)))
+        project_ids = [project.id for project in projects]
+        user_ids = [user.id for user in users]
+        shards = [{
+            'seed': seed,
+            'chunks': chunks[number::workers],
+            'batch_size': options['batch_size'],
+            'project_ids': project_ids,
+            'user_ids': user_ids,
+        } for number in range(workers)]
+
+        # Children must not share the parent's database socket.
+        connections.close_all()
+        if workers == 1:
+            created = populate_shard(shards[0])
+        else:
+            with Pool(workers, initializer=init_worker) as pool:
+                created = sum(pool.map(populate_shard, shards))
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {created} tasks with details and assignments in {elapsed:.1f}s "
+            f"({created / elapsed:.0f} tasks/s)."
+        ))
+
+    def clear(self):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"TRUNCATE {Task._meta.db_table}, {TaskDetail._meta.db_table}, "
+                    f"{Task.assigned_to.through._meta.db_table}, {Project._meta.db_table} CASCADE"
+                )
+        else:
+            TaskDetail.objects.all().delete()
+            Task.objects.all().delete()
+            Project.objects.all().delete()
+        get_user_model().objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        self.stdout.write("Cleared existing data.")
@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from tasks.models import TaskReminder
+from tasks.reminders import queue_reminders, send_reminders
+
+
+class Command(BaseCommand):
+    help = "Queue and mail due-soon and overdue reminders to task assignees"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.TASK_REMINDER_BATCH_SIZE)
+        parser.add_argument(
+            '--interval', type=int, metavar='SECONDS',
+            help="Keep running and repeat every SECONDS instead of running once (e.g. from cron)",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.run_once(options['batch_size'])
+            if not options['interval']:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
+
+    def run_once(self, batch_size):
+        started = time.perf_counter()
+        today = timezone.localdate()
+        queued = {kind: queue_reminders(kind, today, batch_size) for kind, _ in TaskReminder.KIND_CHOICES}
+        sent = send_reminders(batch_size)
+        self.stdout.write(
+            f"Queued {queued[TaskReminder.UPCOMING]} due-soon and {queued[TaskReminder.OVERDUE]} overdue "
+            f"reminders, sent {sent} messages in {time.perf_counter() - started:.2f}s."
+        )
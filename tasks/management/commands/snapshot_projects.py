@@ -0,0 +1,31 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from tasks.snapshots import days_to_snapshot, write_snapshot
+
+
+class Command(BaseCommand):
+    help = "Write each project's daily task counts (for burndown charts), from the last snapshot through today"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', metavar='YYYY-MM-DD',
+                            help="Also (re)write every day from this date on, e.g. to backfill before the first run")
+
+    def handle(self, *args, **options):
+        try:
+            since = date.fromisoformat(options['since']) if options['since'] else None
+        except ValueError:
+            raise CommandError("--since takes a date as YYYY-MM-DD")
+
+        started = time.perf_counter()
+        days = days_to_snapshot(timezone.localdate(), since)
+        for day in days:
+            rows = write_snapshot(day)
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{day}: {rows} rows")
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote snapshots for {len(days)} days ({days[0]} to {days[-1]}) in {time.perf_counter() - started:.1f}s."
+        ))
@@ -0,0 +1,171 @@
+# Generated by Django 5.1.5 on 2026-10-19 16:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Every view is a bare UNION ALL of two tables, so PostgreSQL flattens it and
+# plans each half against that table's own indexes.
+CREATE_VIEWS = [
+    """
+    CREATE VIEW tasks_taskrecord AS
+    SELECT id, project_id, title, description, due_date, status, created_at, updated_at, FALSE AS archived
+    FROM tasks_task
+    UNION ALL
+    SELECT id, project_id, title, description, due_date, status, created_at, updated_at, TRUE AS archived
+    FROM tasks_archivedtask
+    """,
+    """
+    CREATE VIEW tasks_taskrecorddetail AS
+    SELECT id, task_id, priority, assets, notes FROM tasks_taskdetail
+    UNION ALL
+    SELECT id, task_id, priority, assets, notes FROM tasks_archivedtaskdetail
+    """,
+    """
+    CREATE VIEW tasks_taskrecord_assigned_to AS
+    SELECT id, task_id AS taskrecord_id, customuser_id FROM tasks_task_assigned_to
+    UNION ALL
+    SELECT id, archivedtask_id AS taskrecord_id, customuser_id FROM tasks_archivedtask_assigned_to
+    """,
+]
+DROP_VIEWS = [
+    "DROP VIEW tasks_taskrecord_assigned_to",
+    "DROP VIEW tasks_taskrecorddetail",
+    "DROP VIEW tasks_taskrecord",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tasks", "0004_admin_search_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TaskRecord",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("title", models.CharField(max_length=250)),
+                ("description", models.TextField()),
+                ("due_date", models.DateField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PENDING", "Pending"),
+                            ("IN_PROGRESS", "In Progress"),
+                            ("COMPLETED", "Completed"),
+                        ],
+                        max_length=15,
+                    ),
+                ),
+                ("created_at", models.DateTimeField()),
+                ("updated_at", models.DateTimeField()),
+                ("archived", models.BooleanField()),
+            ],
+            options={
+                "db_table": "tasks_taskrecord",
+                "managed": False,
+            },
+        ),
+        migrations.CreateModel(
+            name="TaskRecordAssignment",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+            ],
+            options={
+                "db_table": "tasks_taskrecord_assigned_to",
+                "managed": False,
+            },
+        ),
+        migrations.CreateModel(
+            name="TaskRecordDetail",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                (
+                    "priority",
+                    models.CharField(
+                        choices=[("H", "High"), ("M", "Medium"), ("L", "Low")],
+                        max_length=1,
+                    ),
+                ),
+                (
+                    "assets",
+                    models.ImageField(blank=True, null=True, upload_to="tasks_asset"),
+                ),
+                ("notes", models.TextField(blank=True, null=True)),
+            ],
+            options={
+                "db_table": "tasks_taskrecorddetail",
+                "managed": False,
+            },
+        ),
+        migrations.CreateModel(
+            name="ArchivedTask",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("title", models.CharField(max_length=250)),
+                ("description", models.TextField()),
+                ("due_date", models.DateField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("PENDING", "Pending"),
+                            ("IN_PROGRESS", "In Progress"),
+                            ("COMPLETED", "Completed"),
+                        ],
+                        max_length=15,
+                    ),
+                ),
+                ("created_at", models.DateTimeField()),
+                ("updated_at", models.DateTimeField()),
+                ("archived_at", models.DateTimeField()),
+                (
+                    "assigned_to",
+                    models.ManyToManyField(
+                        related_name="archived_tasks", to=settings.AUTH_USER_MODEL
+                    ),
+                ),
+                (
+                    "project",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_tasks",
+                        to="tasks.project",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ArchivedTaskDetail",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                (
+                    "priority",
+                    models.CharField(
+                        choices=[("H", "High"), ("M", "Medium"), ("L", "Low")],
+                        default="L",
+                        max_length=1,
+                    ),
+                ),
+                (
+                    "assets",
+                    models.ImageField(blank=True, null=True, upload_to="tasks_asset"),
+                ),
+                ("notes", models.TextField(blank=True, null=True)),
+                (
+                    "task",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="details",
+                        to="tasks.archivedtask",
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunSQL(CREATE_VIEWS, DROP_VIEWS),
+    ]
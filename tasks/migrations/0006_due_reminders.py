@@ -0,0 +1,95 @@
+# Generated by Django 5.1.5 on 2026-10-19 17:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tasks", "0005_task_archive"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReminderWatermark",
+            fields=[
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("upcoming", "Due soon"), ("overdue", "Overdue")],
+                        max_length=10,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("due_through", models.DateField()),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="TaskReminder",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("upcoming", "Due soon"), ("overdue", "Overdue")],
+                        max_length=10,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("sent_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                condition=models.Q(("status", "COMPLETED"), _negated=True),
+                fields=["due_date", "id"],
+                name="task_open_due_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="taskreminder",
+            name="task",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="reminders",
+                to="tasks.task",
+            ),
+        ),
+        migrations.AddField(
+            model_name="taskreminder",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="task_reminders",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="taskreminder",
+            index=models.Index(
+                condition=models.Q(("sent_at__isnull", True)),
+                fields=["user", "id"],
+                name="task_reminder_unsent_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="taskreminder",
+            constraint=models.UniqueConstraint(
+                fields=("task", "user", "kind"), name="unique_task_reminder"
+            ),
+        ),
+    ]
@@ -1,9 +1,26 @@
+import uuid
 from django.db import models
+from django.db.models.functions import Upper
+from django.contrib.postgres.indexes import OpClass
 from users.models import CustomUser
 from django.conf import settings
+from django.utils import timezone
 
 # Create your models here.
 
+class TaskQuerySet(models.QuerySet):
+    def include_archived(self, include=True):
+        """Read live and archived tasks together, through the TaskRecord
+        view. Comes first in the chain: filters and ordering use the same
+        field names as Task, but rows are read-only TaskRecords with an
+        `archived` flag."""
+        if not include:
+            return self
+        if self.query.has_filters() or self.query.order_by:
+            raise TypeError("include_archived() must be called before filter() and order_by().")
+        return TaskRecord.objects.all()
+
+
 class Task(models.Model):
     STATUS_CHOICES = [
         ('PENDING', 'Pending'),
@@ -11,6 +28,10 @@ class Task(models.Model):
         ('COMPLETED','Completed')
     ]
     project = models.ForeignKey("Project", on_delete=models.CASCADE, default=1)
+    # Subtasks outlive a deleted parent as top-level tasks. See tasks.hierarchy
+    # for roll-ups and the cycle check; task_parent_idx replaces the FK index.
+    parent = models.ForeignKey('self', on_delete=models.SET_NULL, blank=True, null=True, db_index=False,
+                               related_name='subtasks')
     assigned_to = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='tasks')
     title = models.CharField(max_length=250)
     description = models.TextField()
@@ -18,6 +39,30 @@ class Task(models.Model):
     status = models.CharField(max_length=15, choices=STATUS_CHOICES, default="PENDING")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = TaskQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(OpClass(Upper('title'), name='text_pattern_ops'), name='task_title_prefix_idx'),
+            # Due-date reminders only ever look at open tasks, a shrinking
+            # share of the table once work gets completed.
+            models.Index(fields=['due_date', 'id'], condition=~models.Q(status='COMPLETED'),
+                         name='task_open_due_idx'),
+            # The calendar feed counts every task in a date range per day. Due
+            # dates don't follow insertion order, so BRIN wouldn't narrow
+            # anything; status is included so the counts never touch the table.
+            models.Index(fields=['due_date', 'id'], include=['status'], name='task_due_idx'),
+            # Dashboard filters (tasks.facets): status with the list's -id order
+            # and the project facet, created-date ranges.
+            models.Index(fields=['status', 'id'], include=['project'], name='task_status_idx'),
+            models.Index(fields=['created_at'], name='task_created_idx'),
+            # Subtree roll-ups walk down one level at a time by parent; with
+            # status and due date included the walk never reads the table.
+            # Top-level tasks, most of them, are left out.
+            models.Index(fields=['parent', 'id'], include=['status', 'due_date'],
+                         condition=models.Q(parent__isnull=False), name='task_parent_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -39,6 +84,12 @@ class TaskDetail(models.Model):
     )
     assets = models.ImageField(upload_to='tasks_asset', blank=True, null=True, default="tasks_asset/default_img.jpg")
     notes = models.TextField(blank=True,null=True)
+
+    class Meta:
+        indexes = [
+            # Priority filter and facet, read from the index alone.
+            models.Index(fields=['priority', 'task'], name='task_detail_priority_idx'),
+        ]
     
     def __str__(self):
         return f"Details from Task {self.task}"
@@ -47,6 +98,241 @@ class Project(models.Model):
     name  = models.CharField(max_length=100)
     description = models.TextField(blank=True, null=True)
     start_date = models.DateField()
+
+    class Meta:
+        indexes = [
+            models.Index(OpClass(Upper('name'), name='text_pattern_ops'), name='project_name_prefix_idx'),
+        ]
     
     def __str__(self):
         return self.name
+
+
+class AssetUpload(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='asset_uploads')
+    uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    total_size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Upload {self.filename} for Task {self.task_id}"
+
+
+class TaskReminder(models.Model):
+    """One reminder for one assignee. The unique constraint is what makes
+    send_reminders idempotent: re-queueing a window after a restart finds
+    the rows already there. `sent_at` is null while the mail is queued."""
+    UPCOMING = 'upcoming'
+    OVERDUE = 'overdue'
+    KIND_CHOICES = [(UPCOMING, 'Due soon'), (OVERDUE, 'Overdue')]
+
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='reminders')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='task_reminders')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['task', 'user', 'kind'], name='unique_task_reminder'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'id'], condition=models.Q(sent_at__isnull=True), name='task_reminder_unsent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} reminder for Task {self.task_id}"
+
+
+class TaskActivity(models.Model):
+    """Append-only change log, written by tasks.activity. `changes` holds
+    only what changed: {"status": ["PENDING", "COMPLETED"]}, or for
+    assignees {"assigned_to": {"added": [3], "removed": [5]}}.
+
+    Task and project are plain references without a database constraint,
+    so the history outlives deletes and archival.
+    """
+    task = models.ForeignKey(Task, on_delete=models.DO_NOTHING, db_constraint=False, related_name='activity')
+    project = models.ForeignKey("Project", on_delete=models.DO_NOTHING, db_constraint=False, related_name='activity')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True,
+                             related_name='task_activity')
+    created_at = models.DateTimeField(default=timezone.now)
+    changes = models.JSONField()
+
+    class Meta:
+        # Newest-first pages by id; everything but the JSON payload (which
+        # may be too big for an index entry) is in the index itself.
+        indexes = [
+            models.Index(fields=['task', '-id'], include=['user', 'created_at'], name='task_activity_timeline_idx'),
+            models.Index(fields=['project', '-id'], include=['task', 'user', 'created_at'],
+                         name='task_activity_project_idx'),
+        ]
+
+    def __str__(self):
+        return f"Activity on Task {self.task_id}"
+
+
+class SavedFilter(models.Model):
+    """A named manager dashboard filter, kept as the canonical query string
+    tasks.facets.filter_query() gives it."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='saved_filters')
+    name = models.CharField(max_length=100)
+    query = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'], name='unique_saved_filter_name'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class ProjectSnapshot(models.Model):
+    """One project's task counts at the end of one day, written by
+    `manage.py snapshot_projects` (tasks.snapshots). The row with no project
+    holds the totals over all projects, so charts over everything read one
+    row per day too. Counts include archived tasks."""
+    day = models.DateField()
+    project = models.ForeignKey("Project", on_delete=models.CASCADE, blank=True, null=True, related_name='snapshots')
+    pending = models.PositiveIntegerField(default=0)
+    in_progress = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    overdue = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'day'], condition=models.Q(project__isnull=False),
+                                    name='unique_project_snapshot'),
+            models.UniqueConstraint(fields=['day'], condition=models.Q(project__isnull=True),
+                                    name='unique_total_snapshot'),
+        ]
+
+    def __str__(self):
+        return f"Snapshot of {self.project_id or 'all projects'} on {self.day}"
+
+
+class ReminderWatermark(models.Model):
+    """How far each kind of reminder has been queued: every open task due on
+    or before `due_through` has had its reminder queued."""
+    kind = models.CharField(max_length=10, choices=TaskReminder.KIND_CHOICES, primary_key=True)
+    due_through = models.DateField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.kind} reminders queued through {self.due_through}"
+
+
+class ArchivedTask(models.Model):
+    """A completed task moved out of Task by `manage.py archive_tasks`.
+    Keeps its original id, so links and logs that mention it stay valid."""
+    id = models.BigIntegerField(primary_key=True)
+    project = models.ForeignKey("Project", on_delete=models.CASCADE, related_name='archived_tasks')
+    assigned_to = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name='archived_tasks')
+    title = models.CharField(max_length=250)
+    description = models.TextField()
+    due_date = models.DateField()
+    status = models.CharField(max_length=15, choices=Task.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+
+    def __str__(self):
+        return self.title
+
+
+class ArchivedTaskDetail(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    task = models.OneToOneField(ArchivedTask, on_delete=models.CASCADE, related_name='details')
+    priority = models.CharField(max_length=1, choices=TaskDetail.PRIORITY_OPTIONS, default=TaskDetail.LOW)
+    assets = models.ImageField(upload_to='tasks_asset', blank=True, null=True)
+    notes = models.TextField(blank=True, null=True)
+
+    def __str__(self):
+        return f"Details from Task {self.task}"
+
+
+class TaskRecordQuerySet(models.QuerySet):
+    """Keyword filters on `assigned_to` become `id IN (subquery)`.
+
+    PostgreSQL has no statistics for a join between two UNION ALL views and
+    guesses it returns billions of rows, which makes it pick a plan that
+    scans every task for a LIMIT 50 page. The semi-join is estimated
+    sensibly and walks the id index instead. Q objects are passed through
+    unchanged.
+    """
+
+    def filter(self, *args, **kwargs):
+        return super().filter(*args, **self._assignee_semi_join(kwargs))
+
+    def exclude(self, *args, **kwargs):
+        return super().exclude(*args, **self._assignee_semi_join(kwargs))
+
+    def _assignee_semi_join(self, kwargs):
+        assignee = {
+            'customuser' + key[len('assigned_to'):]: kwargs.pop(key)
+            for key in list(kwargs)
+            if key == 'assigned_to' or key.startswith('assigned_to__')
+        }
+        if assignee:
+            # One subquery for all of them: lookups given in the same call
+            # must match the same assignment, as they would through a join.
+            kwargs['pk__in'] = TaskRecordAssignment.objects.filter(**assignee).values('taskrecord_id')
+        return kwargs
+
+
+class TaskRecord(models.Model):
+    """Database view over Task and ArchivedTask as one table; see
+    TaskQuerySet.include_archived. Task ids are never reused, so `id` stays
+    unique across both halves.
+
+    Each view is a plain UNION ALL of two tables (no joins inside), which
+    lets PostgreSQL push filters and join conditions down to each table's
+    indexes; details and assignments are separate views for the same reason.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    project = models.ForeignKey("Project", on_delete=models.DO_NOTHING, related_name='+')
+    assigned_to = models.ManyToManyField(settings.AUTH_USER_MODEL, through='TaskRecordAssignment', related_name='+')
+    title = models.CharField(max_length=250)
+    description = models.TextField()
+    due_date = models.DateField()
+    status = models.CharField(max_length=15, choices=Task.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived = models.BooleanField()
+
+    objects = TaskRecordQuerySet.as_manager()
+
+    class Meta:
+        managed = False
+        db_table = 'tasks_taskrecord'
+
+    def __str__(self):
+        return self.title
+
+
+class TaskRecordDetail(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    task = models.OneToOneField(TaskRecord, on_delete=models.DO_NOTHING, related_name='details')
+    priority = models.CharField(max_length=1, choices=TaskDetail.PRIORITY_OPTIONS)
+    assets = models.ImageField(upload_to='tasks_asset', blank=True, null=True)
+    notes = models.TextField(blank=True, null=True)
+
+    class Meta:
+        managed = False
+        db_table = 'tasks_taskrecorddetail'
+
+
+class TaskRecordAssignment(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    taskrecord = models.ForeignKey(TaskRecord, on_delete=models.DO_NOTHING, related_name='+')
+    customuser = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, related_name='+')
+
+    class Meta:
+        managed = False
+        db_table = 'tasks_taskrecord_assigned_to'
@@ -0,0 +1,148 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from tasks.models import ReminderWatermark, Task, TaskReminder
+
+SUBJECTS = {
+    TaskReminder.UPCOMING: "Tasks due soon",
+    TaskReminder.OVERDUE: "Overdue tasks",
+}
+
+
+def reminder_window(kind, today, watermark=None):
+    """Due dates (after, through] to queue `kind` reminders for.
+
+    The recent end of the window is looked at again on every run, so tasks
+    created or rescheduled into it since the last run still get their
+    reminder; the watermark only reaches further back, to catch up after
+    the scheduler was down.
+    """
+    if kind == TaskReminder.UPCOMING:
+        recheck_after = today - timedelta(days=1)
+        through = today + timedelta(days=settings.TASK_REMINDER_LEAD_DAYS)
+    else:
+        recheck_after = today - timedelta(days=2)
+        through = today - timedelta(days=1)
+    if watermark is None:
+        return recheck_after, through
+    return min(watermark, recheck_after), through
+
+
+def open_tasks_due(after, through):
+    # exclude() mirrors the condition of task_open_due_idx, so this is a
+    # range scan over open tasks only.
+    return Task.objects.exclude(status='COMPLETED').filter(due_date__gt=after, due_date__lte=through)
+
+
+def queue_reminders(kind, today, batch_size):
+    """Queue a reminder per assignee of every open task in this run's window
+    and advance the watermark. Returns how many reminders were new."""
+    watermark = ReminderWatermark.objects.filter(kind=kind).values_list('due_through', flat=True).first()
+    after, through = reminder_window(kind, today, watermark)
+    Assignment = Task.assigned_to.through
+    queued = 0
+    day = after
+    while day < through:
+        # One due date at a time, paged by id: (due_date, id) is exactly the
+        # index order, so no page rescans the rows before it.
+        day += timedelta(days=1)
+        last_id = 0
+        while True:
+            task_ids = list(
+                open_tasks_due(day - timedelta(days=1), day).filter(id__gt=last_id)
+                .order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not task_ids:
+                break
+            last_id = task_ids[-1]
+            existing = set(TaskReminder.objects.filter(task_id__in=task_ids, kind=kind).values_list('task_id', 'user_id'))
+            reminders = [
+                TaskReminder(task_id=task_id, user_id=user_id, kind=kind)
+                for task_id, user_id in Assignment.objects.filter(task_id__in=task_ids).values_list('task_id', 'customuser_id')
+                if (task_id, user_id) not in existing
+            ]
+            # ignore_conflicts covers a second scheduler racing this one.
+            TaskReminder.objects.bulk_create(reminders, ignore_conflicts=True)
+            queued += len(reminders)
+    ReminderWatermark.objects.update_or_create(kind=kind, defaults={'due_through': through})
+    return queued
+
+
+def claim_unsent(batch_size):
+    """Mark up to `batch_size` queued reminders as sent and return their ids.
+
+    Claiming before mailing means a crash mid-send loses those reminders
+    rather than sending them twice; failures that are seen are released
+    again by send_reminders.
+    """
+    with transaction.atomic():
+        ids = list(
+            TaskReminder.objects.filter(sent_at__isnull=True).order_by('user_id', 'id')
+            .select_for_update(skip_locked=connection.features.has_select_for_update_skip_locked)
+            .values_list('id', flat=True)[:batch_size]
+        )
+        TaskReminder.objects.filter(id__in=ids).update(sent_at=timezone.now())
+    return ids
+
+
+def reminder_messages(reminders):
+    """One message per assignee listing all their reminders, as
+    (reminder ids, EmailMessage). Tasks completed since they were queued,
+    and users without an address, are skipped."""
+    by_user = defaultdict(list)
+    for reminder in reminders:
+        by_user[reminder.user].append(reminder)
+    for user, user_reminders in by_user.items():
+        ids = [reminder.id for reminder in user_reminders]
+        open_reminders = [reminder for reminder in user_reminders if reminder.task.status != 'COMPLETED']
+        if not user.email or not open_reminders:
+            yield ids, None
+            continue
+        sections = []
+        for kind, subject in SUBJECTS.items():
+            lines = [
+                f"- {reminder.task.title} (due {reminder.task.due_date:%Y-%m-%d}): "
+                f"{settings.FRONTEND_URL}{reverse('task_details', args=[reminder.task_id])}"
+                for reminder in open_reminders if reminder.kind == kind
+            ]
+            if lines:
+                sections.append(f"{subject}:\n" + "\n".join(lines))
+        overdue = any(reminder.kind == TaskReminder.OVERDUE for reminder in open_reminders)
+        subject = SUBJECTS[TaskReminder.OVERDUE if overdue else TaskReminder.UPCOMING]
+        yield ids, EmailMessage(
+            subject,
+            f"Hi {user.username},\n\n" + "\n\n".join(sections) + "\n\nThank you.",
+            settings.EMAIL_HOST_USER,
+            [user.email],
+        )
+
+
+def send_reminders(batch_size):
+    """Mail every queued reminder, batch_size reminders at a time over one
+    mail connection per batch. Returns the number of messages sent."""
+    sent = 0
+    while True:
+        ids = claim_unsent(batch_size)
+        if not ids:
+            return sent
+        reminders = TaskReminder.objects.filter(id__in=ids).select_related('task', 'user').order_by('user_id', 'id')
+        messages = list(reminder_messages(reminders))
+        done = 0
+        try:
+            with get_connection() as mail:
+                for reminder_ids, message in messages:
+                    if message is not None:
+                        mail.send_messages([message])
+                        sent += 1
+                    done += 1
+        except Exception:
+            # Give what wasn't sent back to the queue for the next run.
+            unsent = [reminder_id for reminder_ids, _ in messages[done:] for reminder_id in reminder_ids]
+            TaskReminder.objects.filter(id__in=unsent).update(sent_at=None)
+            raise
@@ -1,7 +1,14 @@
-from django.db.models.signals import post_save,pre_save,m2m_changed,post_delete
+import threading
+from collections import defaultdict
+
+from django.db.models.signals import post_save,pre_save,m2m_changed,post_delete,post_init,pre_delete
 from django.dispatch import receiver
 from django.core.mail import send_mail
+from django.db import transaction
+from django.utils import timezone
 from .models import *
+from .events import deleted_event, get_broker, task_event
+from . import activity, autoassign, workload
 
     
 @receiver(pre_save,sender = Task)
@@ -20,10 +27,12 @@ def notify_task_creation(sender,instance,created, **kwargs):
         instance.save()
 
 @receiver(m2m_changed, sender=Task.assigned_to.through)
-def notify_employees_on_task_creation(sender, instance, action, **kwargs):
-    if action == 'post_add':
-        print(instance, instance.assigned_to.all())
-        assigned_emails = [emp.email for emp in instance.assigned_to.all()]
+def notify_employees_on_task_creation(sender, instance, action, reverse, **kwargs):
+    # instance is a user for user.tasks.add(...)
+    if action == 'post_add' and not reverse:
+        assignees = list(instance.assigned_to.all())
+        print(instance, assignees)
+        assigned_emails = [emp.email for emp in assignees]
         print("Checking....", assigned_emails)
         send_mail(
             "New Task Assigned",
@@ -33,6 +42,262 @@ def notify_employees_on_task_creation(sender, instance, action, **kwargs):
             fail_silently=False,
         )
 
+
+# Conditional GET keys a task's page on Task.updated_at, so changes that only
+# touch related rows bump it too: in one UPDATE when the transaction
+# commits, and not at all for tasks whose own save already stamped it in
+# that transaction. update() doesn't send post_save again.
+
+_touches = threading.local()
+
+class PendingTouches:
+    """Tasks touched and tasks saved in the current transaction; runs as
+    its on_commit callback."""
+
+    def __init__(self):
+        self.touched = set()
+        self.saved = set()
+
+    def __call__(self):
+        if _touches.__dict__.get('pending') is self:
+            del _touches.pending
+        task_ids = self.touched - self.saved
+        if task_ids:
+            Task.objects.filter(pk__in=task_ids).update(updated_at=timezone.now())
+
+def pending_touches():
+    """The current transaction's PendingTouches, or None in autocommit."""
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        return None
+    pending = _touches.__dict__.get('pending')
+    # A rollback discards the callback, and with it what it had collected.
+    if pending is None or not any(callback is pending for _, callback, _ in connection.run_on_commit):
+        pending = _touches.pending = PendingTouches()
+        transaction.on_commit(pending)
+    return pending
+
+def touch_tasks(task_ids):
+    pending = pending_touches()
+    if pending is None:
+        Task.objects.filter(pk__in=task_ids).update(updated_at=timezone.now())
+    else:
+        pending.touched.update(task_ids)
+
+@receiver(post_save, sender=Task)
+def remember_task_stamped(sender, instance, **kwargs):
+    pending = pending_touches()
+    if pending is not None:
+        pending.saved.add(instance.pk)
+
+@receiver(post_save, sender=TaskDetail)
+def touch_task_on_detail_change(sender, instance, **kwargs):
+    touch_tasks([instance.task_id])
+
+@receiver(m2m_changed, sender=Task.assigned_to.through)
+def touch_task_on_assignment(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        touch_tasks([instance.id])
+    elif pk_set:
+        touch_tasks(pk_set)
+
+# Live dashboard events (see tasks.events). They go out once the
+# transaction commits, all the tasks it touched read back together, and
+# nothing is queried while no dashboard listens.
+
+_unsent = threading.local()
+
+class TaskChange:
+    """What the transaction did to one task, enough to tell the filter
+    fields it had before (see tasks.facets.matched) without reading them."""
+
+    def __init__(self):
+        self.created = False
+        self.known = True
+        self.fields = {}
+        self.added = set()
+        self.removed = set()
+
+    def saved(self, fields):
+        # The first save knows the values the transaction started from.
+        if fields is None:
+            self.known = False
+        else:
+            for field, value in fields.items():
+                self.fields.setdefault(field, value)
+
+    def assigned(self, added=(), removed=()):
+        for user_id in added:
+            if user_id in self.removed:
+                self.removed.discard(user_id)
+            else:
+                self.added.add(user_id)
+        for user_id in removed:
+            if user_id in self.added:
+                self.added.discard(user_id)
+            else:
+                self.removed.add(user_id)
+
+    def previous(self, assignees):
+        if self.created or not self.known:
+            return None
+        previous = dict(self.fields)
+        if self.added or self.removed:
+            previous['assignees'] = sorted((set(assignees) - self.added) | self.removed)
+        return previous
+
+def publish_tasks(task_ids, fields=None, created=False, added=(), removed=()):
+    """Queue the tasks' events for the commit. `fields` are old values of
+    the task's filter fields (None: unknown); `added`/`removed` assignees."""
+    if not get_broker().has_subscribers():
+        return
+    unsent = _unsent.__dict__.setdefault('tasks', {})
+    added_task = False
+    for task_id in task_ids:
+        if task_id not in unsent:
+            unsent[task_id] = TaskChange()
+            added_task = True
+        change = unsent[task_id]
+        change.created = change.created or created
+        change.saved(fields)
+        change.assigned(added, removed)
+    if added_task:
+        # One callback per task queued, not per transaction, so tasks left
+        # over by a rolled back transaction still go out with the next one;
+        # the first callback to run sends them all.
+        transaction.on_commit(send_unsent_tasks)
+
+def send_unsent_tasks():
+    unsent = _unsent.__dict__.pop('tasks', None)
+    if not unsent:
+        return
+    assignees = defaultdict(list)
+    for task_id, user_id in Task.assigned_to.through.objects.filter(task_id__in=unsent).values_list(
+            'task_id', 'customuser_id'):
+        assignees[task_id].append(user_id)
+    broker = get_broker()
+    for task in Task.objects.select_related('details').filter(pk__in=unsent):
+        change = unsent[task.pk]
+        broker.publish(task_event(task, assignees[task.pk], change.previous(assignees[task.pk]), change.created))
+
+def loaded_fields(task):
+    # The filter fields the instance was loaded with (see
+    # remember_loaded_fields), rather than a SELECT of the row.
+    loaded = getattr(task, '_loaded_fields', None)
+    if loaded is None or task.__dict__.get('_loaded_status') is None:
+        return None
+    project_id, due_date = loaded
+    return {'status': task._loaded_status, 'project': project_id,
+            'due_date': str(due_date) if due_date else None}
+
+@receiver(pre_save, sender=Task)
+def remember_previous_fields(sender, instance, **kwargs):
+    if instance.pk:
+        instance._previous_fields = loaded_fields(instance)
+
+@receiver(post_save, sender=Task)
+def publish_task_saved(sender, instance, created, **kwargs):
+    publish_tasks([instance.id], None if created else getattr(instance, '_previous_fields', None), created)
+    instance._loaded_fields = (instance.project_id, instance.due_date)
+
+@receiver(post_save, sender=TaskDetail)
+def publish_task_detail_saved(sender, instance, created, **kwargs):
+    # Before update_loads_on_priority below moves _loaded_priority on.
+    previous = None if created else instance.__dict__.get('_loaded_priority')
+    publish_tasks([instance.task_id], {'priority': previous})
+
+@receiver(m2m_changed, sender=Task.assigned_to.through)
+def publish_assignees_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    added = pk_set if action == 'post_add' else ()
+    removed = pk_set if action == 'post_remove' else ()
+    if not reverse:
+        # Who a clear removed isn't known any more.
+        publish_tasks([instance.id], None if action == 'post_clear' else {}, added=added, removed=removed)
+    elif pk_set:
+        publish_tasks(pk_set, {}, added=[instance.pk] if added else (), removed=[instance.pk] if removed else ())
+
+@receiver(post_delete, sender=Task)
+def publish_task_deleted(sender, instance, **kwargs):
+    broker = get_broker()
+    if broker.has_subscribers():
+        event = deleted_event(instance)
+        transaction.on_commit(lambda: broker.publish(event))
+
+# Activity log (see tasks.activity); does nothing outside activity.recording().
+
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=TaskDetail)
+def record_saved_activity(sender, instance, **kwargs):
+    activity.instance_saved(instance)
+
+@receiver(m2m_changed, sender=Task.assigned_to.through)
+def record_assignee_activity(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse and action in ('post_add', 'post_remove') and pk_set:
+        activity.assignees_changed(instance, action, pk_set)
+
+# Cached workload reports are keyed by a generation counter (tasks.workload).
+
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=TaskDetail)
+@receiver(post_delete, sender=Task)
+@receiver(m2m_changed, sender=Task.assigned_to.through)
+def invalidate_workload(sender, action=None, **kwargs):
+    # m2m_changed fires pre_ and post_ actions; the other signals have none
+    if action is None or action.startswith('post_'):
+        workload.bump_generation()
+        # And again once committed: another process may have cached counts
+        # of the rows as they were before under the generation bumped above.
+        transaction.on_commit(workload.bump_generation)
+
+# In-memory employee loads for auto-assign (tasks.autoassign). post_init
+# remembers the loaded status/priority so a save can tell what changed
+# without re-reading the row.
+
+@receiver(post_init, sender=Task)
+def remember_loaded_status(sender, instance, **kwargs):
+    instance._loaded_status = instance.__dict__.get('status')
+
+@receiver(post_init, sender=Task)
+def remember_loaded_fields(sender, instance, **kwargs):
+    # The other filter fields live events tell the previous values of.
+    instance._loaded_fields = (instance.__dict__.get('project_id'), instance.__dict__.get('due_date'))
+
+@receiver(post_init, sender=TaskDetail)
+def remember_loaded_priority(sender, instance, **kwargs):
+    instance._loaded_priority = instance.__dict__.get('priority')
+
+@receiver(post_save, sender=Task)
+def update_loads_on_status(sender, instance, created, **kwargs):
+    autoassign.task_saved(instance, created)
+
+@receiver(post_save, sender=TaskDetail)
+def update_loads_on_priority(sender, instance, created, **kwargs):
+    autoassign.detail_saved(instance, created)
+
+@receiver(m2m_changed, sender=Task.assigned_to.through)
+def update_loads_on_assignment(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and autoassign.balancer.ready:
+        # pk_set is None for clears; remember who is being removed
+        through = sender.objects.filter(**{'customuser_id' if reverse else 'task_id': instance.pk})
+        instance._cleared_ids = list(through.values_list('task_id' if reverse else 'customuser_id', flat=True))
+        return
+    if action == 'post_clear':
+        action, pk_set = 'post_remove', instance.__dict__.pop('_cleared_ids', None)
+    if action not in ('post_add', 'post_remove'):
+        return
+    if reverse:
+        autoassign.tasks_changed_for_user(instance.pk, action, pk_set)
+    else:
+        autoassign.assignees_changed(instance, action, pk_set)
+
+@receiver(pre_delete, sender=Task)
+def update_loads_on_delete(sender, instance, **kwargs):
+    autoassign.task_deleting(instance)
+
 # @receiver(post_delete,sender=Task)
 # def delete_associate_details(sender,instance,**kwargs):
 #     if instance.details:
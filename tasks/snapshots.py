@@ -0,0 +1,78 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+from tasks.facets import start_of_day
+from tasks.models import ProjectSnapshot, TaskRecord
+
+COUNTS = ('pending', 'in_progress', 'completed', 'overdue')
+
+
+def snapshot_rows(day):
+    """ProjectSnapshots for the end of `day`, plus the all-projects total,
+    from one GROUP BY over live and archived tasks.
+
+    Task rows only hold their current status, so a past day is read from
+    the timestamps: a task existed if it was created before the day ended,
+    and counts as completed then if it is completed now and was last
+    updated before the day ended. A task completed later counts as in
+    progress on that day. For today the counts are exact.
+    """
+    end = start_of_day(day + timedelta(days=1))
+    completed = Q(status='COMPLETED', updated_at__lt=end)
+    rows = [
+        ProjectSnapshot(day=day, project_id=project_id, pending=pending, in_progress=in_progress,
+                        completed=done, overdue=overdue)
+        for project_id, pending, in_progress, done, overdue in (
+            TaskRecord.objects.filter(created_at__lt=end)
+            .values_list('project_id')
+            .annotate(
+                pending=Count('id', filter=Q(status='PENDING')),
+                in_progress=Count('id', filter=Q(status='IN_PROGRESS') | Q(status='COMPLETED', updated_at__gte=end)),
+                completed=Count('id', filter=completed),
+                overdue=Count('id', filter=Q(due_date__lt=day) & ~completed),
+            )
+            .order_by()
+        )
+    ]
+    rows.append(ProjectSnapshot(day=day, project_id=None, **{
+        field: sum(getattr(row, field) for row in rows) for field in COUNTS
+    }))
+    return rows
+
+
+def write_snapshot(day):
+    """Replace `day`'s snapshot in one transaction; running it twice for
+    the same day leaves the same rows. Returns the number of rows."""
+    rows = snapshot_rows(day)
+    with transaction.atomic():
+        ProjectSnapshot.objects.filter(day=day).delete()
+        ProjectSnapshot.objects.bulk_create(rows, batch_size=5000)
+    return len(rows)
+
+
+def days_to_snapshot(today, since=None):
+    """From the last snapshot (taken again: it may have been taken before
+    that day was over) or `since`, whichever is earlier, through today.
+    Without either, just today."""
+    last = ProjectSnapshot.objects.filter(project__isnull=True).order_by('-day').values_list('day', flat=True).first()
+    start = min(day for day in (last, since, today) if day is not None)
+    return [start + timedelta(days=offset) for offset in range((today - start).days + 1)]
+
+
+def burndown(project_id, start, end):
+    """Snapshot rows for one project (None: all projects) over [start, end],
+    with `completed_today` worked out from consecutive days. Reads at most
+    one row per day, whatever the number of tasks."""
+    rows = list(
+        ProjectSnapshot.objects.filter(project_id=project_id, day__gte=start - timedelta(days=1), day__lte=end)
+        .order_by('day').values('day', *COUNTS)
+    )
+    previous = None
+    for row in rows:
+        consecutive = previous is not None and previous['day'] == row['day'] - timedelta(days=1)
+        row['completed_today'] = row['completed'] - previous['completed'] if consecutive else None
+        row['open'] = row['pending'] + row['in_progress']
+        previous = row
+    return [row for row in rows if row['day'] >= start]
@@ -1,3 +1,1021 @@
-from django.test import TestCase
+import datetime
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from tasks import archive, autoassign, events, facets, hierarchy, reminders, snapshots, uploads, workload
+from tasks.models import (
+    ArchivedTask, ArchivedTaskDetail, AssetUpload, Project, ProjectSnapshot, ReminderWatermark, Task, TaskActivity,
+    TaskDetail, TaskReminder,
+)
+from tasks.management.commands import populate_db
+from tasks.paginator import EstimatedCountPaginator
+from users.models import CustomUser
+
+# Nothing listens on port 1: every cache call fails, as while Redis is down.
+UNREACHABLE_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                                 'LOCATION': 'redis://127.0.0.1:1/0'}}
+
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), 'red').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class AssetUploadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('boss', password='Secret#123', is_superuser=True)
+        project = Project.objects.create(name='Project', start_date=datetime.date.today())
+        cls.task = Task.objects.create(
+            project=project, title='Task', description='Description', due_date=datetime.date.today())
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.temp_dir = Path(self.root) / 'upload_tmp'
+        settings = override_settings(
+            MEDIA_ROOT=self.root, ASSET_UPLOAD_TEMP_DIR=self.temp_dir, ASSET_UPLOAD_CHUNK_SIZE=1024,
+            ASSET_UPLOAD_MAX_SIZE=1024 * 1024)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client.force_login(self.user)
+
+    def start(self, filename, total_size):
+        return self.client.post(
+            reverse('start_asset_upload', args=[self.task.id]), {'filename': filename, 'total_size': total_size})
+
+    def put(self, upload_id, offset, chunk, checksum=None):
+        return self.client.put(
+            reverse('asset_upload_chunk', args=[self.task.id, upload_id]), chunk,
+            content_type='application/octet-stream', headers={
+                'Upload-Offset': str(offset),
+                'X-Chunk-Checksum': checksum or hashlib.sha256(chunk).hexdigest(),
+            })
+
+    def upload(self, filename, data):
+        upload_id = self.start(filename, len(data)).json()['upload_id']
+        for offset in range(0, len(data), 1024):
+            self.assertEqual(self.put(upload_id, offset, data[offset:offset + 1024]).status_code, 200)
+        return upload_id, self.client.post(reverse('complete_asset_upload', args=[self.task.id, upload_id]))
+
+    def test_chunked_upload_is_promoted(self):
+        data = png_bytes() * 3
+        upload_id, response = self.upload('picture.png', data)
+        self.assertEqual(response.status_code, 200)
+        asset = TaskDetail.objects.get(task=self.task).assets
+        self.assertEqual(asset.read(), data)
+        self.assertFalse(AssetUpload.objects.exists())
+        self.assertEqual(list(self.temp_dir.iterdir()), [])
+
+    def test_failed_save_puts_the_file_back(self):
+        TaskDetail.objects.create(task=self.task)
+        data = png_bytes()
+        with mock.patch.object(TaskDetail, 'save', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.upload('picture.png', data)
+        self.assertEqual(list(Path(self.root).glob('tasks_asset/*')), [])
+        upload = AssetUpload.objects.get()
+        self.assertEqual(upload.offset, len(data))
+
+        response = self.client.post(reverse('complete_asset_upload', args=[self.task.id, upload.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(TaskDetail.objects.get(task=self.task).assets.read(), data)
+        self.assertEqual(list(self.temp_dir.iterdir()), [])
+
+    def test_bad_checksum_keeps_offset(self):
+        upload_id = self.start('picture.png', 2048).json()['upload_id']
+        response = self.put(upload_id, 0, b'x' * 1024, checksum='0' * 64)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['offset'], 0)
+        self.assertEqual(list(self.temp_dir.iterdir()), [])
+        self.assertEqual(self.put(upload_id, 0, b'x' * 1024).json()['offset'], 1024)
+        self.assertEqual(self.put(upload_id, 0, b'x' * 1024).status_code, 409)
+
+    def test_refuses_non_image_names_and_oversized_files(self):
+        self.assertEqual(self.start('script.sh', 100).status_code, 415)
+        self.assertEqual(self.start('picture.png', 1024 * 1024 + 1).status_code, 413)
+        self.assertFalse(AssetUpload.objects.exists())
+
+    def test_refuses_content_that_is_not_an_image(self):
+        upload_id, response = self.upload('picture.png', b'#!/bin/sh\n' * 200)
+        self.assertEqual(response.status_code, 415)
+        self.assertFalse(AssetUpload.objects.exists())
+        self.assertFalse(TaskDetail.objects.filter(task=self.task).exists())
+        self.assertEqual(list(self.temp_dir.iterdir()), [])
+
+    def test_cleanup_removes_expired_uploads_and_stray_files(self):
+        upload_id = self.start('picture.png', 2048).json()['upload_id']
+        self.put(upload_id, 0, b'x' * 1024)
+        stray = self.temp_dir / 'gone.part'
+        stray.write_bytes(b'x')
+        long_ago = timezone.now() - datetime.timedelta(days=2)
+        os.utime(stray, (long_ago.timestamp(), long_ago.timestamp()))
+        AssetUpload.objects.update(updated_at=long_ago)
+
+        self.assertEqual(self.put(upload_id, 1024, b'x' * 1024).status_code, 404)
+        self.assertEqual(uploads.cleanup_uploads(), (1, 1))
+        self.assertFalse(AssetUpload.objects.exists())
+        self.assertEqual(list(self.temp_dir.iterdir()), [])
+
+
+class ManagerDashboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = CustomUser.objects.create_user('manager', password='Secret#123')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+        cls.projects = [Project.objects.create(name=f'Project {i}', start_date=datetime.date.today()) for i in range(2)]
+        for i, status in enumerate(['PENDING', 'PENDING', 'IN_PROGRESS', 'COMPLETED', 'COMPLETED']):
+            Task.objects.create(
+                project=cls.projects[i % 2], title=f'Task {i}', description='Description',
+                due_date=datetime.date.today(), status=status)
+
+    def setUp(self):
+        self.client.force_login(self.manager)
+
+    def test_async_dashboard_counts_follow_the_filters(self):
+        for name in ('manager_dashboard', 'async_manager_dashboard'):
+            with self.subTest(name):
+                response = self.client.get(reverse(name), {'project': self.projects[0].pk})
+                self.assertEqual(response.context['counts'], {
+                    'total_task': 3, 'completed_task': 1, 'in_progress_task': 1, 'pending_task': 1})
+                self.assertEqual(response.context['paginator'].count, 3)
+                self.assertTrue(response.context['facet_sections'])
+
+    def test_async_dashboard_answers_304_until_a_task_changes(self):
+        url = reverse('async_manager_dashboard')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+        Task.objects.filter(title='Task 0').first().save()
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 200)
+
+
+class RecordingBroker:
+    def __init__(self):
+        self.events = []
+
+    def has_subscribers(self):
+        return True
+
+    def publish(self, event):
+        self.events.append(event)
+
+
+class LiveEventTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('employee')
+        cls.project = Project.objects.create(name='Project', start_date=datetime.date.today())
+        cls.tasks = [
+            Task.objects.create(project=cls.project, title=f'Task {i}', description='Description',
+                                due_date=datetime.date(2026, 1, 10 + i))
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        self.broker = RecordingBroker()
+        patcher = mock.patch('tasks.signals.get_broker', return_value=self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reverse_assignment_publishes_in_one_batch(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.tasks.add(*self.tasks)
+        with self.assertNumQueries(2):
+            for callback in callbacks:
+                callback()
+        self.assertEqual(sorted(event['id'] for event in self.broker.events), [task.id for task in self.tasks])
+        self.assertTrue(all(event['assignees'] == [self.user.id] for event in self.broker.events))
+
+    def test_previous_status_comes_from_the_loaded_instance(self):
+        task = Task.objects.get(pk=self.tasks[0].pk)
+        task.status = 'COMPLETED'
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            task.save()
+        self.assertFalse([query for query in queries if query['sql'].startswith('SELECT "tasks_task"."status"')])
+        self.assertEqual(self.broker.events[-1]['previous_status'], 'PENDING')
+        self.assertEqual(self.broker.events[-1]['status'], 'COMPLETED')
+
+    def test_events_say_whether_the_task_is_in_the_filters(self):
+        event = events.task_event(self.tasks[0], [self.user.id])
+        self.assertTrue(facets.matches({}, event))
+        self.assertTrue(facets.matches({'project': [self.project.id], 'assignee': [self.user.id]}, event))
+        self.assertFalse(facets.matches({'status': ['COMPLETED']}, event))
+        self.assertFalse(facets.matches({'assignee': [self.user.id + 1]}, event))
+        self.assertTrue(facets.matches({'due': (datetime.date(2026, 1, 10), None)}, event))
+        self.assertFalse(facets.matches({'due': (None, datetime.date(2026, 1, 9))}, event))
+        self.assertFalse(facets.matches({}, events.deleted_event(self.tasks[0])))
+
+    def test_events_carry_the_fields_before_the_transaction(self):
+        task = Task.objects.get(pk=self.tasks[0].pk)
+        other = Project.objects.create(name='Other', start_date=datetime.date.today())
+        with self.captureOnCommitCallbacks(execute=True):
+            task.assigned_to.add(self.user)
+            task.project = other
+            task.save()
+            TaskDetail.objects.create(task=task, priority='H')
+        self.assertEqual(self.broker.events[-1]['previous'], {
+            'status': 'PENDING', 'project': self.project.id, 'due_date': '2026-01-10', 'priority': None,
+            'assignees': []})
+        self.assertFalse(facets.matched({'project': [other.id]}, self.broker.events[-1]))
+        self.assertTrue(facets.matched({'project': [self.project.id]}, self.broker.events[-1]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            task.assigned_to.clear()
+        self.assertIsNone(self.broker.events[-1]['previous'])
+
+    def test_subscriptions_only_get_tasks_in_their_filters_before_or_after(self):
+        subscription = events.Subscription(None, filters={'project': [1], 'status': ['PENDING']})
+        event = {'id': 1, 'project': 2, 'status': 'PENDING', 'assignees': [], 'previous': {}}
+        subscription.offer(1, event)
+        subscription.offer(2, dict(event, id=2, previous={'project': 1}))
+        subscription.offer(3, dict(event, id=3, project=1, created=True))
+        subscription.offer(4, dict(event, id=4, project=1, status='COMPLETED', previous={'status': 'PENDING'}))
+        self.assertEqual([(seq, event['matches']) for seq, event in subscription.pending.values()],
+                         [(2, False), (3, True), (4, False)])
+        # Another status in the project isn't for the table, but the cards count it.
+        subscription.offer(5, dict(event, id=5, project=1, status='COMPLETED', previous={'status': 'IN_PROGRESS'}))
+        self.assertEqual(len(subscription.pending), 3)
+        self.assertEqual(subscription.changed, 5)
+
+    async def test_stream_sends_counts_after_each_batch(self):
+        broker = events.InMemoryBroker()
+        subscription = broker.subscribe(filters={'status': ['PENDING']})
+        with mock.patch('tasks.events.get_broker', return_value=broker):
+            stream = events.stream(subscription, counts=self.counts)
+            self.assertEqual(await anext(stream), "retry: 5000\n\n")
+            self.assertIn('event: counts', await anext(stream))
+            subscription.offer(1, {'id': 1, 'project': 1, 'status': 'COMPLETED', 'assignees': []})
+            self.assertIn('"matches":false', await anext(stream))
+            self.assertIn('event: counts', await anext(stream))
+            await stream.aclose()
+        self.assertFalse(broker.has_subscribers())
+
+    async def test_streams_with_the_same_filters_share_each_count(self):
+        broker = events.InMemoryBroker()
+        subscriptions = [broker.subscribe(filters={'project': [1]}) for _ in range(3)]
+        subscriptions.append(broker.subscribe(filters={'project': [2]}))
+        counts = mock.Mock(return_value={'total_task': 1})
+        with mock.patch('tasks.events.get_broker', return_value=broker):
+            streams = [events.stream(subscription, counts=counts) for subscription in subscriptions]
+            for stream in streams:
+                await anext(stream)
+                await anext(stream)
+            self.assertEqual(counts.call_count, 2)
+            broker.publish({'id': 1, 'project': 1, 'status': 'PENDING', 'assignees': [], 'created': True})
+            for stream in streams[:3]:
+                self.assertIn('event: task', await anext(stream))
+                self.assertIn('event: counts', await anext(stream))
+            self.assertEqual(counts.call_count, 3)
+            self.assertEqual(subscriptions[3].pending, {})
+            for stream in streams:
+                await stream.aclose()
+        self.assertEqual(broker.counting, {})
+
+    @staticmethod
+    def counts(filters):
+        return {'total_task': 1}
+
+
+class ActivityTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('boss', password='Secret#123', is_superuser=True)
+        cls.employees = [CustomUser.objects.create_user(f'employee{i}', email=f'employee{i}@example.com')
+                         for i in range(2)]
+        cls.project = Project.objects.create(name='Project', start_date=datetime.date.today())
+        cls.task = Task.objects.create(
+            project=cls.project, title='Task', description='Description', due_date=datetime.date(2026, 1, 1))
+        TaskDetail.objects.create(task=cls.task)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def update(self, **data):
+        return self.client.post(reverse('update_task', args=[self.task.id]), {
+            'title': 'Task', 'description': 'Description', 'project': self.project.pk,
+            'due_date_year': '2026', 'due_date_month': '1', 'due_date_day': '1',
+            'assigned_to': [employee.pk for employee in self.employees], 'priority': 'L', 'notes': '', **data})
+
+    def test_an_edit_writes_the_task_and_one_entry_once(self):
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.update(title='Renamed', priority='H').status_code, 302)
+        writes = [query['sql'].split(' ', 2)[:2] for query in queries
+                  if query['sql'].startswith(('UPDATE "tasks_task"', 'INSERT INTO "tasks_taskactivity"'))]
+        self.assertEqual(writes, [['UPDATE', '"tasks_task"'], ['INSERT', 'INTO']])
+        changes = TaskActivity.objects.get().changes
+        self.assertEqual(changes['title'], ['Task', 'Renamed'])
+        self.assertEqual(changes['priority'], ['L', 'H'])
+        self.assertEqual(changes['assigned_to'], {'added': [e.pk for e in self.employees], 'removed': []})
+
+    def test_feed_pages_newest_first(self):
+        for i in range(3):
+            TaskActivity.objects.create(task=self.task, project=self.project, user=self.user,
+                                        changes={'title': [str(i), str(i + 1)]})
+        with mock.patch('tasks.views.ACTIVITY_PAGE_SIZE', 2):
+            page = self.client.get(reverse('project_activity', args=[self.project.id])).json()
+            self.assertEqual([entry['changes']['title'][1] for entry in page['results']], ['3', '2'])
+            rest = self.client.get(page['next']).json()
+        self.assertEqual([entry['changes']['title'][1] for entry in rest['results']], ['1'])
+        self.assertIsNone(rest['next'])
+        self.assertEqual(rest['results'][0]['user__username'], 'boss')
+
+
+class TaskTouchTests(TransactionTestCase):
+
+    def test_related_changes_touch_the_task_once_at_commit(self):
+        project = Project.objects.create(name='Project', start_date=datetime.date.today())
+        task = Task.objects.create(project=project, title='Task', description='Description',
+                                   due_date=datetime.date.today())
+        employee = CustomUser.objects.create_user('employee')
+        stamped = task.updated_at
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                TaskDetail.objects.create(task=task, notes='Notes')
+                task.assigned_to.add(employee)
+                self.assertEqual(Task.objects.get().updated_at, stamped)
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE "tasks_task"')]), 1)
+        self.assertGreater(Task.objects.get().updated_at, stamped)
+
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                task.title = 'Renamed'
+                task.save()
+                task.assigned_to.remove(employee)
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE "tasks_task"')]), 1)
+
+
+class FacetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Project i has i + 1 tasks, so the first ones fall outside the top FACET_LIMIT.
+        cls.projects = [Project.objects.create(name=f'Project {i}', start_date=datetime.date.today())
+                        for i in range(facets.FACET_LIMIT + 2)]
+        Task.objects.bulk_create([
+            Task(project=project, title=f'Task {i}', description='Description', due_date=datetime.date.today())
+            for i, project in enumerate(cls.projects) for _ in range(i + 1)
+        ])
+
+    def project_counts(self, filters):
+        return [(name, count) for _, name, count in facets.count_facets(filters)['project']]
+
+    def test_selected_values_stay_listed_beyond_the_limit(self):
+        unselected = self.project_counts({})
+        self.assertEqual(len(unselected), facets.FACET_LIMIT)
+        self.assertEqual(unselected[0], ('Project 11', 12))
+        self.assertNotIn(('Project 0', 1), unselected)
+
+        selected = self.project_counts({'project': [self.projects[0].pk]})
+        self.assertEqual(selected, unselected + [('Project 0', 1)])
+        sections = dict(facets.facet_sections({'project': [self.projects[0].pk]},
+                                              facets.count_facets({'project': [self.projects[0].pk]})))
+        self.assertTrue(sections['Project'][-1]['selected'])
+
+    def test_selected_values_without_rows_count_zero(self):
+        empty = Project.objects.create(name='Empty', start_date=datetime.date.today())
+        self.assertEqual(self.project_counts({'project': [empty.pk]})[-1], ('Empty', 0))
+
+    def test_cached_counts_follow_task_changes(self):
+        self.assertEqual(facets.facets({})['total'], 78)
+        Task.objects.filter(project=self.projects[-1]).first().delete()
+        self.assertEqual(facets.facets({})['total'], 77)
+
+    @override_settings(CACHES=UNREACHABLE_CACHE)
+    def test_counts_without_the_cache(self):
+        with self.assertLogs('tasks.workload', 'WARNING'):
+            self.assertEqual(facets.facets({})['total'], 78)
+            Task.objects.filter(project=self.projects[-1]).first().delete()
+            self.assertEqual(facets.facets({})['total'], 77)
+
+
+class ImportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.project = Project.objects.create(name='Project', start_date=datetime.date.today())
+        for name in ('ann', 'bob', 'cid'):
+            CustomUser.objects.create_user(name, email=f'{name}@example.com')
+
+    def import_lines(self, *lines, **options):
+        stdin, stdout, stderr = io.StringIO('\n'.join(lines) + '\n'), io.StringIO(), io.StringIO()
+        with mock.patch('sys.stdin', stdin):
+            call_command('import_tasks', '-', format='jsonl', stdout=stdout, stderr=stderr, **options)
+        self.assertFalse(stdin.closed)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        row = {'title': 'Task', 'due_date': '2026-01-01', 'project': 'Project'}
+        out, err = self.import_lines(
+            json.dumps(row),
+            '{not json',
+            '[1, 2]',
+            json.dumps({**row, 'assignees': {'ann': True}}),
+            json.dumps({**row, 'assignees': [1, 2]}),
+            json.dumps({**row, 'assignees': 7}),
+            json.dumps({**row, 'assignees': ['dan']}),
+            json.dumps({**row, 'project': 'Elsewhere'}),
+            json.dumps({**row, 'due_date': '01/01/2026'}),
+            json.dumps({**row, 'status': 'Lost'}),
+            json.dumps({**row, 'title': 'x' * 300}),
+            no_notify=True,
+        )
+        self.assertIn('Imported 1 tasks', out)
+        self.assertIn('skipped 10 rows', out)
+        errors = err.splitlines()
+        self.assertEqual(len(errors), 10)
+        self.assertTrue(errors[0].startswith('Line 2: invalid JSON'))
+        self.assertEqual(errors[1], 'Line 3: expected a JSON object')
+        for line in errors[2:5]:
+            self.assertTrue(line.endswith('assignees must be a list of usernames or a string of them'))
+        self.assertEqual(errors[5], "Line 7: unknown user 'dan'")
+        self.assertEqual(errors[6], "Line 8: unknown project 'Elsewhere'")
+        self.assertEqual(Task.objects.count(), 1)
+
+    @override_settings(TASK_IMPORT_MAIL_RECIPIENTS=2)
+    def test_summary_mail_is_split_into_bcc_chunks(self):
+        out, _ = self.import_lines(
+            json.dumps({'title': 'One', 'due_date': '2026-01-01', 'project': 'Project', 'assignees': 'ann, bob'}),
+            json.dumps({'title': 'Two', 'due_date': '2026-01-02', 'project': 'Project', 'assignees': ['cid']}),
+        )
+        self.assertEqual([message.bcc for message in mail.outbox],
+                         [['ann@example.com', 'bob@example.com'], ['cid@example.com']])
+        self.assertIn('notified 3 assignees', out)
+        self.assertEqual(Task.assigned_to.through.objects.count(), 3)
+
+
+@override_settings(TASK_REMINDER_LEAD_DAYS=1)
+class ReminderTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = datetime.date(2026, 3, 10)
+        cls.ann = CustomUser.objects.create_user('ann', email='ann@example.com')
+        cls.bob = CustomUser.objects.create_user('bob', email='bob@example.com')
+        project = Project.objects.create(name='Project', start_date=cls.today)
+        cls.tasks = {}
+        for title, days, status in [('today', 0, 'PENDING'), ('tomorrow', 1, 'IN_PROGRESS'), ('later', 2, 'PENDING'),
+                                    ('yesterday', -1, 'PENDING'), ('done', 0, 'COMPLETED'), ('old', -5, 'PENDING')]:
+            task = Task.objects.create(project=project, title=title, description='Description',
+                                       due_date=cls.today + datetime.timedelta(days=days), status=status)
+            task.assigned_to.set([cls.ann, cls.bob] if title == 'today' else [cls.ann])
+            cls.tasks[title] = task
+
+    def queued(self, kind):
+        return sorted(TaskReminder.objects.filter(kind=kind).values_list('task__title', 'user__username'))
+
+    def test_queues_each_window_once_per_assignee(self):
+        self.assertEqual(reminders.queue_reminders(TaskReminder.UPCOMING, self.today, 1), 3)
+        self.assertEqual(reminders.queue_reminders(TaskReminder.OVERDUE, self.today, 1), 1)
+        self.assertEqual(self.queued(TaskReminder.UPCOMING),
+                         [('today', 'ann'), ('today', 'bob'), ('tomorrow', 'ann')])
+        self.assertEqual(self.queued(TaskReminder.OVERDUE), [('yesterday', 'ann')])
+
+        self.assertEqual(reminders.queue_reminders(TaskReminder.UPCOMING, self.today, 100), 0)
+        # Rescheduled into the recent window after the run: still caught.
+        Task.objects.filter(pk=self.tasks['later'].pk).update(due_date=self.today)
+        self.assertEqual(reminders.queue_reminders(TaskReminder.UPCOMING, self.today, 100), 1)
+
+    def test_catches_up_from_the_watermark(self):
+        ReminderWatermark.objects.create(kind=TaskReminder.OVERDUE, due_through=self.today - datetime.timedelta(days=7))
+        reminders.queue_reminders(TaskReminder.OVERDUE, self.today, 100)
+        self.assertEqual(self.queued(TaskReminder.OVERDUE), [('old', 'ann'), ('yesterday', 'ann')])
+        self.assertEqual(ReminderWatermark.objects.get(kind=TaskReminder.OVERDUE).due_through,
+                         self.today - datetime.timedelta(days=1))
+
+    def test_sends_one_message_per_assignee(self):
+        reminders.queue_reminders(TaskReminder.UPCOMING, self.today, 100)
+        reminders.queue_reminders(TaskReminder.OVERDUE, self.today, 100)
+        Task.objects.filter(pk=self.tasks['tomorrow'].pk).update(status='COMPLETED')
+
+        self.assertEqual(reminders.send_reminders(100), 2)
+        messages = {message.to[0]: message for message in mail.outbox}
+        self.assertEqual(messages['ann@example.com'].subject, "Overdue tasks")
+        self.assertIn('- today (due 2026-03-10)', messages['ann@example.com'].body)
+        self.assertNotIn('tomorrow', messages['ann@example.com'].body)
+        self.assertEqual(messages['bob@example.com'].subject, "Tasks due soon")
+        self.assertFalse(TaskReminder.objects.filter(sent_at__isnull=True).exists())
+        self.assertEqual(reminders.send_reminders(100), 0)
+
+    def test_failed_sends_go_back_to_the_queue(self):
+        reminders.queue_reminders(TaskReminder.UPCOMING, self.today, 100)
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError):
+            with self.assertRaises(OSError):
+                reminders.send_reminders(100)
+        self.assertEqual(TaskReminder.objects.filter(sent_at__isnull=True).count(), 3)
+
+
+class ArchiveTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('employee')
+        project = Project.objects.create(name='Project', start_date=datetime.date.today())
+        cls.tasks = {}
+        for title, status in [('old', 'COMPLETED'), ('open', 'PENDING'), ('recent', 'COMPLETED'),
+                              ('uploading', 'COMPLETED'), ('parent', 'COMPLETED')]:
+            task = Task.objects.create(project=project, title=title, description='Description',
+                                       due_date=datetime.date(2026, 1, 1), status=status)
+            TaskDetail.objects.create(task=task, priority='H', notes=title)
+            task.assigned_to.add(cls.user)
+            cls.tasks[title] = task
+        Task.objects.create(project=project, title='child', description='Description', status='COMPLETED',
+                            due_date=datetime.date(2026, 1, 1), parent=cls.tasks['parent'])
+        AssetUpload.objects.create(
+            task=cls.tasks['uploading'], uploaded_by=cls.user, filename='picture.png', total_size=10)
+        long_ago = timezone.now() - datetime.timedelta(days=100)
+        Task.objects.exclude(title='recent').update(updated_at=long_ago)
+
+    def test_moves_only_archivable_tasks_with_their_rows(self):
+        generation = workload.generation()
+        moved = list(archive.archive_tasks(archive.archive_cutoff(30), batch_size=1))
+        self.assertEqual(moved, [1])
+        self.assertGreater(workload.generation(), generation)
+
+        old = self.tasks['old']
+        self.assertFalse(Task.objects.filter(pk=old.pk).exists())
+        self.assertFalse(TaskDetail.objects.filter(task_id=old.pk).exists())
+        archived = ArchivedTask.objects.get(pk=old.pk)
+        self.assertEqual(archived.title, 'old')
+        self.assertEqual(list(archived.assigned_to.all()), [self.user])
+        self.assertEqual(ArchivedTaskDetail.objects.get(task_id=old.pk).notes, 'old')
+        self.assertEqual(Task.objects.count(), 5)
+
+    def test_union_view_reads_live_and_archived_tasks(self):
+        list(archive.archive_tasks(archive.archive_cutoff(30), batch_size=10))
+        records = Task.objects.include_archived().filter(assigned_to=self.user).order_by('id')
+        self.assertEqual([(record.title, record.archived) for record in records],
+                         [('old', True), ('open', False), ('recent', False), ('uploading', False), ('parent', False)])
+        self.assertEqual(records.get(archived=True).details.notes, 'old')
+        self.assertEqual(Task.objects.include_archived().filter(status='COMPLETED', archived=False).count(), 4)
+        with self.assertRaises(TypeError):
+            Task.objects.filter(status='COMPLETED').include_archived()
+
+
+class HierarchyTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        project = Project.objects.create(name='Project', start_date=datetime.date.today())
+
+        def task(title, parent=None, status='PENDING', day=1):
+            return Task.objects.create(project=project, title=title, description='Description', parent=parent,
+                                       status=status, due_date=datetime.date(2026, 1, day))
+
+        cls.root = task('root', day=20)
+        cls.left = task('left', cls.root, 'COMPLETED', day=2)
+        cls.right = task('right', cls.root, day=10)
+        cls.leaf = task('leaf', cls.left, day=5)
+        cls.other = task('other')
+
+    def test_rejects_cycles(self):
+        for task, parent in [(self.root, self.root), (self.root, self.left), (self.root, self.leaf),
+                             (self.left, self.leaf)]:
+            with self.subTest(task=task.title, parent=parent.title), self.assertRaises(ValidationError):
+                hierarchy.check_parent(task, parent)
+        hierarchy.check_parent(self.other, self.leaf)
+        hierarchy.check_parent(self.right, self.left)
+        hierarchy.check_parent(Task(title='new'), self.leaf)
+
+    def test_rejects_nesting_beyond_the_limit(self):
+        with mock.patch('tasks.hierarchy.MAX_DEPTH', 2):
+            hierarchy.check_parent(self.other, self.left)
+            with self.assertRaises(ValidationError):
+                hierarchy.check_parent(self.other, self.leaf)
+            with self.assertRaises(ValidationError):
+                hierarchy.check_parent(self.root, self.other)
+
+    def test_rollups_cover_the_whole_subtree(self):
+        self.assertEqual(hierarchy.ancestor_ids(self.leaf.pk), [self.leaf.pk, self.left.pk, self.root.pk])
+        rollups = hierarchy.rollups(self.root.pk, [self.left.pk, self.right.pk])
+        self.assertEqual(rollups[self.root.pk], {
+            'total': 4, 'completed': 1, 'percent': 25, 'earliest_due': datetime.date(2026, 1, 5)})
+        self.assertEqual(rollups[self.left.pk]['total'], 2)
+        self.assertEqual(rollups[self.right.pk]['earliest_due'], datetime.date(2026, 1, 10))
+
+        Task.objects.filter(pk=self.leaf.pk).first().delete()
+        self.assertEqual(hierarchy.rollups(self.root.pk, [self.left.pk])[self.root.pk]['total'], 3)
+
+
+class CalendarTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('boss', password='Secret#123', is_superuser=True)
+        cls.project = Project.objects.create(name='Project', start_date=datetime.date.today())
+        other = Project.objects.create(name='Other', start_date=datetime.date.today())
+        for i in range(5):
+            Task.objects.create(project=cls.project, title=f'Task {i}', description='Description',
+                                due_date=datetime.date(2026, 3, 2), status='COMPLETED' if i == 4 else 'PENDING')
+        Task.objects.create(project=other, title='Elsewhere', description='Description',
+                            due_date=datetime.date(2026, 3, 3))
+        Task.objects.create(project=cls.project, title='April', description='Description',
+                            due_date=datetime.date(2026, 4, 1))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def feed(self, headers=None, **params):
+        return self.client.get(reverse('calendar_feed'), {'start': '2026-03-01', 'end': '2026-04-01', **params},
+                               headers=headers)
+
+    def test_days_are_counted_with_a_preview(self):
+        days = self.feed().json()['days']
+        self.assertEqual([(day['date'], day['count'], day['completed']) for day in days],
+                         [('2026-03-02', 5, 1), ('2026-03-03', 1, 0)])
+        self.assertEqual([task['title'] for task in days[0]['tasks']], ['Task 0', 'Task 1', 'Task 2'])
+        self.assertEqual(len(self.feed(project=self.project.pk).json()['days']), 1)
+
+    def test_refuses_bad_ranges(self):
+        for params in ({'end': '2026-02-01'}, {'end': '2026-06-01'}, {'start': 'March'}, {'start': ''}):
+            with self.subTest(params):
+                self.assertEqual(self.feed(**params).status_code, 400)
+
+    @override_settings(CACHES=UNREACHABLE_CACHE)
+    def test_renders_without_an_etag_without_the_cache(self):
+        with self.assertLogs('tasks.workload', 'WARNING'):
+            response = self.feed()
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('ETag', response)
+            Task.objects.filter(title='Task 0').update(status='COMPLETED')
+            self.assertEqual(self.feed().json()['days'][0]['completed'], 2)
+
+    def test_etag_changes_with_any_task_write(self):
+        etag = self.feed()['ETag']
+        self.assertEqual(self.feed(headers={'If-None-Match': etag}).status_code, 304)
+        task = Task.objects.get(title='April')
+        for write in (lambda: TaskDetail.objects.create(task=task), lambda: task.assigned_to.add(self.user),
+                      lambda: Task.objects.filter(pk=task.pk).first().delete()):
+            write()
+            response = self.feed(headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 200)
+            etag = response['ETag']
+
+
+class WorkloadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = CustomUser.objects.create_user('manager')
+        cls.manager.groups.add(Group.objects.create(name='Manager'))
+        cls.ann = CustomUser.objects.create_user('ann')
+        cls.bob = CustomUser.objects.create_user('bob')
+        cls.projects = [Project.objects.create(name=f'Project {i}', start_date=datetime.date.today()) for i in range(2)]
+        today = timezone.localdate()
+        for project, status, days, priority, assignees in [
+            (0, 'PENDING', -1, 'H', [cls.ann, cls.bob]),
+            (0, 'IN_PROGRESS', 3, 'L', [cls.ann]),
+            (1, 'PENDING', 3, 'H', [cls.ann]),
+            (1, 'COMPLETED', -3, 'H', [cls.bob]),
+        ]:
+            task = Task.objects.create(project=cls.projects[project], title='Task', description='Description',
+                                       status=status, due_date=today + datetime.timedelta(days=days))
+            TaskDetail.objects.create(task=task, priority=priority)
+            task.assigned_to.set(assignees)
+
+    def setUp(self):
+        # A rolled back test leaves its reports cached under the generation it ended at.
+        cache.clear()
+        self.client.force_login(self.manager)
+
+    def rows(self, **params):
+        response = self.client.get(reverse('workload_report'), params)
+        return [(row['username'], row['open'], row['overdue'], row['high_priority'])
+                for row in response.context['rows']]
+
+    def test_counts_open_overdue_and_high_priority_per_assignee(self):
+        self.assertEqual(self.rows(), [('ann', 3, 1, 2), ('bob', 1, 1, 1)])
+        self.assertEqual(self.rows(project=self.projects[1].pk), [('ann', 1, 0, 1)])
+        self.assertEqual(self.rows(sort='username'), [('ann', 3, 1, 2), ('bob', 1, 1, 1)])
+        self.assertEqual(self.rows(sort='-username'), [('bob', 1, 1, 1), ('ann', 3, 1, 2)])
+
+    def test_cached_report_follows_assignment_changes(self):
+        self.rows()
+        # Session, user and role check only; the report comes from the cache.
+        with self.assertNumQueries(3):
+            self.rows()
+        Task.objects.filter(status='COMPLETED').first().assigned_to.add(self.ann)
+        Task.objects.filter(status='IN_PROGRESS').first().assigned_to.add(self.bob)
+        self.assertEqual(self.rows(), [('ann', 3, 1, 2), ('bob', 2, 1, 1)])
+
+
+class AutoAssignTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.boss = CustomUser.objects.create_user('boss', password='Secret#123', is_superuser=True)
+        employees = Group.objects.create(name='Employee')
+        cls.ann, cls.bob, cls.cid, cls.dan = users = [
+            CustomUser.objects.create_user(name) for name in ('ann', 'bob', 'cid', 'dan')]
+        employees.user_set.add(*users)
+        cls.project = Project.objects.create(name='Project', start_date=datetime.date.today())
+        cls.other = Project.objects.create(name='Other', start_date=datetime.date.today())
+        # Loads in the project: ann 3 (one high), bob 1 (one low), cid 0 (only a completed task).
+        for user, status, priority in [(cls.ann, 'PENDING', 'H'), (cls.bob, 'IN_PROGRESS', 'L'),
+                                       (cls.cid, 'COMPLETED', 'H')]:
+            cls.task(cls.project, status, priority).assigned_to.add(user)
+
+    @classmethod
+    def task(cls, project, status='PENDING', priority='H'):
+        task = Task.objects.create(project=project, title='Task', description='Description', status=status,
+                                   due_date=datetime.date.today())
+        TaskDetail.objects.create(task=task, priority=priority)
+        return task
+
+    def setUp(self):
+        self.balancer = autoassign.LoadBalancer()
+        patcher = mock.patch('tasks.autoassign.balancer', self.balancer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_chooses_the_least_loaded_project_employees(self):
+        self.assertEqual(self.balancer.choose(self.project.pk, 2), [self.cid.pk, self.bob.pk])
+        # Nobody has worked on the other project yet: everybody is a candidate.
+        self.assertEqual(self.balancer.choose(self.other.pk, 2), [self.cid.pk, self.dan.pk])
+
+    def test_follows_this_processes_changes_after_commit(self):
+        self.balancer.choose(self.project.pk, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.task(self.project).assigned_to.add(self.cid)
+        self.assertEqual(self.balancer.loads[self.cid.pk], 3)
+        self.assertEqual(self.balancer.choose(self.project.pk, 1), [self.bob.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            Task.objects.get(assigned_to=self.bob, status='IN_PROGRESS').delete()
+        self.assertEqual(self.balancer.choose(self.project.pk, 1), [self.bob.pk])
+        self.assertEqual(self.balancer.loads[self.bob.pk], 0)
+
+    def test_rereads_the_chosen_after_commit(self):
+        self.balancer.choose(self.project.pk, 1)
+        # Assigned elsewhere: no signal reaches this balancer.
+        Task.assigned_to.through.objects.bulk_create([
+            Task.assigned_to.through(task=self.task(self.project), customuser=self.cid) for _ in range(2)])
+        with mock.patch.object(autoassign.threading, 'Thread') as thread:
+            with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(self.balancer.choose(self.project.pk, 1), [self.cid.pk])
+            self.assertEqual(len(queries), 0)
+            thread.return_value.start.assert_called_once_with()
+            # What the background thread runs.
+            self.balancer.catch_up()
+        self.assertEqual(self.balancer.loads[self.cid.pk], 6)
+        self.assertFalse(self.balancer.refreshing)
+        self.assertEqual(self.balancer.choose(self.project.pk, 1), [self.bob.pk])
+
+    def test_reloads_stale_state_in_the_background(self):
+        self.balancer.choose(self.project.pk, 1)
+        self.task(self.project, status='COMPLETED').assigned_to.add(self.dan)
+        with mock.patch.object(autoassign.threading, 'Thread') as thread, \
+                override_settings(AUTO_ASSIGN_REFRESH_SECONDS=0):
+            self.balancer.choose(self.project.pk, 1)
+            self.balancer.choose(self.project.pk, 1)
+            thread.return_value.start.assert_called_once_with()
+            self.assertNotIn(self.project.pk, self.balancer.projects[self.dan.pk])
+            self.balancer.catch_up()
+        self.assertIn(self.project.pk, self.balancer.projects[self.dan.pk])
+
+    def test_create_view_assigns_the_chosen(self):
+        self.client.force_login(self.boss)
+        data = {'title': 'New', 'description': 'Description', 'project': self.project.pk, 'priority': 'L',
+                'due_date_year': '2026', 'due_date_month': '1', 'due_date_day': '1', 'auto_assign': 2}
+        self.client.post(reverse('create_task'), data)
+        self.assertEqual(set(Task.objects.get(title='New').assigned_to.all()), {self.cid, self.bob})
+
+        Group.objects.get(name='Employee').user_set.clear()
+        self.balancer.reload()
+        response = self.client.post(reverse('create_task'), {**data, 'title': 'Nobody'})
+        self.assertIn('auto_assign', response.context['task_form'].errors)
+        self.assertFalse(Task.objects.filter(title='Nobody').exists())
+
+    def test_create_view_saves_all_or_nothing(self):
+        self.client.force_login(self.boss)
+        data = {'title': 'New', 'description': 'Description', 'project': self.project.pk, 'priority': 'L',
+                'due_date_year': '2026', 'due_date_month': '1', 'due_date_day': '1', 'auto_assign': 1}
+        with mock.patch.object(TaskDetail, 'save', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            self.client.post(reverse('create_task'), data)
+        self.assertFalse(Task.objects.filter(title='New').exists())
+
+
+class SnapshotTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = timezone.localdate()
+        cls.project = Project.objects.create(name='Project', start_date=cls.today)
+        cls.other = Project.objects.create(name='Other', start_date=cls.today)
+
+        def at(days_ago):
+            return facets.start_of_day(cls.today - datetime.timedelta(days=days_ago)) + datetime.timedelta(hours=12)
+
+        # (project, status, created days ago, updated days ago, due days ago)
+        for project, status, created, updated, due in [
+            (cls.project, 'PENDING', 5, 5, 3),
+            (cls.project, 'IN_PROGRESS', 5, 1, -5),
+            (cls.project, 'COMPLETED', 5, 2, 3),
+            (cls.project, 'COMPLETED', 5, 0, 4),
+            (cls.other, 'PENDING', 1, 1, -1),
+        ]:
+            task = Task.objects.create(project=project, title='Task', description='Description', status=status,
+                                       due_date=cls.today - datetime.timedelta(days=due))
+            Task.objects.filter(pk=task.pk).update(created_at=at(created), updated_at=at(updated))
+        ArchivedTask.objects.create(
+            id=10_000, project=cls.project, title='Archived', description='Description', status='COMPLETED',
+            due_date=cls.today - datetime.timedelta(days=10), created_at=at(9), updated_at=at(8), archived_at=at(0))
+
+    def counts(self, day, project):
+        return {row.project_id: tuple(getattr(row, field) for field in snapshots.COUNTS)
+                for row in snapshots.snapshot_rows(day)}.get(project and project.pk)
+
+    def test_past_days_are_read_from_the_timestamps(self):
+        # pending, in progress, completed, overdue
+        self.assertEqual(self.counts(self.today, self.project), (1, 1, 3, 1))
+        self.assertEqual(self.counts(self.today - datetime.timedelta(days=2), self.project), (1, 2, 2, 2))
+        self.assertEqual(self.counts(self.today - datetime.timedelta(days=3), self.project), (1, 3, 1, 1))
+        self.assertIsNone(self.counts(self.today - datetime.timedelta(days=3), self.other))
+        self.assertEqual(self.counts(self.today, None), (2, 1, 3, 1))
+
+    def test_command_writes_each_day_once_and_burndown_reads_them(self):
+        since = self.today - datetime.timedelta(days=3)
+        call_command('snapshot_projects', since=since.isoformat(), stdout=io.StringIO())
+        call_command('snapshot_projects', stdout=io.StringIO())
+        self.assertEqual(ProjectSnapshot.objects.filter(project__isnull=True).count(), 4)
+        self.assertEqual(ProjectSnapshot.objects.filter(project=self.project).count(), 4)
+
+        rows = snapshots.burndown(self.project.pk, since, self.today)
+        self.assertEqual([row['completed_today'] for row in rows], [None, 1, 0, 1])
+        self.assertEqual([row['open'] for row in rows], [4, 3, 3, 2])
+        self.assertEqual(snapshots.days_to_snapshot(self.today), [self.today])
+
+
+class ConditionalGetTests(TransactionTestCase):
+    """Real commits, since related rows touch their task when the
+    transaction commits."""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('boss', password='Secret#123', is_superuser=True)
+        self.project = Project.objects.create(name='Project', start_date=datetime.date.today())
+        self.task = Task.objects.create(project=self.project, title='Task', description='Description',
+                                        due_date=datetime.date(2026, 1, 1))
+        self.detail = TaskDetail.objects.create(task=self.task)
+        self.client.force_login(self.user)
+
+    def get(self, url, etag=None):
+        return self.client.get(url, headers={'If-None-Match': etag} if etag else {})
+
+    def test_task_page_is_fresh_until_the_task_or_its_rows_change(self):
+        url = reverse('task_details', args=[self.task.id])
+        etag = self.get(url)['ETag']
+        self.assertEqual(self.get(url, etag).status_code, 304)
+        self.detail.notes = 'Notes'
+        self.detail.save()
+        response = self.get(url, etag)
+        self.assertEqual(response.status_code, 200)
+
+        # A subtask's progress shows on its parent's page.
+        etag = response['ETag']
+        Task.objects.create(project=self.project, title='Subtask', description='Description',
+                            due_date=datetime.date.today(), parent=self.task)
+        self.assertEqual(self.get(url, etag).status_code, 200)
+
+    def test_validators_are_per_user_and_skip_pending_messages(self):
+        url = reverse('view_projects')
+        etag = self.get(url)['ETag']
+        self.assertEqual(self.get(url, etag).status_code, 304)
+        Project.objects.create(name='New', start_date=datetime.date.today())
+        etag = self.get(url, etag)['ETag']
+        self.assertEqual(self.get(url, etag).status_code, 304)
+
+        self.client.force_login(CustomUser.objects.create_user('other', is_superuser=True))
+        self.assertEqual(self.get(url, etag).status_code, 200)
+        self.client.force_login(self.user)
+        etag = self.get(url)['ETag']
+        # Leaves "Saved filter removed" for the next page, without changing any project.
+        self.client.post(reverse('delete_dashboard_filter', args=[1]))
+        self.assertEqual(self.get(url, etag).status_code, 200)
+
+
+class FragmentTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user('manager', password='Secret#123')
+        cls.user.groups.add(Group.objects.create(name='Manager'), Group.objects.create(name='Employee'))
+        project = Project.objects.create(name='Project', start_date=datetime.date.today())
+        for status in ('PENDING', 'COMPLETED'):
+            Task.objects.create(project=project, title=status.title(), description='Description',
+                                due_date=datetime.date.today(), status=status).assigned_to.add(cls.user)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_filter_switches_get_only_the_task_table(self):
+        for name in ('manager_dashboard', 'async_manager_dashboard'):
+            with self.subTest(name):
+                url = reverse(name)
+                page = self.client.get(url, {'type': 'completed'})
+                fragment = self.client.get(url, {'type': 'completed'}, headers={'HX-Request': 'true'})
+                self.assertTemplateUsed(page, 'dashboard/manager_dashboard.html')
+                self.assertTemplateUsed(fragment, 'dashboard/partials/manager_tasks.html')
+                self.assertTemplateNotUsed(fragment, 'dashboard/manager_dashboard.html')
+                self.assertNotIn('counts', fragment.context)
+                self.assertEqual([task.title for task in fragment.context['tasks']], ['Completed'])
+                self.assertIn('HX-Request', fragment['Vary'])
+                # Cached by the browser under the same URL, so the validators must differ.
+                self.assertNotEqual(page['ETag'], fragment['ETag'])
+
+    def test_partial_parameter_works_without_htmx(self):
+        for name in ('employee_dashboard', 'async_employee_dashboard'):
+            with self.subTest(name):
+                response = self.client.get(reverse(name), {'partial': '1'})
+                self.assertTemplateUsed(response, 'dashboard/partials/employee_tasks.html')
+                self.assertTemplateNotUsed(response, 'dashboard/user_dashboard.html')
+
+
+class AdminChangelistTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_superuser('admin', 'admin@example.com', 'Secret#123')
+        projects = [Project.objects.create(name=f'Project {i}', start_date=datetime.date.today()) for i in range(3)]
+        Task.objects.bulk_create([
+            Task(project=projects[i % 3], title=f'{"Alpha" if i % 2 else "Beta"} {i}', description='Description',
+                 due_date=datetime.date.today(), status='COMPLETED' if i % 4 == 0 else 'PENDING')
+            for i in range(30)
+        ])
+
+    def test_counts_are_exact_on_small_tables(self):
+        paginator = EstimatedCountPaginator(Task.objects.filter(status='COMPLETED').order_by('id'), 10)
+        self.assertEqual(paginator.count, 8)
+
+    def test_big_tables_are_counted_from_the_planner(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE tasks_task')
+        with mock.patch.object(EstimatedCountPaginator, 'estimate_threshold', 5):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(EstimatedCountPaginator(Task.objects.order_by('id'), 10).count, 30)
+            self.assertIn('reltuples', queries[0]['sql'])
+            with CaptureQueriesContext(connection) as queries:
+                estimate = EstimatedCountPaginator(Task.objects.filter(status='PENDING').order_by('id'), 10).count
+            self.assertGreater(estimate, 0)
+            self.assertTrue(queries[0]['sql'].startswith('EXPLAIN'))
+            self.assertNotIn('COUNT(', ' '.join(query['sql'] for query in queries))
+
+    def test_changelists_search_by_prefix_without_a_query_per_row(self):
+        self.client.force_login(self.admin)
+        for url in (reverse('admin:tasks_task_changelist'), reverse('admin:tasks_project_changelist')):
+            with self.subTest(url), CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            self.assertLess(len(queries), 10)
+        response = self.client.get(reverse('admin:tasks_task_changelist'), {'q': 'alp'})
+        self.assertEqual(response.context['cl'].result_count, 15)
+
+
+class PopulateDbTests(TransactionTestCase):
+    # --clear truncates the task tables, which PostgreSQL refuses inside
+    # TestCase's transaction while deferred foreign key checks are pending.
+
+    def populate(self, **options):
+        call_command('populate_db', **{'scale': 2, 'workers': 1, 'batch_size': 7, 'stdout': io.StringIO(), **options})
+        return sorted(Task.objects.values_list('title', 'status', 'due_date', 'details__priority', 'project__name'))
+
+    def test_generates_tasks_with_details_and_assignments(self):
+        tasks = self.populate()
+        self.assertEqual(len(tasks), 2 * populate_db.TASKS_PER_SCALE)
+        employees = CustomUser.objects.filter(username__startswith=populate_db.USERNAME_PREFIX, groups__name='Employee')
+        self.assertEqual(employees.count(), 2 * populate_db.USERS_PER_SCALE)
+        self.assertFalse(TaskDetail.objects.filter(priority__isnull=True).exists())
+        assignees = Task.objects.annotate(count=Count('assigned_to')).values_list('count', flat=True)
+        self.assertTrue(all(1 <= count <= 3 for count in assignees))
+        self.assertFalse(Task.objects.filter(created_at__gt=F('updated_at')).exists())
+        self.assertEqual(mail.outbox, [])
+
+    def test_same_seed_gives_the_same_data(self):
+        first = self.populate()
+        self.assertEqual(self.populate(clear=True), first)
+        self.assertNotEqual(self.populate(clear=True, seed=7), first)
+
+    @mock.patch.object(populate_db, 'CHUNK_TASKS', 6)
+    def test_workers_dont_change_the_data(self):
+        first = self.populate()
+        self.assertEqual(self.populate(clear=True, workers=3), first)
+        self.assertEqual(self.populate(clear=True, workers=2, batch_size=4), first)
@@ -0,0 +1,166 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.validators import validate_image_file_extension
+from django.utils import timezone
+from PIL import Image
+
+from tasks.models import AssetUpload
+
+# Size of each read from the request stream / temp file. Keeps memory flat
+# no matter how big the chunk or the final file is.
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class ChunkError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def temp_dir():
+    path = Path(settings.ASSET_UPLOAD_TEMP_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def temp_path(upload):
+    return temp_dir() / f"{upload.id}.part"
+
+
+def check_start(filename, total_size):
+    """Refuse an upload that could never be promoted, before any byte of it
+    is sent: a file name without an image extension, or a size over
+    ASSET_UPLOAD_MAX_SIZE."""
+    try:
+        validate_image_file_extension(File(None, name=filename))
+    except ValidationError as e:
+        raise ChunkError(e.messages[0], status=415)
+    if total_size > settings.ASSET_UPLOAD_MAX_SIZE:
+        raise ChunkError(f"Files can be at most {settings.ASSET_UPLOAD_MAX_SIZE} bytes", status=413)
+
+
+def receive_chunk(upload, offset, stream, length, checksum):
+    """Write `length` bytes from `stream` into a file of their own and
+    return its path, checked against the client supplied sha256.
+
+    Reading the request body takes as long as the client takes to send it,
+    so it happens before the upload row is locked; append_chunk() then
+    only copies a local file. A bad chunk is deleted so it can be retried.
+    """
+    if length <= 0:
+        raise ChunkError("Empty chunk")
+    if length > settings.ASSET_UPLOAD_CHUNK_SIZE:
+        raise ChunkError("Chunk is larger than the allowed chunk size", status=413)
+    if offset + length > upload.total_size:
+        raise ChunkError("Chunk goes past the declared file size", status=416)
+
+    fd, name = tempfile.mkstemp(prefix=f"{upload.id}.", suffix='.chunk', dir=temp_dir())
+    digest = hashlib.sha256()
+    remaining = length
+    with os.fdopen(fd, 'wb') as chunk:
+        while remaining:
+            block = stream.read(min(READ_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            digest.update(block)
+            chunk.write(block)
+            remaining -= len(block)
+
+    if remaining or digest.hexdigest() != checksum.lower():
+        os.unlink(name)
+        raise ChunkError("Chunk checksum mismatch")
+    return Path(name)
+
+
+def append_chunk(upload, chunk_path):
+    """Copy a received chunk to the upload's current offset in its temp
+    file and return the new offset. The caller holds the upload row's lock,
+    so the offset can't move underneath."""
+    path = temp_path(upload)
+    try:
+        with open(path, 'r+b' if path.exists() else 'wb') as part, open(chunk_path, 'rb') as chunk:
+            part.seek(upload.offset)
+            part.truncate()
+            shutil.copyfileobj(chunk, part, READ_BLOCK_SIZE)
+            return part.tell()
+    finally:
+        os.unlink(chunk_path)
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as part:
+        for block in iter(lambda: part.read(READ_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def check_image(upload):
+    """Raise ChunkError unless the assembled file is an image Pillow can
+    read, whatever the client said it was."""
+    try:
+        with Image.open(temp_path(upload)) as image:
+            image.verify()
+    except Exception:
+        raise ChunkError("The file is not a valid image", status=415)
+
+
+def promote(upload):
+    """Move the finished temp file into `tasks_asset` with an atomic rename
+    and return the storage name for the ImageField. Call it in the
+    transaction that saves the name; if that doesn't commit, demote() the
+    file so nothing is left that no row refers to."""
+    name = default_storage.get_available_name(
+        os.path.join('tasks_asset', os.path.basename(upload.filename))
+    )
+    destination = Path(default_storage.path(name))
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(temp_path(upload), destination)
+    return name
+
+
+def demote(name, path):
+    """Undo promote(): move the file back to `path`, the upload's temp path
+    (taken before the row was deleted), so completing can be retried."""
+    os.replace(default_storage.path(name), path)
+
+
+def discard(upload):
+    path = temp_path(upload)
+    if path.exists():
+        path.unlink()
+
+
+def expiry_cutoff():
+    return timezone.now() - timedelta(hours=settings.ASSET_UPLOAD_EXPIRE_HOURS)
+
+
+def cleanup_uploads():
+    """Delete uploads nobody has sent a chunk to for ASSET_UPLOAD_EXPIRE_HOURS,
+    and temp files as old with no upload left to finish them (a task
+    deleted mid-upload, a chunk whose request died). Returns how many
+    uploads and stray files went."""
+    cutoff = expiry_cutoff()
+    expired = list(AssetUpload.objects.filter(updated_at__lt=cutoff))
+    for upload in expired:
+        discard(upload)
+    AssetUpload.objects.filter(id__in=[upload.id for upload in expired]).delete()
+
+    live = {str(pk) for pk in AssetUpload.objects.values_list('id', flat=True)}
+    strays = 0
+    for path in temp_dir().iterdir():
+        if path.name.split('.', 1)[0] in live:
+            continue
+        if datetime.fromtimestamp(path.stat().st_mtime, tz=dt_timezone.utc) < cutoff:
+            path.unlink(missing_ok=True)
+            strays += 1
+    return len(expired), strays
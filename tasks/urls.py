@@ -1,14 +1,30 @@
 from django.urls import path
-from tasks.views import dashboard,ViewProject,TaskDetails,UpdateTask,DeleteTask,CreateTask,ManagerDashboard,EmployeeDashboard
+from tasks.views import dashboard,ViewProject,TaskDetails,UpdateTask,DeleteTask,CreateTask,ManagerDashboard,EmployeeDashboard,StartAssetUpload,AssetUploadChunk,CompleteAssetUpload,AsyncManagerDashboard,AsyncEmployeeDashboard,AsyncTaskDetails,TaskEventStream,TaskActivityTimeline,ProjectActivityFeed,WorkloadReport,TaskCalendar,CalendarFeed,SaveDashboardFilter,DeleteDashboardFilter,BurndownReport
 
 urlpatterns = [
     # path('show_task/<int:id>', show_specific_task) #jei datatype nibo sheita lekhte hbe routes ey
     path('manager_dashboard/', ManagerDashboard.as_view(), name="manager_dashboard"),
+    path('manager_dashboard/filters/', SaveDashboardFilter.as_view(), name='save_dashboard_filter'),
+    path('manager_dashboard/filters/<int:id>/delete/', DeleteDashboardFilter.as_view(), name='delete_dashboard_filter'),
+    path('workload/', WorkloadReport.as_view(), name='workload_report'),
+    path('burndown/', BurndownReport.as_view(), name='burndown_report'),
+    path('calendar/', TaskCalendar.as_view(), name='task_calendar'),
+    path('calendar/feed/', CalendarFeed.as_view(), name='calendar_feed'),
     path('employee_dashboard/', EmployeeDashboard.as_view(), name='employee_dashboard' ),
     path('create_task/', CreateTask.as_view(), name='create_task'),
     path('view_projects/', ViewProject.as_view(), name='view_projects'),
     path('task/<int:task_id>/details', TaskDetails.as_view(), name='task_details'),
+    path('task/<int:task_id>/activity/', TaskActivityTimeline.as_view(), name='task_activity'),
+    path('project/<int:project_id>/activity/', ProjectActivityFeed.as_view(), name='project_activity'),
+    # async ORM versions, for deployments served over ASGI
+    path('async/manager_dashboard/', AsyncManagerDashboard.as_view(), name='async_manager_dashboard'),
+    path('async/employee_dashboard/', AsyncEmployeeDashboard.as_view(), name='async_employee_dashboard'),
+    path('async/task/<int:task_id>/details', AsyncTaskDetails.as_view(), name='async_task_details'),
     path('update_task/<int:id>', UpdateTask.as_view(), name='update_task'),
     path('delete_task/<int:id>', DeleteTask.as_view(), name='delete_task'),
+    path('task/<int:task_id>/assets/uploads/', StartAssetUpload.as_view(), name='start_asset_upload'),
+    path('task/<int:task_id>/assets/uploads/<uuid:upload_id>/', AssetUploadChunk.as_view(), name='asset_upload_chunk'),
+    path('task/<int:task_id>/assets/uploads/<uuid:upload_id>/complete/', CompleteAssetUpload.as_view(), name='complete_asset_upload'),
+    path('events/', TaskEventStream.as_view(), name='task_events'),
     path('dashboard/', dashboard, name='dashboard')
 ]
\ No newline at end of file
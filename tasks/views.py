@@ -1,16 +1,32 @@
-from django.shortcuts import render,redirect
-from django.http import HttpResponse
-from tasks.forms import TaskModelForm, TaskDetailModelForm
+import asyncio
+import hashlib
+from datetime import date, timedelta
+from asgiref.sync import sync_to_async
+from django.shortcuts import render,redirect,get_object_or_404,aget_object_or_404
+from django.http import HttpResponse, JsonResponse, QueryDict, StreamingHttpResponse
+from django.core.handlers.wsgi import WSGIRequest
+from django.conf import settings
+from django.db import connections, transaction
+from tasks.forms import AutoAssignTaskModelForm, TaskModelForm, TaskDetailModelForm
 from tasks.models import *
-from django.db.models import Q, Count, Max, Min
+from django.db.models import Q, Count, Exists, Max, Min, OuterRef, Prefetch
+from django.contrib.auth.models import Group
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required,user_passes_test,permission_required
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
 from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django.middleware.csrf import get_token
 from django.views import View
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin, UserPassesTestMixin
+from django.contrib.auth.views import redirect_to_login
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
 from django.views.generic.base import ContextMixin
 from django.views.generic import ListView, DetailView, UpdateView, TemplateView, DeleteView
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
+from tasks import activity, autoassign, calendar_feed, events, facets, hierarchy, snapshots, uploads, workload
 
 # Create your views here.
 def is_admin(user):
@@ -22,12 +38,187 @@ def is_manager(user):
 def is_employee(user):
     return user.groups.filter(name='Employee').exists()
 
+async def ahas_group(user, name):
+    return await user.groups.filter(name=name).aexists()
 
-class ManagerDashboard(LoginRequiredMixin, UserPassesTestMixin, ListView):
+
+DASHBOARD_FILTERS = facets.STATUS_FILTERS
+
+DASHBOARD_PAGE_SIZE = 50
+
+def dashboard_tasks(filters):
+    base_query=Task.objects.select_related('details').prefetch_related('assigned_to').order_by('-id')
+    return base_query.filter(facets.conditions(filters))
+
+def role_version(user):
+    return tuple(user.groups.order_by('id').values_list('id', flat=True))
+
+def csrf_secret(request):
+    # get_token() makes sure the secret exists (and its cookie gets set)
+    # before the key is computed, so the first response's ETag stays valid.
+    get_token(request)
+    return request.META['CSRF_COOKIE']
+
+def conditional_state(request, compute, *args, **kwargs):
+    """(ETag, last modified) of a page whose freshness `compute(request,
+    ...)` can tell cheaply, as (parts that identify the rendered page, last
+    modified); worked out once per request.
+
+    The parts are hashed together with the URL, the user, their groups and
+    the CSRF secret (pages carry forms), so nothing user specific is served
+    from another user's cache. With flash messages waiting the page always
+    renders, otherwise a 304 would swallow them; so it does when `compute`
+    can't tell (parts None, e.g. while the shared cache is unreachable).
+    """
+    if not hasattr(request, '_conditional_state'):
+        request._conditional_state = (None, None)
+        if not len(messages.get_messages(request)):
+            parts, last_modified = compute(request, *args, **kwargs)
+            if parts is not None:
+                key = repr([
+                    request.get_full_path(), is_fragment_request(request), request.user.pk,
+                    role_version(request.user), csrf_secret(request), parts, last_modified,
+                ])
+                etag = hashlib.md5(key.encode(), usedforsecurity=False).hexdigest()
+                request._conditional_state = (etag, last_modified)
+    return request._conditional_state
+
+def conditional_page(compute):
+    """condition() for a page, with conditional_state(). An async view must
+    have awaited conditional_state() in a thread before getting here, since
+    condition() calls it synchronously."""
+    return condition(
+        etag_func=lambda request, *args, **kwargs: conditional_state(request, compute, *args, **kwargs)[0],
+        last_modified_func=lambda request, *args, **kwargs: conditional_state(request, compute, *args, **kwargs)[1],
+    )
+
+def task_list_state(request, *args, **kwargs):
+    # Every task, detail and assignment write bumps the shared task data
+    # generation (see calendar_state), so telling costs one cache read rather
+    # than a scan of the task table. The day is part of it for the overdue
+    # markers.
+    generation = workload.generation()
+    if generation is None:
+        return None, None
+    return (generation, date.today()), None
+
+def dashboard_state(request, *args, **kwargs):
+    parts, last_modified = task_list_state(request)
+    if parts is None:
+        return None, None
+    # The page lists the user's saved filters too.
+    saved = SavedFilter.objects.filter(user=request.user).aggregate(count=Count('id'), last=Max('updated_at'))
+    return (parts, saved['count'], saved['last']), last_modified
+
+def project_list_state(request, *args, **kwargs):
+    count, last_modified = task_list_state(request)
+    if count is None:
+        return None, None
+    projects = Project.objects.aggregate(count=Count('id'), last=Max('id'))
+    return (projects['count'], projects['last'], count), last_modified
+
+def task_state(request, task_id, *args, **kwargs):
+    # A task in a hierarchy also shows its parent and its subtasks' progress,
+    # which change without touching its own row.
+    row = Task.objects.filter(pk=task_id).annotate(
+        has_subtasks=Exists(Task.objects.filter(parent=OuterRef('pk')))
+    ).values_list('updated_at', 'parent_id', 'has_subtasks').first()
+    if row is None:
+        return task_id, None
+    last_modified, parent_id, has_subtasks = row
+    if parent_id or has_subtasks:
+        generation = workload.generation()
+        if generation is None:
+            return None, None
+        return (task_id, generation), last_modified
+    return task_id, last_modified
+
+def is_fragment_request(request):
+    return request.headers.get('HX-Request') == 'true' or request.GET.get('partial') == '1'
+
+
+class FragmentMixin:
+    """Answer fragment requests (HX-Request header or ?partial=1) with just
+    `fragment_template_name`, for clients that swap the task table in place.
+    Views check `self.is_fragment` to skip context only the layout uses."""
+    fragment_template_name = None
+
+    def setup(self, request, *args, **kwargs):
+        super().setup(request, *args, **kwargs)
+        self.is_fragment = is_fragment_request(request)
+
+    def get_template_names(self):
+        if self.is_fragment:
+            return [self.fragment_template_name]
+        return super().get_template_names()
+
+    def render_to_response(self, context, **response_kwargs):
+        response = super().render_to_response(context, **response_kwargs)
+        patch_vary_headers(response, ['HX-Request'])
+        return response
+
+
+async def authenticated_user(request):
+    """Async views can't touch the lazy request.user (it would query the
+    database synchronously), so load it with auser() and put the result back
+    for the templates' context processors."""
+    user = await request.auser()
+    request.user = user
+    return user
+
+
+def status_counts(facet_counts):
+    """The dashboard cards' figures: the status facet, so each card counts
+    what picking it would show."""
+    statuses = facet_counts['status']
+    return {
+        'total_task': sum(statuses.values()),
+        'completed_task': statuses['COMPLETED'],
+        'in_progress_task': statuses['IN_PROGRESS'],
+        'pending_task': statuses['PENDING'],
+    }
+
+def live_status_counts(filters):
+    try:
+        return status_counts(facets.facets(filters))
+    finally:
+        # Idle streams shouldn't hold on to a database connection.
+        connections.close_all()
+
+
+def manager_dashboard_context(user, filters, facet_counts, is_fragment):
+    """Everything the manager dashboard shows besides the task page, from
+    the facet counts of `filters`. Evaluated here, so an async view can
+    build it in a thread and render it without touching the database."""
+    context = {
+        'filter_query': facets.filter_query(filters),
+        # The filter panel is part of the fragment, so it follows the table.
+        'facet_sections': facets.facet_sections(filters, facet_counts),
+        'filters': filters,
+        'range_params': [
+            (param, value) for param, values in QueryDict(facets.filter_query(filters, due=None, created=None)).lists()
+            for value in values
+        ],
+        'saved_filters': list(SavedFilter.objects.filter(user=user).order_by('name')),
+    }
+    if not is_fragment:
+        context['counts'] = status_counts(facet_counts)
+        # The cards pick one status and keep the other filters.
+        context['status_links'] = {
+            param: facets.filter_query(filters, status=[status]) for param, status in DASHBOARD_FILTERS.items()
+        }
+        context['status_links']['all'] = facets.filter_query(filters, status=[])
+    return context
+
+
+@method_decorator(conditional_page(dashboard_state), name='get')
+class ManagerDashboard(FragmentMixin, LoginRequiredMixin, UserPassesTestMixin, ListView):
     login_url = 'sign-in'
     model = Task
     template_name = "dashboard/manager_dashboard.html"
+    fragment_template_name = "dashboard/partials/manager_tasks.html"
     context_object_name = 'tasks'
+    paginate_by = DASHBOARD_PAGE_SIZE
     
     def test_func(self):
         return is_manager(self.request.user)
@@ -36,29 +227,56 @@ class ManagerDashboard(LoginRequiredMixin, UserPassesTestMixin, ListView):
         return 'no-permission'
     
     def get_queryset(self):
-        type = self.request.GET.get('type','all')
-        base_query=Task.objects.select_related('details').prefetch_related('assigned_to')
-        if type=='completed':
-            return base_query.filter(status='COMPLETED')
-        elif type=='in_progress':
-            return base_query.filter(status='IN_PROGRESS')
-        elif type=='pending':
-            return base_query.filter(status='PENDING')
-        return base_query.all()
+        self.filters = facets.parse_filters(self.request.GET)
+        self.facet_counts = facets.facets(self.filters)
+        return dashboard_tasks(self.filters)
+
+    def get_paginator(self, *args, **kwargs):
+        paginator = super().get_paginator(*args, **kwargs)
+        # The facet counts already include the number of matching tasks.
+        paginator.count = self.facet_counts['total']
+        return paginator
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['counts'] = Task.objects.aggregate(
-            total_task=Count('id'),
-            completed_task=Count('id', filter=Q(status='COMPLETED')),
-            in_progress_task=Count('id', filter=Q(status='IN_PROGRESS')),
-            pending_task=Count('id', filter=Q(status='PENDING'))
-        )
+        context.update(manager_dashboard_context(self.request.user, self.filters, self.facet_counts, self.is_fragment))
         return context
     
 
-class EmployeeDashboard(LoginRequiredMixin,UserPassesTestMixin,TemplateView):
+class SaveDashboardFilter(LoginRequiredMixin,UserPassesTestMixin,View):
+    """Save (or overwrite, by name) the filters in POST['query'] for the user."""
+    login_url = 'sign-in'
+
+    def test_func(self):
+        return is_manager(self.request.user)
+
+    def get_login_url(self):
+        return 'no-permission'
+
+    def post(self, request, *args, **kwargs):
+        query = facets.filter_query(facets.parse_filters(QueryDict(request.POST.get('query', ''))))
+        name = request.POST.get('name', '').strip()[:SavedFilter._meta.get_field('name').max_length]
+        if name:
+            SavedFilter.objects.update_or_create(user=request.user, name=name, defaults={'query': query})
+            messages.success(request, f"Saved filter '{name}'")
+        else:
+            messages.error(request, "Give the filter a name to save it")
+        return redirect(f"{reverse('manager_dashboard')}?{query}")
+
+
+class DeleteDashboardFilter(LoginRequiredMixin,View):
+    login_url = 'sign-in'
+
+    def post(self, request, id, *args, **kwargs):
+        SavedFilter.objects.filter(user=request.user, pk=id).delete()
+        messages.success(request, "Saved filter removed")
+        return redirect('manager_dashboard')
+
+
+class EmployeeDashboard(FragmentMixin,LoginRequiredMixin,UserPassesTestMixin,TemplateView):
     login_url = 'sign-in'
     template_name = "dashboard/user_dashboard.html"
+    fragment_template_name = "dashboard/partials/employee_tasks.html"
     
     def test_func(self):
         return is_employee(self.request.user)
@@ -66,6 +284,98 @@ class EmployeeDashboard(LoginRequiredMixin,UserPassesTestMixin,TemplateView):
     def get_login_url(self):
         return 'no-permission'
     
+class AsyncManagerDashboard(View):
+    """ManagerDashboard on the async ORM, with the same facets, filter panel
+    and ETag. The role check and the page's ETag don't depend on each
+    other, so they are awaited together; a 304 then skips the rest."""
+    template_name = ManagerDashboard.template_name
+    fragment_template_name = ManagerDashboard.fragment_template_name
+
+    async def get(self, request, *args, **kwargs):
+        user = await authenticated_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path(), 'no-permission')
+
+        allowed, _ = await asyncio.gather(
+            ahas_group(user, 'Manager'),
+            sync_to_async(conditional_state)(request, dashboard_state),
+        )
+        if not allowed:
+            raise PermissionDenied
+        return await conditional_page(dashboard_state)(self.render_page)(request)
+
+    async def render_page(self, request):
+        filters = facets.parse_filters(request.GET)
+        fragment = is_fragment_request(request)
+        facet_counts = await sync_to_async(facets.facets)(filters)
+        paginator = Paginator(dashboard_tasks(filters), DASHBOARD_PAGE_SIZE)
+        # The facet counts already include the number of matching tasks.
+        paginator.count = facet_counts['total']
+        page = paginator.get_page(request.GET.get('page'))
+
+        async def page_tasks():
+            return [task async for task in page.object_list]
+
+        page.object_list, context = await asyncio.gather(
+            page_tasks(),
+            sync_to_async(manager_dashboard_context)(request.user, filters, facet_counts, fragment),
+        )
+        context.update({
+            'tasks': page.object_list, 'object_list': page.object_list, 'page_obj': page,
+            'paginator': paginator, 'is_paginated': page.has_other_pages(),
+        })
+        response = render(request, self.fragment_template_name if fragment else self.template_name, context)
+        patch_vary_headers(response, ['HX-Request'])
+        return response
+
+
+class AsyncEmployeeDashboard(View):
+    template_name = EmployeeDashboard.template_name
+    fragment_template_name = EmployeeDashboard.fragment_template_name
+
+    async def get(self, request, *args, **kwargs):
+        user = await authenticated_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path(), 'no-permission')
+        if not await ahas_group(user, 'Employee'):
+            raise PermissionDenied
+        response = render(request, self.fragment_template_name if is_fragment_request(request) else self.template_name)
+        patch_vary_headers(response, ['HX-Request'])
+        return response
+
+
+class TaskEventStream(View):
+    """Server-Sent Events feed of task changes for the manager dashboard.
+
+    Takes the dashboard's filter query: only tasks that were or are in the
+    filters come through, each event saying whether the task is in them
+    now, and the cards' counts for them follow every change. The response is an endless async generator, so it needs the
+    ASGI server; under WSGI it would pin a worker thread and never finish.
+    """
+
+    async def get(self, request, *args, **kwargs):
+        if isinstance(request, WSGIRequest):
+            return HttpResponse("Live updates need the ASGI server.", status=501)
+        user = await authenticated_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path(), 'no-permission')
+        if not await ahas_group(user, 'Manager'):
+            raise PermissionDenied
+
+        filters = facets.parse_filters(request.GET)
+        subscription = events.get_broker().subscribe(filters=filters)
+        # Idle streams shouldn't hold on to a database connection.
+        await sync_to_async(connections.close_all)()
+
+        # The broker counts once per change for every stream with these filters.
+        response = StreamingHttpResponse(
+            events.stream(subscription, live_status_counts), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+@method_decorator(conditional_page(task_state), name='get')
 class TaskDetails(DetailView,LoginRequiredMixin,PermissionRequiredMixin):
     model = Task
     login_url='sign-in'
@@ -74,18 +384,231 @@ class TaskDetails(DetailView,LoginRequiredMixin,PermissionRequiredMixin):
     context_object_name='task'
     pk_url_kwarg='task_id'
     
+    def get_queryset(self):
+        return Task.objects.select_related('details', 'parent').prefetch_related(
+            'assigned_to', Prefetch('assigned_to__groups', queryset=Group.objects.order_by('id')))
+    
     def get_context_data(self, **kwargs):
         context=super().get_context_data(**kwargs)
         context['status_choices'] = Task.STATUS_CHOICES
+        context.update(hierarchy.subtask_context(self.object))
         return context
     
     def post(self,request,*args,**kwargs):
         self.object = self.get_object()
-        changed_status = request.POST.get('task_status')
-        self.object.status = changed_status
-        self.object.save()
+        change_status(self.object, request.POST.get('task_status'), request.user)
         return redirect('task_details', self.object.id)
-        
+
+
+def change_status(task, status, user):
+    with transaction.atomic(), activity.recording(user) as log:
+        log.watch(task, task)
+        task.status = status
+        task.save()
+
+
+class AsyncTaskDetails(View):
+    """TaskDetails on the async ORM; the permission check runs alongside the
+    task query."""
+    template_name = TaskDetails.template_name
+    permission_required = TaskDetails.permission_required
+
+    async def dispatch(self, request, *args, **kwargs):
+        user = await authenticated_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path(), 'sign-in')
+        return await super().dispatch(request, *args, **kwargs)
+
+    async def get(self, request, task_id, *args, **kwargs):
+        queryset = Task.objects.select_related('details', 'parent').prefetch_related(
+            'assigned_to', Prefetch('assigned_to__groups', queryset=Group.objects.order_by('id')))
+        allowed, task = await asyncio.gather(
+            sync_to_async(request.user.has_perm)(self.permission_required),
+            aget_object_or_404(queryset, pk=task_id),
+        )
+        if not allowed:
+            raise PermissionDenied
+        return render(request, self.template_name, {
+            'task': task, 'object': task, 'status_choices': Task.STATUS_CHOICES,
+            **await sync_to_async(hierarchy.subtask_context)(task),
+        })
+
+    async def post(self, request, task_id, *args, **kwargs):
+        if not await sync_to_async(request.user.has_perm)(self.permission_required):
+            raise PermissionDenied
+        task = await aget_object_or_404(Task, pk=task_id)
+        await sync_to_async(change_status)(task, request.POST.get('task_status'), request.user)
+        return redirect('async_task_details', task.id)
+
+
+class WorkloadReport(LoginRequiredMixin,UserPassesTestMixin,TemplateView):
+    login_url = 'sign-in'
+    template_name = "dashboard/workload.html"
+    paginate_by = DASHBOARD_PAGE_SIZE
+    default_sort = '-open'
+
+    def test_func(self):
+        return is_manager(self.request.user)
+
+    def get_login_url(self):
+        return 'no-permission'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        project = self.request.GET.get('project', '')
+        project_id = int(project) if project.isdigit() else None
+        sort = self.request.GET.get('sort', self.default_sort)
+        if sort.lstrip('-') not in workload.SORT_KEYS:
+            sort = self.default_sort
+        # Sorting and paging work on the cached rows, so they cost no query.
+        rows = workload.sort_rows(workload.workload(project_id), sort)
+        page = Paginator(rows, self.paginate_by).get_page(self.request.GET.get('page'))
+        context.update({
+            'rows': [dict(zip(workload.COLUMNS, row)) for row in page.object_list],
+            'page_obj': page,
+            'sort': sort,
+            'project_id': project_id,
+            'sort_keys': workload.SORT_KEYS,
+        })
+        return context
+
+
+class BurndownReport(LoginRequiredMixin,UserPassesTestMixin,TemplateView):
+    """Daily open/completed/overdue counts for the last ?days days, for one
+    ?project or all of them, read from the snapshots alone (one row a day)."""
+    login_url = 'sign-in'
+    template_name = "dashboard/burndown.html"
+    default_days = 30
+    max_days = 366
+
+    def test_func(self):
+        return is_manager(self.request.user)
+
+    def get_login_url(self):
+        return 'no-permission'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        project = self.request.GET.get('project', '')
+        project_id = int(project) if project.isdigit() else None
+        days = self.request.GET.get('days', '')
+        days = min(int(days), self.max_days) if days.isdigit() and int(days) > 0 else self.default_days
+        end = timezone.localdate()
+        rows = snapshots.burndown(project_id, end - timedelta(days=days - 1), end)
+        peak = max([row['open'] + row['completed'] for row in rows] or [0])
+        for row in rows:
+            # bar widths in percent of the busiest day
+            row['open_width'] = round(100 * row['open'] / peak) if peak else 0
+            row['completed_width'] = round(100 * row['completed'] / peak) if peak else 0
+        context.update({'rows': rows, 'project_id': project_id, 'days': days})
+        return context
+
+
+ACTIVITY_PAGE_SIZE = 50
+
+def activity_page(request, queryset):
+    """Newest-first page of activity as JSON. `next` continues below the
+    last id (?before=), which stays an index range scan however deep it goes."""
+    before = request.GET.get('before', '')
+    if before.isdigit():
+        queryset = queryset.filter(id__lt=int(before))
+    entries = list(queryset.order_by('-id').values(
+        'id', 'task_id', 'project_id', 'created_at', 'changes', 'user__username')[:ACTIVITY_PAGE_SIZE + 1])
+    next_url = None
+    if len(entries) > ACTIVITY_PAGE_SIZE:
+        entries = entries[:ACTIVITY_PAGE_SIZE]
+        next_url = f"{request.path}?before={entries[-1]['id']}"
+    return JsonResponse({'results': entries, 'next': next_url})
+
+
+class TaskActivityTimeline(LoginRequiredMixin,PermissionRequiredMixin,View):
+    login_url='sign-in'
+    permission_required='tasks.view_task'
+
+    def get(self, request, task_id, *args, **kwargs):
+        return activity_page(request, TaskActivity.objects.filter(task_id=task_id))
+
+
+class ProjectActivityFeed(LoginRequiredMixin,PermissionRequiredMixin,View):
+    login_url='sign-in'
+    permission_required='tasks.view_project'
+
+    def get(self, request, project_id, *args, **kwargs):
+        return activity_page(request, TaskActivity.objects.filter(project_id=project_id))
+
+
+def calendar_state(request, *args, **kwargs):
+    # Every write that can move a day's counts bumps the task data
+    # generation in the shared cache: the signals for ORM writes, and
+    # archive_batch and insert_batch for their raw SQL. So no query is
+    # needed to tell, in any process.
+    return workload.generation(), None
+
+def calendar_tasks(request):
+    project = request.GET.get('project', '')
+    if project.isdigit():
+        return Task.objects.filter(project_id=int(project)), int(project)
+    return Task.objects.all(), None
+
+
+@method_decorator(conditional_page(calendar_state), name='get')
+class CalendarFeed(LoginRequiredMixin,PermissionRequiredMixin,View):
+    """Per-day buckets of the tasks due in [?start, ?end) (ISO dates, the
+    current month by default), optionally for one ?project."""
+    login_url='sign-in'
+    permission_required='tasks.view_task'
+
+    def get(self, request, *args, **kwargs):
+        try:
+            start, end = calendar_feed.parse_range(request.GET.get('start'), request.GET.get('end'))
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        tasks, _ = calendar_tasks(request)
+        return JsonResponse({'start': start, 'end': end, 'days': calendar_feed.day_buckets(tasks, start, end)})
+
+
+class TaskCalendar(LoginRequiredMixin,PermissionRequiredMixin,TemplateView):
+    """Month, week or timeline (the month as a list of days) around ?date.
+    The page itself queries nothing; it fills in from CalendarFeed."""
+    login_url='sign-in'
+    permission_required='tasks.view_task'
+    template_name = "dashboard/calendar.html"
+    modes = ('month', 'week', 'timeline')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        mode = self.request.GET.get('mode')
+        if mode not in self.modes:
+            mode = 'month'
+        try:
+            anchor = date.fromisoformat(self.request.GET.get('date', ''))
+        except ValueError:
+            anchor = timezone.localdate()
+        if mode == 'week':
+            start, end = calendar_feed.week_range(anchor)
+            previous, following = start - timedelta(days=7), end
+        else:
+            start, end = calendar_feed.month_range(anchor)
+            previous, following = calendar_feed.month_range(start - timedelta(days=1))[0], end
+        # Whole weeks, so the month grid starts on a Monday and ends on a Sunday.
+        grid_start = calendar_feed.week_range(start)[0]
+        grid_end = calendar_feed.week_range(end - timedelta(days=1))[1]
+        days = [grid_start + timedelta(days=offset) for offset in range((grid_end - grid_start).days)]
+        _, project_id = calendar_tasks(self.request)
+        query = f"start={start}&end={end}" + (f"&project={project_id}" if project_id else "")
+        context.update({
+            'mode': mode,
+            'modes': self.modes,
+            'start': start,
+            'end': end,
+            'previous': previous,
+            'following': following,
+            'weeks': [days[week:week + 7] for week in range(0, len(days), 7)],
+            'project_id': project_id,
+            'feed_url': f"{reverse('calendar_feed')}?{query}",
+        })
+        return context
+
 
 class CreateTask(ContextMixin,LoginRequiredMixin,PermissionRequiredMixin,View):
     
@@ -95,7 +618,7 @@ class CreateTask(ContextMixin,LoginRequiredMixin,PermissionRequiredMixin,View):
     
     def get_context_data(self, **kwargs):
         context=super().get_context_data(**kwargs)
-        context["task_form"] = kwargs.get('task_form', TaskModelForm())
+        context["task_form"] = kwargs.get('task_form', AutoAssignTaskModelForm(initial={'parent': self.request.GET.get('parent')}))
         context["task_detail_form"] = kwargs.get('task_detail_form', TaskDetailModelForm())
         return context
     
@@ -104,17 +627,29 @@ class CreateTask(ContextMixin,LoginRequiredMixin,PermissionRequiredMixin,View):
         return render(request,self.template_name, context) 
     
     def post(self,request,*args,**kwargs):
-        task_form = TaskModelForm(request.POST)
+        task_form = AutoAssignTaskModelForm(request.POST)
         task_detail_form = TaskDetailModelForm(request.POST, request.FILES)
         if task_form.is_valid() and task_detail_form.is_valid():
-            """For Django model Form"""
-            task = task_form.save()
-            task_detail = task_detail_form.save(commit=False)
-            task_detail.task = task
-            task_detail.save()
-            messages.success(request, "Task Created Successfully")
-            context = self.get_context_data(task_form=task_form, task_detail_form=task_detail_form)
-            return render(request,self.template_name, context)  
+            # One transaction, so a failure never leaves a task without its
+            # details or assignees, nor the balancer counting half of it.
+            with transaction.atomic():
+                chosen = None
+                if task_form.cleaned_data.get('auto_assign'):
+                    chosen = autoassign.balancer.choose(task_form.cleaned_data['project'].pk, task_form.cleaned_data['auto_assign'])
+                    if not chosen:
+                        task_form.add_error('auto_assign', "There is no employee to auto-assign this task to.")
+                if task_form.is_valid():
+                    """For Django model Form"""
+                    task = task_form.save()
+                    task_detail = task_detail_form.save(commit=False)
+                    task_detail.task = task
+                    task_detail.save()
+                    if chosen:
+                        # after the details, so the new task's priority is counted
+                        task.assigned_to.set(chosen)
+                    messages.success(request, "Task Created Successfully")
+        context = self.get_context_data(task_form=task_form, task_detail_form=task_detail_form)
+        return render(request,self.template_name, context)
 
 
 class UpdateTask(LoginRequiredMixin,PermissionRequiredMixin,UpdateView):
@@ -140,23 +675,142 @@ class UpdateTask(LoginRequiredMixin,PermissionRequiredMixin,UpdateView):
 
     def post(self, request, *args, **kwargs):
         self.object = self.get_object()
-        task_form = TaskModelForm(request.POST, instance=self.object)
+        details = getattr(self.object, 'details', None)
+        with transaction.atomic(), activity.recording(request.user) as log:
+            log.watch(self.object, self.object)
+            log.watch(details, self.object)
+            task_form = TaskModelForm(request.POST, instance=self.object)
 
-        task_detail_form = TaskDetailModelForm(
-            request.POST, request.FILES, instance=getattr(self.object, 'details', None))
+            task_detail_form = TaskDetailModelForm(
+                request.POST, request.FILES, instance=details)
 
-        if task_form.is_valid() and task_detail_form.is_valid():
+            if task_form.is_valid() and task_detail_form.is_valid():
 
-            """ For Model Form Data """
-            task = task_form.save()
-            task_detail = task_detail_form.save(commit=False)
-            task_detail.task = task
-            task_detail.save()
+                """ For Model Form Data """
+                task = task_form.save()
+                task_detail = task_detail_form.save(commit=False)
+                task_detail.task = task
+                task_detail.save()
 
-            messages.success(request, "Task Updated Successfully")
-            return redirect('update_task', self.object.id)
+                messages.success(request, "Task Updated Successfully")
         return redirect('update_task', self.object.id)
 
+class StartAssetUpload(LoginRequiredMixin,PermissionRequiredMixin,View):
+    login_url='sign-in'
+    permission_required='tasks.change_task'
+
+    def post(self, request, task_id, *args, **kwargs):
+        task = get_object_or_404(Task, id=task_id)
+        filename = request.POST.get('filename', '').strip()
+        try:
+            total_size = int(request.POST.get('total_size', ''))
+        except ValueError:
+            total_size = 0
+        if not filename or total_size <= 0:
+            return JsonResponse({'error': 'filename and total_size are required'}, status=400)
+        try:
+            uploads.check_start(filename, total_size)
+        except uploads.ChunkError as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
+
+        upload = AssetUpload.objects.create(
+            task=task, uploaded_by=request.user, filename=filename, total_size=total_size)
+        return JsonResponse({
+            'upload_id': str(upload.id),
+            'offset': upload.offset,
+            'chunk_size': settings.ASSET_UPLOAD_CHUNK_SIZE,
+        }, status=201)
+
+
+class AssetUploadChunk(LoginRequiredMixin,PermissionRequiredMixin,View):
+    """GET reports how much has been received so a client can resume,
+    PUT appends one raw chunk to the temp file."""
+    login_url='sign-in'
+    permission_required='tasks.change_task'
+
+    def get_upload(self, lock=False):
+        # Expired uploads are as good as gone (see uploads.cleanup_uploads).
+        queryset = AssetUpload.objects.filter(updated_at__gte=uploads.expiry_cutoff())
+        if lock:
+            queryset = queryset.select_for_update()
+        return get_object_or_404(
+            queryset, id=self.kwargs['upload_id'], task_id=self.kwargs['task_id'],
+            uploaded_by=self.request.user)
+
+    def get(self, request, *args, **kwargs):
+        upload = self.get_upload()
+        return JsonResponse({'offset': upload.offset, 'total_size': upload.total_size})
+
+    def put(self, request, *args, **kwargs):
+        checksum = request.headers.get('X-Chunk-Checksum', '')
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            return JsonResponse({'error': 'Upload-Offset header is required'}, status=400)
+
+        upload = self.get_upload()
+        if offset != upload.offset:
+            return JsonResponse({'error': 'Offset mismatch', 'offset': upload.offset}, status=409)
+        try:
+            chunk = uploads.receive_chunk(upload, offset, request, length, checksum)
+        except uploads.ChunkError as e:
+            return JsonResponse({'error': str(e), 'offset': upload.offset}, status=e.status)
+
+        # Locked only for the local copy and the offset update; another
+        # request may have appended the same range while this one was reading.
+        with transaction.atomic():
+            upload = self.get_upload(lock=True)
+            if offset != upload.offset:
+                chunk.unlink()
+                return JsonResponse({'error': 'Offset mismatch', 'offset': upload.offset}, status=409)
+            upload.offset = uploads.append_chunk(upload, chunk)
+            upload.save(update_fields=['offset', 'updated_at'])
+
+        return JsonResponse({'offset': upload.offset, 'total_size': upload.total_size})
+
+
+class CompleteAssetUpload(LoginRequiredMixin,PermissionRequiredMixin,View):
+    login_url='sign-in'
+    permission_required='tasks.change_task'
+
+    def post(self, request, task_id, upload_id, *args, **kwargs):
+        promoted = None
+        try:
+            with transaction.atomic():
+                upload = get_object_or_404(
+                    AssetUpload.objects.select_for_update(), id=upload_id, task_id=task_id,
+                    uploaded_by=request.user, updated_at__gte=uploads.expiry_cutoff())
+                if upload.offset != upload.total_size:
+                    return JsonResponse({'error': 'Upload is not finished', 'offset': upload.offset}, status=409)
+
+                checksum = request.POST.get('checksum')
+                if checksum and uploads.file_checksum(uploads.temp_path(upload)) != checksum.lower():
+                    uploads.discard(upload)
+                    upload.delete()
+                    return JsonResponse({'error': 'File checksum mismatch'}, status=400)
+                try:
+                    uploads.check_image(upload)
+                except uploads.ChunkError as e:
+                    uploads.discard(upload)
+                    upload.delete()
+                    return JsonResponse({'error': str(e)}, status=e.status)
+
+                task_detail, created = TaskDetail.objects.get_or_create(task=upload.task)
+                part = uploads.temp_path(upload)
+                promoted = uploads.promote(upload)
+                task_detail.assets.name = promoted
+                task_detail.save(update_fields=['assets'])
+                upload.delete()
+        except Exception:
+            # Rolled back, the upload row still points at its temp path.
+            if promoted:
+                uploads.demote(promoted, part)
+            raise
+
+        return JsonResponse({'asset': task_detail.assets.url})
+
+
 class DeleteTask(LoginRequiredMixin,PermissionRequiredMixin,DeleteView):
     model = Task
     pk_url_kwarg = 'id'
@@ -178,6 +832,7 @@ class DeleteTask(LoginRequiredMixin,PermissionRequiredMixin,DeleteView):
         return redirect('manager_dashboard')
         
 
+@method_decorator(conditional_page(project_list_state), name='get')
 class ViewProject(LoginRequiredMixin,PermissionRequiredMixin,ListView):
     model = Project  
     login_url = 'sign-in'
@@ -188,7 +843,7 @@ class ViewProject(LoginRequiredMixin,PermissionRequiredMixin,ListView):
     def get_queryset(self):
         queryset = Project.objects.annotate(
             task_num=Count('task')  
-        ).order_by('task_num')  
+        ).prefetch_related('task_set').order_by('task_num')  
         return queryset
 
 @login_required
@@ -0,0 +1,97 @@
+import logging
+import time
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from tasks.models import Task, TaskDetail
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'tasks:workload:generation'
+COLUMNS = ('user_id', 'username', 'first_name', 'last_name', 'open', 'overdue', 'high_priority')
+SORT_KEYS = {'username': 'Employee', 'open': 'Open', 'overdue': 'Overdue', 'high_priority': 'High priority'}
+
+
+def generation():
+    """The task data generation, or None when the cache can't be reached:
+    then nothing is served from it (see cached()) and pages get no 304."""
+    try:
+        # Seeded from the clock: if the counter is evicted, a restarted one
+        # can't collide with reports cached under an older generation.
+        return cache.get_or_set(GENERATION_KEY, time.time_ns, None)
+    except Exception:
+        logger.warning("Can't read the task data generation from the cache", exc_info=True)
+        return None
+
+
+def bump_generation():
+    """Called whenever tasks or assignments change; every cached report is
+    then stale and the next request computes a new one. A cache that can't
+    be reached doesn't fail the write; its entries expire on their own."""
+    try:
+        try:
+            cache.incr(GENERATION_KEY)
+        except ValueError:
+            cache.set(GENERATION_KEY, time.time_ns(), None)
+    except Exception:
+        logger.warning("Can't bump the task data generation in the cache", exc_info=True)
+
+
+def cached(kind, key, timeout, compute):
+    """compute(), cached as "tasks:<kind>:<generation>:<key>" for `timeout`
+    seconds. Computed every time while the cache can't be reached."""
+    current = generation()
+    if current is None:
+        return compute()
+    key = f"tasks:{kind}:{current}:{key}"
+    try:
+        value = cache.get(key)
+    except Exception:
+        logger.warning("Can't read %s from the cache", key, exc_info=True)
+        return compute()
+    if value is None:
+        value = compute()
+        try:
+            cache.set(key, value, timeout)
+        except Exception:
+            logger.warning("Can't write %s to the cache", key, exc_info=True)
+    return value
+
+
+def compute_workload(project_id=None, today=None):
+    """Open, overdue and high-priority task counts per assignee, as tuples
+    in COLUMNS order, from one GROUP BY over the assignment table."""
+    today = today or timezone.localdate()
+    assignments = Task.assigned_to.through.objects.exclude(task__status='COMPLETED')
+    if project_id is not None:
+        assignments = assignments.filter(task__project_id=project_id)
+    return list(
+        assignments
+        .values_list('customuser_id', 'customuser__username', 'customuser__first_name', 'customuser__last_name')
+        .annotate(
+            open=Count('id'),
+            overdue=Count('id', filter=Q(task__due_date__lt=today)),
+            high_priority=Count('id', filter=Q(task__details__priority=TaskDetail.HIGH)),
+        )
+        .order_by()
+    )
+
+
+def workload(project_id=None):
+    """compute_workload(), cached per generation (and per day, since
+    'overdue' moves at midnight) for WORKLOAD_CACHE_SECONDS."""
+    today = timezone.localdate()
+    return cached('workload', f"{today}:{project_id or 'all'}", settings.WORKLOAD_CACHE_SECONDS,
+                  lambda: compute_workload(project_id, today))
+
+
+def sort_rows(rows, sort):
+    """Sort by one of SORT_KEYS, '-' for descending; ties go by username."""
+    descending = sort.startswith('-')
+    column = COLUMNS.index(sort.lstrip('-'))
+    rows = sorted(rows, key=itemgetter(1))
+    return sorted(rows, key=itemgetter(column), reverse=descending)
@@ -85,7 +85,7 @@ class AssignRoleForm(StyledFormMixin, forms.Form):
 
 class CreateGroupForm(StyledFormMixin, forms.ModelForm):
     permissions = forms.ModelMultipleChoiceField(
-        queryset=Permission.objects.all(),
+        queryset=Permission.objects.select_related('content_type'),
         widget=forms.CheckboxSelectMultiple,
         required=False,
         label="Assign Permission"
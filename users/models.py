@@ -6,6 +6,13 @@ from django.contrib.auth.models import AbstractUser,User
 class CustomUser(AbstractUser):
     bio=models.TextField(blank=True)
     profile_image = models.ImageField(upload_to='profile_images', blank=True , default='profile_images/default.jpg')
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # pattern_ops lets PostgreSQL use the index for prefix (LIKE 'x%') filters
+            models.Index(fields=['username'], name='user_username_prefix_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['email'], name='user_email_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ]
     
     def __str__(self):
         return self.username
\ No newline at end of file
@@ -1,3 +1,50 @@
+from unittest import mock
+
+from django.contrib.auth.models import Group
 from django.test import TestCase
+from django.urls import reverse
+
+from users.models import CustomUser
+from users.views import AdminDashboard
+
+
+class AdminDashboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user('admin', password='Secret#123')
+        cls.admin.groups.set([Group.objects.create(name='Admin')])
+        employees = Group.objects.create(name='Employee')
+        cls.users = [CustomUser.objects.create_user(f'user{i:02}', email=f'user{i:02}@example.com') for i in range(7)]
+        for i, user in enumerate(cls.users):
+            user.groups.set([employees] if i % 2 == 0 else [])
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def page(self, **params):
+        response = self.client.get(reverse('admin-dashboard'), params)
+        return response, [user.username for user in response.context['users']]
+
+    def test_group_names_come_from_one_query(self):
+        with self.assertNumQueries(5):
+            response, usernames = self.page()
+        groups = {user.username: user.group_name for user in response.context['users']}
+        self.assertEqual(groups['admin'], 'Admin')
+        self.assertEqual(groups['user00'], 'Employee')
+        self.assertEqual(groups['user01'], 'No Group Assigned')
+
+    @mock.patch.object(AdminDashboard, 'page_size', 3)
+    def test_pages_follow_the_cursor_both_ways(self):
+        response, usernames = self.page()
+        self.assertEqual(usernames, ['admin', 'user00', 'user01'])
+        self.assertIsNone(response.context['prev_cursor'])
+        response, usernames = self.page(after=response.context['next_cursor'])
+        self.assertEqual(usernames, ['user02', 'user03', 'user04'])
+        response, usernames = self.page(before=response.context['prev_cursor'])
+        self.assertEqual(usernames, ['admin', 'user00', 'user01'])
+        self.assertIsNone(response.context['prev_cursor'])
 
-# Create your tests here.
+    def test_filters_by_prefix_and_role(self):
+        self.assertEqual(self.page(username='user0', role='Employee')[1], ['user00', 'user02', 'user04', 'user06'])
+        self.assertEqual(self.page(email='user01@')[1], ['user01'])
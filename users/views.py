@@ -5,7 +5,8 @@ from django.contrib.auth import login,logout
 from users.forms import CustomRegisterForm, LoginForm, AssignRoleForm, CreateGroupForm, CustomPasswordChangeForm,CustomPasswordResetForm,CustomPasswordResetConfirmForm, EditProfileForm
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required,user_passes_test
-from django.db.models import Prefetch
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.views import LoginView,PasswordChangeView,PasswordChangeDoneView, PasswordResetView, PasswordResetConfirmView, LogoutView
 from django.views.generic import TemplateView, ListView
 from django.urls import reverse_lazy
@@ -88,6 +89,7 @@ class AdminDashboard(LoginRequiredMixin, UserPassesTestMixin, ListView):
     model = User
     template_name = "admin/dashboard.html"
     context_object_name = 'users'
+    page_size = 50
     
     def test_func(self):
         return is_admin(self.request.user)
@@ -96,14 +98,51 @@ class AdminDashboard(LoginRequiredMixin, UserPassesTestMixin, ListView):
         return 'no-permission'
     
     def get_queryset(self):
-        queryset = User.objects.prefetch_related(Prefetch('groups', queryset=Group.objects.all(), to_attr='all_groups')).all()
-
-        for user in queryset:
-            if user.all_groups:
-                user.group_name = user.all_groups[0].name
-            else:
-                user.group_name = 'No Group Assigned'
-        return queryset
+        first_group = Group.objects.filter(user=OuterRef('pk')).order_by('id').values('name')[:1]
+        queryset = User.objects.annotate(
+            group_name=Coalesce(Subquery(first_group), Value('No Group Assigned'))
+        ).only('id', 'username', 'first_name', 'last_name', 'email')
+
+        username = self.request.GET.get('username', '').strip()
+        email = self.request.GET.get('email', '').strip()
+        role = self.request.GET.get('role', '').strip()
+        if username:
+            queryset = queryset.filter(username__startswith=username)
+        if email:
+            queryset = queryset.filter(email__startswith=email)
+        if role:
+            queryset = queryset.filter(groups__name=role)
+
+        # Keyset pagination on id, so deep pages cost the same as the first
+        # one and no COUNT(*) over the whole user table is needed.
+        after = self.request.GET.get('after', '')
+        before = self.request.GET.get('before', '')
+        if before.isdigit():
+            page = list(queryset.filter(id__lt=before).order_by('-id')[:self.page_size + 1])
+            has_more = len(page) > self.page_size
+            page = page[:self.page_size][::-1]
+            self.prev_cursor = page[0].id if page and has_more else None
+            self.next_cursor = page[-1].id if page else None
+        else:
+            if after.isdigit():
+                queryset = queryset.filter(id__gt=after)
+            page = list(queryset.order_by('id')[:self.page_size + 1])
+            has_more = len(page) > self.page_size
+            page = page[:self.page_size]
+            self.prev_cursor = page[0].id if page and after.isdigit() else None
+            self.next_cursor = page[-1].id if page and has_more else None
+        return page
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        filters = self.request.GET.copy()
+        filters.pop('after', None)
+        filters.pop('before', None)
+        context['filter_query'] = filters.urlencode()
+        context['next_cursor'] = self.next_cursor
+        context['prev_cursor'] = self.prev_cursor
+        context['roles'] = Group.objects.order_by('name').values_list('name', flat=True)
+        return context
 
 
 class AssignRoleView(UserPassesTestMixin, FormView):